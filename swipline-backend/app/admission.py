@@ -0,0 +1,257 @@
+"""Admission control: rate limits and load shedding by priority
+
+Requests are classed by route (``priority_of``):
+
+- critical: the Stripe webhook, the health and metrics endpoints, and
+  location updates sent with the bearer token of a user whose role is in
+  CRITICAL_ROLES (scanners and admins), never shed. The location routes
+  take no authentication, so the same updates from anyone else are
+  normal;
+- public: the unauthenticated tracking reads (``/api/track/...``);
+- normal: everything else.
+
+``AdmissionMiddleware`` counts in-flight HTTP requests and answers a
+fast 503 (Retry-After: 1) instead of queueing when a class's limit is
+passed: public requests at SHED_PUBLIC_INFLIGHT requests in flight (of
+any class) or when a database connection checkout has been waiting
+SHED_PUBLIC_POOL_WAIT_MS, normal ones at the SHED_NORMAL_* limits, which
+should be higher. Keep both in-flight limits below the threadpool size
+(40). Shedding public reads first keeps pooled connections for webhooks
+and updates.
+
+On top of that, ``limit_tracking`` applies token buckets per client IP
+and per tracking ID to the public tracking routes and answers 429 with
+the seconds until a token is available. Buckets are per worker process;
+the client IP is the one uvicorn reports (X-Forwarded-For from trusted
+proxies, see its --forwarded-allow-ips).
+"""
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app import crud
+from app.auth import decode_token
+from app.database import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    TimedAsyncQueuePool,
+    TimedQueuePool,
+)
+
+# Requests per second and burst per bucket; a rate of 0 disables the limit
+TRACK_RATE_PER_IP = float(os.getenv("TRACK_RATE_PER_IP", "10"))
+TRACK_BURST_PER_IP = float(os.getenv("TRACK_BURST_PER_IP", "30"))
+TRACK_RATE_PER_ID = float(os.getenv("TRACK_RATE_PER_ID", "2"))
+TRACK_BURST_PER_ID = float(os.getenv("TRACK_BURST_PER_ID", "10"))
+# Buckets kept per limiter; the least recently used are dropped beyond it
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Shedding thresholds; 0 disables that check. The in-flight limits default
+# to the worker's connection budget: admitting more requests than it only
+# queues them in threads blocked on a checkout, and once the threadpool is
+# full of those, sessions holding connections cannot close (their close
+# needs a thread too) until the checkouts time out
+SHED_PUBLIC_INFLIGHT = int(
+    os.getenv("SHED_PUBLIC_INFLIGHT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW))
+)
+SHED_PUBLIC_POOL_WAIT_MS = float(os.getenv("SHED_PUBLIC_POOL_WAIT_MS", "100"))
+SHED_NORMAL_INFLIGHT = int(
+    os.getenv("SHED_NORMAL_INFLIGHT", str(2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+)
+SHED_NORMAL_POOL_WAIT_MS = float(os.getenv("SHED_NORMAL_POOL_WAIT_MS", "1000"))
+
+CRITICAL = "critical"
+NORMAL = "normal"
+PUBLIC = "public"
+
+# Roles whose location updates are never shed
+CRITICAL_ROLES = {
+    role.strip()
+    for role in os.getenv("CRITICAL_ROLES", "admin,scanner").split(",")
+    if role.strip()
+}
+
+# (method, path pattern) of routes that are critical for CRITICAL_ROLES only
+ROLE_RULES = [
+    ("POST", re.compile(r"^/api/parcels/locations/bulk$")),
+    ("PUT", re.compile(r"^/api/parcels/[^/]+/location$")),
+]
+
+# (method or None for any, path pattern, priority), first match wins
+PRIORITY_RULES = [
+    (None, re.compile(r"^/api/payments/webhook$"), CRITICAL),
+    # Probes must keep answering while the worker sheds
+    ("GET", re.compile(r"^/(health|metrics)"), CRITICAL),
+    (None, re.compile(r"^/api/track/"), PUBLIC),
+]
+
+SHED_LIMITS = {
+    PUBLIC: (SHED_PUBLIC_INFLIGHT, SHED_PUBLIC_POOL_WAIT_MS / 1000),
+    NORMAL: (SHED_NORMAL_INFLIGHT, SHED_NORMAL_POOL_WAIT_MS / 1000),
+}
+
+
+class RateLimiter:
+    """Token buckets keyed by an arbitrary string, bounded in number
+
+    Only used from the event loop, so it takes no lock.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def acquire(self, key: str) -> Optional[float]:
+        """Take a token; None if allowed, else seconds until one is available"""
+        if self.rate <= 0:
+            return None
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if allowed:
+            return None
+        self.limited += 1
+        return (1 - tokens) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+ip_limiter = RateLimiter(TRACK_RATE_PER_IP, TRACK_BURST_PER_IP, RATE_LIMIT_MAX_KEYS)
+tracking_id_limiter = RateLimiter(
+    TRACK_RATE_PER_ID, TRACK_BURST_PER_ID, RATE_LIMIT_MAX_KEYS
+)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_tracking(request: Request, tracking_id: str):
+    """Route dependency: 429 once the client or the parcel is over its rate"""
+    retry_after = ip_limiter.acquire(client_ip(request))
+    if retry_after is None:
+        retry_after = tracking_id_limiter.acquire(tracking_id)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many tracking requests, please retry later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def has_critical_role(authorization: Optional[str]) -> bool:
+    """Whether a bearer token is valid and its user's role is critical
+
+    Costs no database round trip: the role comes from the cached user,
+    else from the token's signed ``role`` claim.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    claims = decode_token(token.strip())
+    if claims is None:
+        return False
+    user = crud.user_cache.get(str(claims["sub"]))
+    role = user.role if user is not None else claims.get("role")
+    return role in CRITICAL_ROLES
+
+
+def priority_of(method: str, path: str, authorization: Optional[str] = None) -> str:
+    for rule_method, pattern in ROLE_RULES:
+        if rule_method == method and pattern.match(path):
+            return CRITICAL if has_critical_role(authorization) else NORMAL
+    for rule_method, pattern, priority in PRIORITY_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return priority
+    return NORMAL
+
+
+def pool_wait() -> float:
+    """Seconds the longest pending connection checkout has been waiting"""
+    return max(
+        TimedQueuePool.stats.current_wait(), TimedAsyncQueuePool.stats.current_wait()
+    )
+
+
+class Admission:
+    """In-flight requests and shedding decisions of this worker"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.shed = {PUBLIC: 0, NORMAL: 0}
+
+    def should_shed(self, priority: str) -> bool:
+        if priority == CRITICAL:
+            return False
+        max_in_flight, max_wait = SHED_LIMITS[priority]
+        if max_in_flight and self.in_flight >= max_in_flight:
+            return True
+        return bool(max_wait) and pool_wait() >= max_wait
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "pool_wait_ms": round(pool_wait() * 1000, 3),
+            "shed": dict(self.shed),
+            "rate_limited": {
+                "ip": ip_limiter.limited,
+                "tracking_id": tracking_id_limiter.limited,
+            },
+            "buckets": {"ip": len(ip_limiter), "tracking_id": len(tracking_id_limiter)},
+        }
+
+
+admission = Admission()
+
+
+class AdmissionMiddleware:
+    """Sheds requests by priority before they reach routing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        authorization = next(
+            (
+                value.decode("latin-1")
+                for name, value in scope["headers"]
+                if name == b"authorization"
+            ),
+            None,
+        )
+        priority = priority_of(scope["method"], scope["path"], authorization)
+        if admission.should_shed(priority):
+            admission.shed[priority] += 1
+            response = JSONResponse(
+                {"detail": "Server busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        admission.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.in_flight -= 1
@@ -0,0 +1,109 @@
+"""Bearer token issuing and verification
+
+Access tokens are HS256 JWTs whose ``sub`` is the user ID. The
+``get_current_user`` dependency verifies the token and resolves the
+user through two bounded TTL caches, so an authenticated request usually
+costs no database round trip for auth:
+
+- decoded claims keyed by the token itself, only served until the
+  token's ``exp``;
+- the user (``crud.AuthUser``) keyed by user ID in ``crud.user_cache``,
+  invalidated when the password or role changes.
+
+``require_admin`` builds on it for admin-only routes.
+
+Changes made by another worker reach this one within AUTH_CACHE_TTL.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app import crud
+from app.cache import LRUCache
+from app.database import run_db, session_scope
+
+SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+ADMIN_ROLE = "admin"
+
+claims_cache = LRUCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def create_access_token(data: dict) -> str:
+    import jwt  # Imported on first login rather than at startup
+
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Claims of a valid, unexpired token, or None"""
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims if claims["exp"] > time.time() else None
+
+    import jwt
+
+    try:
+        claims = jwt.decode(
+            token,
+            SECRET_KEY,
+            algorithms=[ALGORITHM],
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.InvalidTokenError:
+        return None
+    claims_cache.set(token, claims)
+    return claims
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+) -> crud.AuthUser:
+    """The user of the request's bearer token; 401 without a valid one"""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    claims = decode_token(credentials.credentials)
+    if claims is None:
+        raise _unauthorized("Invalid or expired token")
+
+    user_id = str(claims["sub"])
+    user = crud.user_cache.get(user_id)
+    if user is None:
+        # Only a miss opens a session
+        async with session_scope() as db:
+            user = await run_db(db, crud.get_auth_user, user_id)
+    if user is None:
+        raise _unauthorized("User no longer exists")
+    return user
+
+
+async def require_admin(
+    user: crud.AuthUser = Depends(get_current_user),
+) -> crud.AuthUser:
+    """The current user if they are an admin; 401 without a token, else 403"""
+    if user.role != ADMIN_ROLE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
+        )
+    return user
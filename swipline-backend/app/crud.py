@@ -1,59 +1,305 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app import models, schemas
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import (
+    and_,
+    case,
+    cast,
+    tuple_,
+    column,
+    func,
+    insert,
+    select,
+    text,
+    update,
+    values,
+    Numeric,
+    String,
+    JSON,
+)
+from app import history_archive, models, schemas, search, serialization, tracking_ids
+from app.cache import LRUCache
+from app.rates import CM_PER_UNIT, rate_cards
 from datetime import datetime, timedelta
-from typing import Optional, List
+from collections import Counter
+from typing import Optional, List, NamedTuple
+import base64
+import hashlib
+import json
+import os
+import random
+import numpy as np
+
+# Assembled tracking responses keyed by tracking ID. Writes invalidate their
+# entries; the TTL bounds staleness for writes made by other workers.
+tracking_cache = LRUCache(
+    maxsize=int(os.getenv("TRACKING_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TRACKING_CACHE_TTL", "30")),
+)
+
+
+# Users behind bearer tokens, keyed by user ID (see app/auth.py). Password
+# and role changes invalidate; the TTL bounds staleness across workers.
+user_cache = LRUCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+
+class AuthUser(NamedTuple):
+    id: str
+    email: str
+    full_name: str
+    role: str
+    created_at: Optional[datetime]
+
+
+class TrackingValidators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+class TrackingEntry(NamedTuple):
+    data: dict
+    validators: TrackingValidators
+    body: bytes  # data encoded as a TrackingResponse
+
+
+def _tracking_validators(
+    tracking_id: str,
+    updated_at: Optional[datetime],
+    created_at: Optional[datetime],
+    last_history_at: Optional[datetime],
+    history_count: int,
+) -> TrackingValidators:
+    """Derive the ETag and Last-Modified of a parcel's tracking state"""
+    version = "|".join(
+        str(part)
+        for part in (
+            tracking_id,
+            updated_at,
+            created_at,
+            last_history_at,
+            history_count,
+        )
+    )
+    digest = hashlib.blake2b(version.encode(), digest_size=12).hexdigest()
+    last_modified = max(
+        (t for t in (updated_at, created_at, last_history_at) if t is not None),
+        default=None,
+    )
+    return TrackingValidators(etag=f'W/"{digest}"', last_modified=last_modified)
+
+
+def invalidate_tracking(*tracking_ids: str):
+    """Drop cached tracking responses after a committed write"""
+    tracking_cache.invalidate(*tracking_ids)
+
+
+# Postgres channel carrying tracking updates to every worker's WebSocket hub
+TRACKING_CHANNEL = os.getenv("TRACKING_NOTIFY_CHANNEL", "tracking_updates")
+NOTIFY_PAYLOAD_LIMIT = 7900  # Postgres rejects payloads of 8000 bytes or more
+
+
+def tracking_event(
+    tracking_id: str,
+    status: str,
+    location: str,
+    description: Optional[str] = None,
+    coordinates: Optional[dict] = None,
+) -> str:
+    """Encode a tracking update as the JSON message sent to subscribers"""
+    event = {
+        "type": "location_update",
+        "tracking_id": tracking_id,
+        "status": status,
+        "location": location,
+        "description": description,
+        "coordinates": coordinates,
+        "timestamp": datetime.now().isoformat(),
+    }
+    payload = json.dumps(event, default=str)
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        event["description"] = None
+        payload = json.dumps(event, default=str)
+    return payload
+
+
+def notify_tracking_updates(db: Session, events: List[str]):
+    """Queue tracking events for delivery when the current transaction commits"""
+    if not events:
+        return
+    db.execute(
+        text(
+            "SELECT pg_notify(:channel, payload) "
+            "FROM unnest(CAST(:payloads AS text[])) AS payload"
+        ),
+        {"channel": TRACKING_CHANNEL, "payloads": events},
+    )
+
+
+# Statistics counters (models.StatCounter), updated in the writer's transaction
+STAT_COUNTER_SHARDS = int(os.getenv("STAT_COUNTER_SHARDS", "16"))
+# pg_try_advisory_xact_lock key that keeps reconciliation single-flight
+STATS_RECONCILE_LOCK = 7_531_001
+
+
+def _add_to_counters(db: Session, shard: int, deltas: dict):
+    rows = [
+        {"name": name, "shard": shard, "value": delta}
+        # Sorted, so concurrent writers lock rows of a shard in one order
+        for name, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(models.StatCounter).values(rows)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.StatCounter.name, models.StatCounter.shard],
+            set_={"value": models.StatCounter.value + stmt.excluded.value},
+        )
+    )
+
+
+def increment_counters(db: Session, deltas: dict):
+    """Add to statistics counters without committing"""
+    _add_to_counters(db, random.randrange(STAT_COUNTER_SHARDS), deltas)
+
+
+def status_deltas(changes) -> Counter:
+    """Counter deltas for parcels moving between statuses, as (old, new)"""
+    deltas = Counter()
+    for old, new in changes:
+        if old != new:
+            if old is not None:
+                deltas[f"parcels.status.{old}"] -= 1
+            deltas[f"parcels.status.{new}"] += 1
+    return deltas
+
+
+def revenue_cents(amount: float) -> int:
+    return round(amount * 100)
 
 
 # Parcel CRUD operations
-def calculate_shipping_cost(weight: float, destination: str) -> float:
-    """Calculate shipping cost"""
-    base_cost = 10
-    weight_cost = weight * 2
-    multipliers = {"US": 1.2, "UK": 1.3, "CA": 1.1, "AU": 1.5, "EU": 1.0}
-    multiplier = multipliers.get(destination, 1.0)
-    return (base_cost + weight_cost) * multiplier
+# Request fields that are not parcel columns
+PARCEL_EXCLUDED_FIELDS = {"sender_address", "contents"}
+INITIAL_LOCATION = "Warehouse - Origin"
+INITIAL_DESCRIPTION = "Parcel registered in system"
+# Tries at inserting new parcels before giving up on tracking ID conflicts
+TRACKING_ID_ATTEMPTS = 3
+
+
+def _new_parcel_rows(parcels: List[schemas.CreateParcel]):
+    """Column values for new parcels and their initial history rows
+
+    Raises ValueError if a parcel cannot be priced (a non-finite cost), so
+    nothing is written for it.
+    """
+    quotes = rate_cards.get().quote(
+        [p.weight for p in parcels],
+        [p.dimensions.length for p in parcels],
+        [p.dimensions.width for p in parcels],
+        [p.dimensions.height for p in parcels],
+        [CM_PER_UNIT[p.dimensions.unit] for p in parcels],
+        [p.destination_country for p in parcels],
+    )
+    if not (
+        np.isfinite(quotes.shipping_cost).all() and np.isfinite(quotes.border_fee).all()
+    ):
+        raise ValueError("Could not price parcel")
+    estimated_delivery = datetime.now() + timedelta(days=7)
 
+    parcel_rows = []
+    history_rows = []
+    for parcel, tracking_id, shipping_cost, border_fee in zip(
+        parcels,
+        tracking_ids.generate.many(len(parcels)),
+        quotes.shipping_cost.tolist(),
+        quotes.border_fee.tolist(),
+    ):
+        parcel_id = models.generate_uuid()
+        parcel_rows.append(
+            {
+                **parcel.dict(exclude=PARCEL_EXCLUDED_FIELDS),
+                "id": parcel_id,
+                "tracking_id": tracking_id,
+                "shipping_cost": shipping_cost,
+                "border_fee": border_fee,
+                "border_fee_paid": False,
+                "status": "pending",
+                "current_location": INITIAL_LOCATION,
+                "estimated_delivery": estimated_delivery,
+            }
+        )
+        history_rows.append(
+            {
+                "id": models.generate_uuid(),
+                "parcel_id": parcel_id,
+                "status": "pending",
+                "location": INITIAL_LOCATION,
+                "description": INITIAL_DESCRIPTION,
+            }
+        )
+    return parcel_rows, history_rows
 
-def calculate_border_fee(destination: str) -> float:
-    """Calculate border fee"""
-    fees = {"US": 25, "UK": 30, "CA": 20, "AU": 35, "EU": 15}
-    return fees.get(destination, 20)
+
+def _insert_parcels(db: Session, parcel_rows: List[dict]):
+    """Insert parcel rows, drawing fresh tracking IDs for any already taken
+
+    A process that lost its node lease can share the node with another one
+    until it notices (app/tracking_ids.py); conflicting rows are skipped by
+    the INSERT and retried with new IDs instead of failing the request.
+    """
+    pending = parcel_rows
+    for _ in range(TRACKING_ID_ATTEMPTS):
+        inserted = set(
+            db.execute(
+                pg_insert(models.Parcel)
+                .on_conflict_do_nothing(index_elements=["tracking_id"])
+                .returning(models.Parcel.id),
+                pending,
+            ).scalars()
+        )
+        pending = [row for row in pending if row["id"] not in inserted]
+        if not pending:
+            return
+        tracking_ids.generate.check_lease()
+        for row, tracking_id in zip(pending, tracking_ids.generate.many(len(pending))):
+            row["tracking_id"] = tracking_id
+    raise RuntimeError("Could not draw unused tracking IDs")
 
 
 def create_parcel(db: Session, parcel: schemas.CreateParcel):
     """Create a new parcel"""
+    parcel_rows, history_rows = _new_parcel_rows([parcel])
 
-    # Calculate costs
-    shipping_cost = calculate_shipping_cost(parcel.weight, parcel.destination_country)
-    border_fee = calculate_border_fee(parcel.destination_country)
+    # Parcel and its initial tracking history in one transaction
+    _insert_parcels(db, parcel_rows)
+    db.add(models.TrackingHistory(**history_rows[0]))
+    increment_counters(db, {"parcels": 1, "parcels.status.pending": 1})
+    db.commit()
 
-    # Create parcel instance
-    db_parcel = models.Parcel(
-        **parcel.dict(),
-        shipping_cost=shipping_cost,
-        border_fee=border_fee,
-        status="pending",
-        current_location="Warehouse - Origin",
-        estimated_delivery=datetime.now() + timedelta(days=7),
-    )
+    return db.get(models.Parcel, parcel_rows[0]["id"])
 
-    db.add(db_parcel)
-    db.commit()
-    db.refresh(db_parcel)
 
-    # Create initial tracking history
-    tracking_history = models.TrackingHistory(
-        parcel_id=db_parcel.id,
-        status="pending",
-        location="Warehouse - Origin",
-        description="Parcel registered in system",
-    )
+def create_parcels_bulk(db: Session, parcels: List[schemas.CreateParcel]):
+    """Create parcels with two multi-row INSERTs and one commit
 
-    db.add(tracking_history)
+    Returns (id, tracking_id) pairs in input order.
+    """
+    if not parcels:
+        return []
+
+    parcel_rows, history_rows = _new_parcel_rows(parcels)
+    _insert_parcels(db, parcel_rows)
+    db.execute(insert(models.TrackingHistory), history_rows)
+    increment_counters(
+        db, {"parcels": len(parcels), "parcels.status.pending": len(parcels)}
+    )
     db.commit()
 
-    return db_parcel
+    return [(row["id"], row["tracking_id"]) for row in parcel_rows]
 
 
 def get_parcel_by_tracking_id(db: Session, tracking_id: str):
@@ -65,6 +311,8 @@ def get_parcel_by_tracking_id(db: Session, tracking_id: str):
 
 def get_parcel_by_id(db: Session, parcel_id: str):
     """Get parcel by ID"""
+    if not models.is_valid_id(parcel_id):
+        return None
     return db.query(models.Parcel).filter(models.Parcel.id == parcel_id).first()
 
 
@@ -72,20 +320,29 @@ def update_parcel_location(
     db: Session, tracking_id: str, location_data: schemas.UpdateLocation
 ):
     """Update parcel location"""
-    parcel = get_parcel_by_tracking_id(db, tracking_id)
+    # Locked, so the status counters see the status this update replaces
+    parcel = (
+        db.query(models.Parcel)
+        .filter(models.Parcel.tracking_id == tracking_id)
+        .with_for_update()
+        .first()
+    )
     if not parcel:
         return None
 
+    coordinates = (
+        location_data.coordinates.dict() if location_data.coordinates else None
+    )
+
     # Update parcel
+    increment_counters(db, status_deltas([(parcel.status, location_data.status.value)]))
     parcel.current_location = location_data.location
     parcel.status = location_data.status
 
-    if location_data.coordinates:
-        parcel.coordinates = location_data.coordinates
+    if coordinates:
+        parcel.coordinates = coordinates
 
     parcel.updated_at = datetime.now()
-    db.commit()
-    db.refresh(parcel)
 
     # Add to tracking history
     tracking_history = models.TrackingHistory(
@@ -93,86 +350,345 @@ def update_parcel_location(
         status=location_data.status,
         location=location_data.location,
         description=location_data.description,
-        coordinates=location_data.coordinates,
+        coordinates=coordinates,
     )
 
     db.add(tracking_history)
+    notify_tracking_updates(
+        db,
+        [
+            tracking_event(
+                tracking_id,
+                location_data.status.value,
+                location_data.location,
+                location_data.description,
+                coordinates,
+            )
+        ],
+    )
     db.commit()
+    db.refresh(parcel)
+    invalidate_tracking(tracking_id)
 
     return parcel
 
 
-def get_tracking_history(db: Session, tracking_id: str):
-    """Get tracking history for a parcel"""
-    parcel = get_parcel_by_tracking_id(db, tracking_id)
-    if not parcel:
-        return None
+def bulk_update_parcel_locations(
+    db: Session, updates: List[schemas.BulkLocationUpdate]
+):
+    """Apply a batch of location updates in one transaction
+
+    Returns the set of tracking IDs that matched a parcel.
+    """
+    if not updates:
+        return set()
+
+    # Locked in key order: the counters need the statuses being replaced
+    matched = (
+        db.query(models.Parcel.tracking_id, models.Parcel.id, models.Parcel.status)
+        .filter(models.Parcel.tracking_id.in_({u.tracking_id for u in updates}))
+        .order_by(models.Parcel.id)
+        .with_for_update()
+        .all()
+    )
+    if not matched:
+        return set()
+    parcel_ids = {tracking_id: parcel_id for tracking_id, parcel_id, _ in matched}
+    previous_status = {parcel_id: status for _, parcel_id, status in matched}
+
+    now = datetime.now()
+    latest = {}
+    history_rows = []
+    events = []
+    for offset, update_data in enumerate(updates):
+        parcel_id = parcel_ids.get(update_data.tracking_id)
+        if parcel_id is None:
+            continue
+
+        coordinates = (
+            update_data.coordinates.dict() if update_data.coordinates else None
+        )
+        # Later scans of the same parcel win; history keeps every scan in order
+        previous = latest.get(parcel_id)
+        latest[parcel_id] = {
+            "id": parcel_id,
+            "status": update_data.status.value,
+            "current_location": update_data.location,
+            "coordinates": coordinates
+            or (previous["coordinates"] if previous else None),
+        }
+        history_rows.append(
+            {
+                "parcel_id": parcel_id,
+                "status": update_data.status.value,
+                "location": update_data.location,
+                "description": update_data.description,
+                "coordinates": coordinates,
+                "created_at": now + timedelta(microseconds=offset),
+            }
+        )
+        events.append(
+            tracking_event(
+                update_data.tracking_id,
+                update_data.status.value,
+                update_data.location,
+                update_data.description,
+                coordinates,
+            )
+        )
+
+    scans = values(
+        column("id", models.Id),
+        column("status", String),
+        column("current_location", String),
+        column("coordinates", JSON(none_as_null=True)),
+        name="scans",
+    ).data(
+        [
+            (row["id"], row["status"], row["current_location"], row["coordinates"])
+            for row in latest.values()
+        ]
+    )
+
+    # One set-based UPDATE ... FROM (VALUES ...) for the parcels
+    db.execute(
+        update(models.Parcel)
+        # Literal VALUES columns default to text; match the key type
+        .where(models.Parcel.id == cast(scans.c.id, models.Id))
+        .values(
+            status=scans.c.status,
+            current_location=scans.c.current_location,
+            coordinates=func.coalesce(
+                cast(scans.c.coordinates, models.Document), models.Parcel.coordinates
+            ),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    # One multi-row INSERT for the history
+    db.execute(insert(models.TrackingHistory), history_rows)
+    increment_counters(
+        db,
+        status_deltas(
+            (previous_status[parcel_id], row["status"])
+            for parcel_id, row in latest.items()
+        ),
+    )
+    notify_tracking_updates(db, events)
+    db.commit()
+    invalidate_tracking(*parcel_ids)
+
+    return set(parcel_ids)
+
+
+def get_tracking_entry(db: Session, tracking_id: str) -> Optional[TrackingEntry]:
+    """Get tracking history for a parcel together with its cache validators"""
+    cached = tracking_cache.get(tracking_id)
+    if cached is not None:
+        return cached
+    generation = tracking_cache.generation
 
-    # Get tracking history
-    history = (
-        db.query(models.TrackingHistory)
-        .filter(models.TrackingHistory.parcel_id == parcel.id)
+    # Parcel and history in a single round trip
+    rows = (
+        db.query(
+            models.Parcel.id,
+            models.Parcel.tracking_id,
+            models.Parcel.status,
+            models.Parcel.current_location,
+            models.Parcel.coordinates,
+            models.Parcel.border_fee,
+            models.Parcel.border_fee_paid,
+            models.Parcel.estimated_delivery,
+            models.Parcel.created_at,
+            models.Parcel.updated_at,
+            models.TrackingHistory.id.label("history_id"),
+            models.TrackingHistory.status.label("history_status"),
+            models.TrackingHistory.location.label("history_location"),
+            models.TrackingHistory.description.label("history_description"),
+            models.TrackingHistory.coordinates.label("history_coordinates"),
+            models.TrackingHistory.created_at.label("history_created_at"),
+        )
+        .outerjoin(
+            models.TrackingHistory,
+            models.TrackingHistory.parcel_id == models.Parcel.id,
+        )
+        .filter(models.Parcel.tracking_id == tracking_id)
         .order_by(models.TrackingHistory.created_at)
         .all()
     )
+    if not rows:
+        return None
 
-    return {
+    parcel = rows[0]
+    tracking_data = {
         "tracking_id": parcel.tracking_id,
         "status": parcel.status,
         "current_location": parcel.current_location,
+        "coordinates": parcel.coordinates,
         "border_fee": parcel.border_fee,
         "border_fee_paid": parcel.border_fee_paid,
         "estimated_delivery": parcel.estimated_delivery,
         "history": [
             {
-                "status": h.status,
-                "location": h.location,
-                "description": h.description,
-                "created_at": h.created_at,
+                "id": h.history_id,
+                "status": h.history_status,
+                "location": h.history_location,
+                "description": h.history_description,
+                "coordinates": h.history_coordinates,
+                "created_at": h.history_created_at,
             }
-            for h in history
+            for h in rows
+            if h.history_id is not None
         ],
     }
 
+    # Validators cover the rows still in the database, like
+    # get_tracking_validators; archived rows never change
+    history = tracking_data["history"]
+    validators = _tracking_validators(
+        parcel.tracking_id,
+        parcel.updated_at,
+        parcel.created_at,
+        history[-1]["created_at"] if history else None,
+        len(history),
+    )
+    if parcel.status in history_archive.ARCHIVED_STATUSES:
+        archived = history_archive.archived_history(db, parcel.id, parcel.created_at)
+        if archived:
+            tracking_data["history"] = sorted(
+                archived + history, key=lambda h: h["created_at"]
+            )
+
+    # Encoded once here, so cache hits cost no serialization
+    entry = TrackingEntry(
+        tracking_data, validators, serialization.encode_tracking(tracking_data)
+    )
+    tracking_cache.set(tracking_id, entry, generation=generation)
+    return entry
+
+
+def get_tracking_history(db: Session, tracking_id: str):
+    """Get tracking history for a parcel"""
+    entry = get_tracking_entry(db, tracking_id)
+    return entry.data if entry else None
+
+
+def get_tracking_validators(
+    db: Session, tracking_id: str
+) -> Optional[TrackingValidators]:
+    """Get the ETag/Last-Modified of a parcel without loading its history"""
+    cached = tracking_cache.get(tracking_id)
+    if cached is not None:
+        return cached.validators
+
+    # Served from the tracking_id and (parcel_id, created_at) indexes
+    row = (
+        db.query(
+            models.Parcel.tracking_id,
+            models.Parcel.updated_at,
+            models.Parcel.created_at,
+            func.max(models.TrackingHistory.created_at),
+            func.count(models.TrackingHistory.parcel_id),
+        )
+        .outerjoin(
+            models.TrackingHistory,
+            models.TrackingHistory.parcel_id == models.Parcel.id,
+        )
+        .filter(models.Parcel.tracking_id == tracking_id)
+        .group_by(models.Parcel.id)
+        .first()
+    )
+    if not row:
+        return None
+
+    return _tracking_validators(*row)
+
+
+def encode_parcel_cursor(parcel) -> str:
+    """Opaque keyset cursor pointing just past a parcel"""
+    position = json.dumps([parcel.created_at.isoformat(), parcel.id])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_parcel_cursor(cursor: str):
+    """Decode a cursor into (created_at, id); raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, parcel_id = json.loads(base64.urlsafe_b64decode(padded))
+        created_at, parcel_id = datetime.fromisoformat(created_at), str(parcel_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not models.is_valid_id(parcel_id):
+        raise ValueError("Invalid cursor")
+    return created_at, parcel_id
+
+
+def next_parcel_cursor(parcels: list, limit: int) -> Optional[str]:
+    """Cursor for the page after ``parcels``, or None if it was the last"""
+    if len(parcels) < limit:
+        return None
+    return encode_parcel_cursor(parcels[-1])
+
+
+def _paginate_parcels(query, skip: int, limit: int, cursor: Optional[str]):
+    """Newest first; keyset on (created_at, id) when a cursor is given"""
+    if cursor:
+        created_at, parcel_id = decode_parcel_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Parcel.created_at, models.Parcel.id)
+            < tuple_(
+                created_at,
+                parcel_id,
+                types=[models.Parcel.created_at.type, models.Parcel.id.type],
+            )
+        )
+    elif skip:
+        query = query.offset(skip)
 
-def get_user_parcels(db: Session, user_id: str, skip: int = 0, limit: int = 100):
-    """Get all parcels for a user"""
     return (
-        db.query(models.Parcel)
-        .filter(models.Parcel.user_id == user_id)
-        .order_by(models.Parcel.created_at.desc())
-        .offset(skip)
+        query.order_by(models.Parcel.created_at.desc(), models.Parcel.id.desc())
         .limit(limit)
         .all()
     )
 
 
+def get_user_parcels(
+    db: Session,
+    user_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    """Get all parcels for a user"""
+    if not models.is_valid_id(user_id):
+        return []
+    query = db.query(models.Parcel).filter(models.Parcel.user_id == user_id)
+    return _paginate_parcels(query, skip, limit, cursor)
+
+
 def search_parcels(
     db: Session,
     tracking_id: Optional[str] = None,
     status: Optional[str] = None,
     email: Optional[str] = None,
+    name: Optional[str] = None,
+    phone: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
 ):
     """Search parcels by criteria"""
-    query = db.query(models.Parcel)
-
-    if tracking_id:
-        query = query.filter(models.Parcel.tracking_id.ilike(f"%{tracking_id}%"))
+    query = db.query(models.Parcel).filter(
+        *search.parcel_filters(
+            models.Parcel, tracking_id=tracking_id, email=email, name=name, phone=phone
+        )
+    )
 
     if status:
         query = query.filter(models.Parcel.status == status)
 
-    if email:
-        query = query.filter(
-            (models.Parcel.sender_email.ilike(f"%{email}%"))
-            | (models.Parcel.recipient_email.ilike(f"%{email}%"))
-        )
-
-    return (
-        query.order_by(models.Parcel.created_at.desc()).offset(skip).limit(limit).all()
-    )
+    return _paginate_parcels(query, skip, limit, cursor)
 
 
 # User CRUD operations
@@ -183,6 +699,8 @@ def get_user_by_email(db: Session, email: str):
 
 def get_user_by_id(db: Session, user_id: str):
     """Get user by ID"""
+    if not models.is_valid_id(user_id):
+        return None
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
@@ -200,6 +718,56 @@ def create_user(db: Session, user: schemas.UserCreate):
     return db_user
 
 
+def get_auth_user(db: Session, user_id: str) -> Optional[AuthUser]:
+    """The user a token belongs to, from user_cache when possible"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = user_cache.generation
+
+    if not models.is_valid_id(user_id):
+        return None
+    row = (
+        db.query(
+            models.User.id,
+            models.User.email,
+            models.User.full_name,
+            models.User.role,
+            models.User.created_at,
+        )
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    if not row:
+        return None
+    user = AuthUser(row.id, row.email, row.full_name, row.role, row.created_at)
+    user_cache.set(user_id, user, generation=generation)
+    return user
+
+
+def invalidate_user(*user_ids: str):
+    """Drop cached auth users after a committed password or role change"""
+    user_cache.invalidate(*user_ids)
+
+
+def update_user_password(db: Session, user_id: str, hashed_password: str):
+    """Replace a user's password hash"""
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.password: hashed_password}, synchronize_session=False
+    )
+    db.commit()
+    invalidate_user(user_id)
+
+
+def update_user_role(db: Session, user_id: str, role: str):
+    """Change a user's role; takes effect on their next request"""
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.role: role}, synchronize_session=False
+    )
+    db.commit()
+    invalidate_user(user_id)
+
+
 # Payment CRUD operations
 def create_payment(db: Session, payment_data: dict):
     """Create a payment record"""
@@ -210,8 +778,22 @@ def create_payment(db: Session, payment_data: dict):
     return db_payment
 
 
+def record_payment_intent(db: Session, payment_data: dict):
+    """Create a payment record unless one exists for the same Stripe intent
+
+    Retried requests reuse their idempotency key and so get the same intent
+    back from Stripe; they must not add a second record for it.
+    """
+    existing = get_payment_by_stripe_id(db, payment_data["payment_id"])
+    if existing:
+        return existing
+    return create_payment(db, payment_data)
+
+
 def get_payment_by_id(db: Session, payment_id: str):
     """Get payment by ID"""
+    if not models.is_valid_id(payment_id):
+        return None
     return db.query(models.Payment).filter(models.Payment.id == payment_id).first()
 
 
@@ -226,8 +808,21 @@ def get_payment_by_stripe_id(db: Session, stripe_payment_id: str):
 
 def update_payment_status(db: Session, payment_id: str, status: str):
     """Update payment status"""
-    payment = get_payment_by_id(db, payment_id)
+    payment = (
+        db.query(models.Payment)
+        .filter(models.Payment.id == payment_id)
+        .with_for_update()
+        .first()
+    )
     if payment:
+        # Revenue counts completed payments only
+        revenue = f"revenue_cents.{payment.type}"
+        deltas = Counter()
+        if payment.status == "completed":
+            deltas[revenue] -= revenue_cents(payment.amount)
+        if status == "completed":
+            deltas[revenue] += revenue_cents(payment.amount)
+        increment_counters(db, deltas)
         payment.status = status
         if status == "completed":
             payment.completed_at = datetime.now()
@@ -236,6 +831,245 @@ def update_payment_status(db: Session, payment_id: str, status: str):
     return payment
 
 
+def complete_payments(db: Session, completions: dict):
+    """Complete payments by Stripe intent ID, clearing border-fee parcels
+
+    ``completions`` maps intent IDs to card details (or None). Applies the
+    whole set with a fixed number of statements and does not commit.
+    Returns the intent IDs that matched a payment and the tracking IDs of
+    parcels that were cleared.
+    """
+    if not completions:
+        return set(), []
+
+    payments = (
+        db.query(models.Payment)
+        .filter(models.Payment.payment_id.in_(completions))
+        .with_for_update()
+        .all()
+    )
+    found = {payment.payment_id for payment in payments}
+    pending = [payment for payment in payments if payment.status != "completed"]
+    if not pending:
+        return found, []
+
+    now = datetime.now()
+    completed = values(
+        column("payment_id", String),
+        column("payment_details", JSON(none_as_null=True)),
+        name="completed",
+    ).data(
+        [
+            (
+                payment.payment_id,
+                {**(payment.payment_details or {}), **completions[payment.payment_id]}
+                if completions[payment.payment_id]
+                else payment.payment_details,
+            )
+            for payment in pending
+        ]
+    )
+    db.execute(
+        update(models.Payment)
+        .where(models.Payment.payment_id == completed.c.payment_id)
+        .values(
+            status="completed",
+            completed_at=now,
+            payment_details=cast(completed.c.payment_details, models.Document),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    deltas = Counter()
+    for payment in pending:
+        deltas[f"revenue_cents.{payment.type}"] += revenue_cents(payment.amount)
+
+    # Border fees clear the parcel; skip parcels already cleared
+    border_parcel_ids = {p.parcel_id for p in pending if p.type == "border_fee"}
+    cleared = []
+    if border_parcel_ids:
+        # The locked subquery supplies each parcel's status before the update
+        previous = (
+            select(models.Parcel.id, models.Parcel.status)
+            .where(
+                models.Parcel.id.in_(border_parcel_ids),
+                models.Parcel.border_fee_paid.isnot(True),
+            )
+            .with_for_update()
+            .subquery("previous")
+        )
+        cleared = db.execute(
+            update(models.Parcel)
+            .where(models.Parcel.id == previous.c.id)
+            .values(border_fee_paid=True, status="border_cleared", updated_at=now)
+            .returning(
+                models.Parcel.id,
+                models.Parcel.tracking_id,
+                models.Parcel.current_location,
+                models.Parcel.coordinates,
+                previous.c.status.label("previous_status"),
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        deltas.update(
+            status_deltas(
+                (parcel.previous_status, "border_cleared") for parcel in cleared
+            )
+        )
+    increment_counters(db, deltas)
+    if not cleared:
+        return found, []
+
+    description = "Border fee paid and cleared customs"
+    db.execute(
+        insert(models.TrackingHistory),
+        [
+            {
+                "parcel_id": parcel.id,
+                "status": "border_cleared",
+                "location": parcel.current_location,
+                "description": description,
+                "created_at": now,
+            }
+            for parcel in cleared
+        ],
+    )
+    notify_tracking_updates(
+        db,
+        [
+            tracking_event(
+                parcel.tracking_id,
+                "border_cleared",
+                parcel.current_location,
+                description,
+                parcel.coordinates,
+            )
+            for parcel in cleared
+        ],
+    )
+    return found, [parcel.tracking_id for parcel in cleared]
+
+
+def fail_payments(db: Session, stripe_payment_ids: List[str]):
+    """Mark payments failed unless already completed; does not commit
+
+    Returns the intent IDs that matched a payment.
+    """
+    if not stripe_payment_ids:
+        return set()
+
+    found = set(
+        db.scalars(
+            select(models.Payment.payment_id).where(
+                models.Payment.payment_id.in_(stripe_payment_ids)
+            )
+        )
+    )
+    db.execute(
+        update(models.Payment)
+        .where(
+            models.Payment.payment_id.in_(stripe_payment_ids),
+            models.Payment.status != "completed",
+        )
+        .values(status="failed")
+        .execution_options(synchronize_session=False)
+    )
+    return found
+
+
+# Webhook inbox
+def store_webhook_event(db: Session, event_id: str, event_type: str, payload: dict):
+    """Add a verified event to the inbox; False if it was already received"""
+    result = db.execute(
+        pg_insert(models.WebhookEvent)
+        .values(
+            id=event_id,
+            type=event_type,
+            payload=payload,
+            status="pending",
+            attempts=0,
+        )
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_webhook_events(db: Session, limit: int):
+    """Lock up to ``limit`` due events, skipping those other workers hold"""
+    return (
+        db.query(models.WebhookEvent)
+        .filter(
+            models.WebhookEvent.status == "pending",
+            models.WebhookEvent.next_attempt_at <= func.now(),
+        )
+        .order_by(models.WebhookEvent.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def finish_webhook_events(
+    db: Session,
+    outcomes: dict,
+    max_attempts: int,
+    retry_base: float,
+    retry_max: float,
+):
+    """Record processing outcomes and commit
+
+    ``outcomes`` maps event IDs to None on success or an error message.
+    Failed events are retried with exponential backoff until
+    ``max_attempts`` is reached, then left as failed.
+    """
+    done = [event_id for event_id, error in outcomes.items() if error is None]
+    if done:
+        db.execute(
+            update(models.WebhookEvent)
+            .where(models.WebhookEvent.id.in_(done))
+            .values(
+                status="processed",
+                attempts=models.WebhookEvent.attempts + 1,
+                processed_at=func.now(),
+                last_error=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    errors = [(event_id, error) for event_id, error in outcomes.items() if error]
+    if errors:
+        failed = values(
+            column("id", String), column("error", String), name="failed"
+        ).data(errors)
+        attempts = models.WebhookEvent.attempts + 1
+        delay = func.least(
+            retry_base * func.power(2, models.WebhookEvent.attempts), retry_max
+        )
+        db.execute(
+            update(models.WebhookEvent)
+            .where(models.WebhookEvent.id == failed.c.id)
+            .values(
+                attempts=attempts,
+                last_error=failed.c.error,
+                status=case((attempts >= max_attempts, "failed"), else_="pending"),
+                next_attempt_at=func.now() + delay * text("interval '1 second'"),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    db.commit()
+
+
+def webhook_backlog(db: Session):
+    """Number of pending inbox events and when the oldest was received"""
+    return (
+        db.query(func.count(), func.min(models.WebhookEvent.received_at))
+        .filter(models.WebhookEvent.status == "pending")
+        .one()
+    )
+
+
 def get_parcel_payments(db: Session, parcel_id: str):
     """Get all payments for a parcel"""
     return (
@@ -244,3 +1078,150 @@ def get_parcel_payments(db: Session, parcel_id: str):
         .order_by(models.Payment.created_at.desc())
         .all()
     )
+
+
+# Statistics
+def get_statistics(db: Session) -> dict:
+    """Current counter values by name; reads a fixed number of rows"""
+    return {
+        name: int(value)
+        for name, value in db.query(
+            models.StatCounter.name, func.sum(models.StatCounter.value)
+        ).group_by(models.StatCounter.name)
+    }
+
+
+def reconcile_statistics(db: Session) -> Optional[dict]:
+    """Correct counter drift against the tables; commits
+
+    Counts the tables and reads the counters in one REPEATABLE READ
+    snapshot, then adds the difference to the correction shard, which
+    writers never touch. Returns the corrections, or None if another
+    reconciliation is running.
+    """
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    if not db.scalar(select(func.pg_try_advisory_xact_lock(STATS_RECONCILE_LOCK))):
+        db.rollback()
+        return None
+
+    actual = Counter()
+    for status, count in db.query(models.Parcel.status, func.count()).group_by(
+        models.Parcel.status
+    ):
+        actual["parcels"] += count
+        if status is not None:
+            actual[f"parcels.status.{status}"] = count
+    for payment_type, cents in (
+        db.query(
+            models.Payment.type,
+            func.sum(func.round(cast(models.Payment.amount, Numeric) * 100)),
+        )
+        .filter(models.Payment.status == "completed")
+        .group_by(models.Payment.type)
+    ):
+        actual[f"revenue_cents.{payment_type}"] = int(cents)
+
+    counted = get_statistics(db)
+    corrections = {
+        name: actual.get(name, 0) - counted.get(name, 0)
+        for name in actual.keys() | counted.keys()
+        if actual.get(name, 0) != counted.get(name, 0)
+    }
+    _add_to_counters(db, -1, corrections)
+    db.commit()
+    return corrections
+
+
+# Exports
+EXPORT_COLUMNS = {
+    "parcels": [
+        models.Parcel.id,
+        models.Parcel.tracking_id,
+        models.Parcel.sender_name,
+        models.Parcel.sender_email,
+        models.Parcel.sender_phone,
+        models.Parcel.recipient_name,
+        models.Parcel.recipient_email,
+        models.Parcel.recipient_phone,
+        models.Parcel.recipient_address,
+        models.Parcel.destination_country,
+        models.Parcel.weight,
+        models.Parcel.dimensions,
+        models.Parcel.status,
+        models.Parcel.current_location,
+        models.Parcel.coordinates,
+        models.Parcel.shipping_cost,
+        models.Parcel.border_fee,
+        models.Parcel.border_fee_paid,
+        models.Parcel.estimated_delivery,
+        models.Parcel.actual_delivery,
+        models.Parcel.user_id,
+        models.Parcel.created_at,
+        models.Parcel.updated_at,
+    ],
+    "payments": [
+        models.Payment.id,
+        models.Payment.parcel_id,
+        models.Parcel.tracking_id,
+        models.Payment.payment_id,
+        models.Payment.type,
+        models.Payment.amount,
+        models.Payment.status,
+        models.Payment.completed_at,
+        models.Payment.created_at,
+    ],
+    "tracking_history": [
+        models.TrackingHistory.id,
+        models.TrackingHistory.parcel_id,
+        models.Parcel.tracking_id,
+        models.TrackingHistory.status,
+        models.TrackingHistory.location,
+        models.TrackingHistory.description,
+        models.TrackingHistory.coordinates,
+        models.TrackingHistory.created_at,
+    ],
+}
+EXPORT_MODELS = {
+    "parcels": models.Parcel,
+    "payments": models.Payment,
+    "tracking_history": models.TrackingHistory,
+}
+
+
+def export_statement(
+    kind: str,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    destination: Optional[str] = None,
+):
+    """SELECT for an export; status and dates apply to the exported rows
+
+    Parcels come oldest first along ix_parcels_created_at_id; payments and
+    history in no particular order, so the database never has to sort
+    them. History rows already archived (app/history_archive.py) are not
+    included.
+    """
+    model = EXPORT_MODELS[kind]
+    statement = select(*EXPORT_COLUMNS[kind])
+    if model is models.Parcel:
+        statement = statement.order_by(models.Parcel.created_at, models.Parcel.id)
+    else:
+        statement = statement.join(models.Parcel, models.Parcel.id == model.parcel_id)
+    if status:
+        statement = statement.where(model.status == status)
+    if created_from:
+        statement = statement.where(model.created_at >= created_from)
+    if created_to:
+        statement = statement.where(model.created_at < created_to)
+    if destination:
+        statement = statement.where(models.Parcel.destination_country == destination)
+    return statement
+
+
+def open_export(db: Session, statement, batch_size: int):
+    """Execute an export on a server-side cursor; the session must stay open"""
+    return db.execute(
+        statement,
+        execution_options={"stream_results": True, "yield_per": batch_size},
+    )
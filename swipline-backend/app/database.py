@@ -1,17 +1,202 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+from app.metrics import instrument_engine
 
 load_dotenv()
 
-DATABASE_URL = f"postgresql://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_DATABASE')}"
+DB_CREDENTIALS = f"{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_DATABASE')}"
+DATABASE_URL = f"postgresql://{DB_CREDENTIALS}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_CREDENTIALS}"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Serve requests from asyncpg sessions instead of psycopg2 ones in the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+# Native uuid/numeric/jsonb columns (app/models.py); set only once the database
+# has been converted with scripts/compact_schema.py
+DB_COMPACT_TYPES = os.getenv("DB_COMPACT_TYPES", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Pool sizing is per process: budget DB_POOL_SIZE + DB_MAX_OVERFLOW per worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Connections to open at startup; 0 opens them on first use
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))
+
+
+class PoolStats:
+    """Checkout counters for one connection pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+        self._waits = {}  # token -> start of each checkout in progress
+        self._next_token = 0
+
+    def start_wait(self, start: float) -> int:
+        with self._lock:
+            self.waiting += 1
+            self._next_token += 1
+            self._waits[self._next_token] = start
+            return self._next_token
+
+    def current_wait(self) -> float:
+        """Seconds the longest checkout still in progress has been waiting"""
+        with self._lock:
+            oldest = min(self._waits.values(), default=None)
+        return time.perf_counter() - oldest if oldest is not None else 0.0
+
+    def record(self, token: int, waited: float, timed_out: bool = False):
+        with self._lock:
+            del self._waits[token]
+            self.waiting -= 1
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "waiting": self.waiting,
+            "wait_avg_ms": round(
+                self.wait_total / self.checkouts * 1000 if self.checkouts else 0, 3
+            ),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "current_wait_ms": round(self.current_wait() * 1000, 3),
+        }
+
+
+class _TimedPoolMixin:
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        token = self.stats.start_wait(start)
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record(token, time.perf_counter() - start, timed_out)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    stats = PoolStats()
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+connect_args = {}
+async_connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS:
+    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    async_connect_args["server_settings"] = {
+        "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+    }
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=TimedQueuePool,
+    connect_args=connect_args,
+    **POOL_OPTIONS,
+)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
 Base = declarative_base()
 
+async_engine = (
+    create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=TimedAsyncQueuePool,
+        connect_args=async_connect_args,
+        **POOL_OPTIONS,
+    )
+    if DB_ASYNC
+    else None
+)
+# Statement counts and database time per request, for /metrics
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+
+AsyncSessionLocal = (
+    async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+    )
+    if DB_ASYNC
+    else None
+)
+
+
+def pool_status(pool) -> dict:
+    """Snapshot of a pool's occupancy and checkout wait statistics"""
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout_s": DB_POOL_TIMEOUT,
+        **pool.stats.as_dict(),
+    }
+
+
+async def warm_up_pool(connections: int = DB_POOL_WARMUP):
+    """Open up to ``connections`` pooled connections ahead of the first request
+
+    Capped at DB_POOL_SIZE, since overflow connections are closed on release.
+    """
+    connections = min(connections, DB_POOL_SIZE)
+    if connections <= 0:
+        return
+    if async_engine is not None:
+        opened = [await async_engine.connect() for _ in range(connections)]
+        for connection in opened:
+            await connection.close()
+        return
+
+    def open_connections():
+        opened = [engine.connect() for _ in range(connections)]
+        for connection in opened:
+            connection.close()
+
+    await run_in_threadpool(open_connections)
+
 
 def get_db():
     db = SessionLocal()
@@ -19,3 +204,39 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@asynccontextmanager
+async def session_scope():
+    """Session in whichever mode is configured, closed on exit
+
+    Routes that make slow external calls use this instead of get_session
+    so no pooled connection is held while they wait.
+    """
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as session:
+            yield session
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            # Returning the connection to the pool issues a ROLLBACK
+            await run_in_threadpool(db.close)
+
+
+async def get_session():
+    """Session dependency for async routes, in whichever mode is configured"""
+    async with session_scope() as session:
+        yield session
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync crud function without blocking the event loop
+
+    Async sessions run it on the loop through SQLAlchemy's greenlet bridge
+    (asyncpg); sync sessions run it in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,322 @@
+"""Monthly partitions of tracking_history and their cold archive
+
+tracking_history is range-partitioned on created_at, one partition per
+calendar month (UTC) named ``tracking_history_pYYYY_MM``, plus a default
+partition that catches rows outside every range. ``maintain_tracking_history``
+keeps partitions created ahead of time and moves partitions older than
+TRACKING_ARCHIVE_AFTER_DAYS out of the database:
+
+1. the rows of delivered and cancelled parcels are written, ordered by
+   parcel, to ``<partition>.jsonl.gz`` in TRACKING_ARCHIVE_DIR: gzip
+   members of ARCHIVE_BLOCK_ROWS rows each, with a ``<partition>.idx.json``
+   listing the first and last parcel id, offset and length of every block;
+2. in the same transaction those rows are deleted from the partition, the
+   file is recorded in tracking_history_archives and, once no rows are
+   left, the partition is detached and dropped; the file is renamed into
+   place just before the commit.
+
+Rows of parcels that are still moving stay in their partition, and a later
+run archives them to ``<partition>.<n>.jsonl.gz`` once those parcels are
+delivered or cancelled.
+
+Readers only consult the archive for delivered or cancelled parcels
+created before the end of an archived range, and then read one or two
+blocks per file. Every process serving tracking requests must see
+TRACKING_ARCHIVE_DIR (a shared volume when there is more than one host).
+"""
+import bisect
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+TRACKING_ARCHIVE_DIR = os.getenv("TRACKING_ARCHIVE_DIR", "archive/tracking_history")
+TRACKING_ARCHIVE_AFTER_DAYS = int(os.getenv("TRACKING_ARCHIVE_AFTER_DAYS", "365"))
+TRACKING_PARTITIONS_AHEAD = int(os.getenv("TRACKING_PARTITIONS_AHEAD", "3"))
+ARCHIVE_BLOCK_ROWS = 512
+ARCHIVED_STATUSES = ("delivered", "cancelled")
+MAINTENANCE_LOCK = 7_531_002
+
+PARENT = "tracking_history"
+DEFAULT_PARTITION = "tracking_history_default"
+_PARTITION_NAME = re.compile(r"^tracking_history_p(\d{4})_(\d{2})$")
+_COLUMNS = ("id", "parcel_id", "status", "location", "description", "coordinates")
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """First instant (UTC) of the month ``months`` after the one holding ``moment``"""
+    moment = moment.astimezone(timezone.utc)
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def partitions(db: Session) -> List[datetime]:
+    """Start of the month of every monthly partition, oldest first"""
+    names = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT},
+    ).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(
+                datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+            )
+    return sorted(months)
+
+
+def create_partition(db: Session, month: datetime) -> bool:
+    """Create the partition for a month unless it exists; the caller commits
+
+    Rows of that month already in the default partition are moved into it,
+    since a range cannot be attached while the default partition holds rows
+    inside it.
+    """
+    name = partition_name(month)
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+    bounds = {"lower": month, "upper": month_start(month, 1)}
+    in_range = "created_at >= :lower AND created_at < :upper"
+    db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+    db.execute(
+        text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"),
+        bounds,
+    )
+    db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+    db.execute(
+        text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{bounds['upper'].isoformat()}')"
+        )
+    )
+    return True
+
+
+def _archive_row(row) -> dict:
+    item = {column: getattr(row, column) for column in _COLUMNS}
+    item["id"] = str(item["id"])
+    item["parcel_id"] = str(item["parcel_id"])
+    item["created_at"] = row.created_at.isoformat()
+    return item
+
+
+def write_archive(path: str, rows: Iterable[dict]) -> int:
+    """Write rows (ordered by parcel_id) as gzip blocks plus their index
+
+    Both files are written under temporary names and renamed into place.
+    Returns the number of rows written.
+    """
+    blocks = []
+    count = 0
+    block: List[dict] = []
+
+    def flush(out):
+        offset = out.tell()
+        payload = "".join(json.dumps(item) + "\n" for item in block)
+        out.write(gzip.compress(payload.encode(), compresslevel=6))
+        blocks.append(
+            [block[0]["parcel_id"], block[-1]["parcel_id"], offset, out.tell() - offset]
+        )
+        block.clear()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as out:
+        for item in rows:
+            # Keep a parcel's rows in one block where possible
+            if (
+                len(block) >= ARCHIVE_BLOCK_ROWS
+                and item["parcel_id"] != block[-1]["parcel_id"]
+            ):
+                flush(out)
+            block.append(item)
+            count += 1
+        if block:
+            flush(out)
+        out.flush()
+        os.fsync(out.fileno())
+
+    index_path = _index_path(path)
+    with open(index_path + ".tmp", "w") as out:
+        json.dump({"rows": count, "blocks": blocks}, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def _index_path(path: str) -> str:
+    return path.replace(".jsonl.gz", ".idx.json")
+
+
+@lru_cache(maxsize=64)
+def _load_index(path: str, mtime: float):
+    with open(_index_path(path)) as f:
+        blocks = json.load(f)["blocks"]
+    return [block[0] for block in blocks], blocks
+
+
+def read_archived_rows(path: str, parcel_id: str) -> List[dict]:
+    """Rows of one parcel from an archive file, reading only its blocks"""
+    firsts, blocks = _load_index(path, os.path.getmtime(path))
+    position = max(bisect.bisect_left(firsts, parcel_id) - 1, 0)
+    needle = f'"parcel_id": "{parcel_id}"'.encode()
+    rows = []
+    with open(path, "rb") as f:
+        for first, last, offset, length in blocks[position:]:
+            if first > parcel_id:
+                break
+            if last < parcel_id:
+                continue
+            f.seek(offset)
+            for line in gzip.decompress(f.read(length)).splitlines():
+                # Only parse the parcel's own lines
+                if needle not in line:
+                    continue
+                item = json.loads(line)
+                if item["parcel_id"] == parcel_id:
+                    item["created_at"] = datetime.fromisoformat(item["created_at"])
+                    rows.append(item)
+    return rows
+
+
+def archived_history(db: Session, parcel_id: str, created_at: datetime) -> List[dict]:
+    """Archived history rows of a delivered or cancelled parcel"""
+    paths = db.execute(
+        text(
+            "SELECT path FROM tracking_history_archives "
+            "WHERE range_end > :created_at ORDER BY range_start, archived_at"
+        ),
+        {"created_at": created_at},
+    ).scalars()
+    rows = []
+    for path in paths:
+        try:
+            rows.extend(read_archived_rows(path, str(parcel_id)))
+        except OSError:
+            logger.exception("Tracking history archive %s is unreadable", path)
+    return rows
+
+
+def archive_partition(db: Session, month: datetime) -> Optional[int]:
+    """Move one partition's finished rows to a new archive file; commits
+
+    The partition is dropped once it is empty. Returns the rows archived,
+    or None (keeping every row) when a parcel changed status while the file
+    was being written.
+    """
+    name = partition_name(month)
+    previous = db.scalar(
+        select(func.count()).where(models.TrackingHistoryArchive.partition == name)
+    )
+    suffix = f".{previous + 1}" if previous else ""
+    path = os.path.join(TRACKING_ARCHIVE_DIR, f"{name}{suffix}.jsonl.gz")
+    finished = bindparam("statuses", ARCHIVED_STATUSES, expanding=True)
+
+    result = db.execute(
+        text(
+            f"SELECT h.* FROM {name} h JOIN parcels p ON p.id = h.parcel_id "
+            "WHERE p.status IN :statuses "
+            'ORDER BY CAST(h.parcel_id AS text) COLLATE "C", h.created_at'
+        ).bindparams(finished),
+        execution_options={"stream_results": True, "yield_per": ARCHIVE_BLOCK_ROWS},
+    )
+    written = write_archive(path + ".new", map(_archive_row, result))
+    try:
+        deleted = db.execute(
+            text(
+                f"DELETE FROM {name} h USING parcels p "
+                "WHERE p.id = h.parcel_id AND p.status IN :statuses"
+            ).bindparams(finished)
+        ).rowcount
+        if deleted != written:
+            db.rollback()
+            return None
+        if not db.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {name})")):
+            # Blocks tracking reads and writes until commit, so keep it last
+            # and give up rather than queue behind a long transaction
+            db.execute(text("SET LOCAL lock_timeout = '5s'"))
+            db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+        if written:
+            db.add(
+                models.TrackingHistoryArchive(
+                    partition=name,
+                    range_start=month,
+                    range_end=month_start(month, 1),
+                    path=path,
+                    rows=written,
+                )
+            )
+            db.flush()
+            _publish(path + ".new", path)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        _discard(path + ".new")
+    return written
+
+
+def _publish(source: str, target: str):
+    os.replace(_index_path(source), _index_path(target))
+    os.replace(source, target)
+
+
+def _discard(path: str):
+    for leftover in (path, _index_path(path)):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def maintain_tracking_history(db: Session) -> Optional[dict]:
+    """Create upcoming partitions and archive expired ones; commits
+
+    Each partition is handled in its own transaction holding an advisory
+    lock. Returns None if another worker holds it.
+    """
+    lock = select(func.pg_try_advisory_xact_lock(MAINTENANCE_LOCK))
+    now = datetime.now(timezone.utc)
+    created = []
+    for months in range(TRACKING_PARTITIONS_AHEAD + 1):
+        if not db.scalar(lock):
+            db.rollback()
+            return None
+        month = month_start(now, months)
+        if create_partition(db, month):
+            created.append(partition_name(month))
+        db.commit()
+
+    cutoff = now - timedelta(days=TRACKING_ARCHIVE_AFTER_DAYS)
+    archived = {}
+    for month in partitions(db):
+        if month_start(month, 1) > cutoff:
+            break
+        if not db.scalar(lock):
+            db.rollback()
+            return None
+        archived[partition_name(month)] = archive_partition(db, month)
+    db.rollback()
+    return {"created": created, "archived": archived}
@@ -0,0 +1,131 @@
+"""Periodic maintenance jobs
+
+Every worker process runs each job on its interval; jobs that must not
+overlap across workers take transaction-scoped advisory locks and skip
+the run (returning None) when another worker holds one. Jobs marked
+``run_at_start`` also run once shortly after startup, after a random delay
+of up to JOB_STARTUP_JITTER seconds, so a daily job still runs when
+workers are recycled more often than its interval.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from app import crud, history_archive
+from app.database import run_db, session_scope
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+TRACKING_MAINTENANCE_INTERVAL = float(
+    os.getenv("TRACKING_MAINTENANCE_INTERVAL", "86400")
+)
+JOB_STARTUP_JITTER = float(os.getenv("JOB_STARTUP_JITTER", "60"))
+
+
+class PeriodicJob:
+    """Runs a sync crud function in a fresh session every ``interval`` seconds"""
+
+    def __init__(
+        self, name: str, interval: float, fn: Callable, run_at_start: bool = False
+    ):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_at_start = run_at_start
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.last_result = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None and JOBS_ENABLED and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """Run once now; returns the function's result"""
+        start = time.perf_counter()
+        async with session_scope() as db:
+            result = await run_db(db, self.fn)
+        self.last_duration = time.perf_counter() - start
+        self.last_run_at = datetime.now(timezone.utc)
+        if result is None:
+            self.skipped += 1
+        else:
+            self.runs += 1
+            self.last_result = result
+        return result
+
+    async def _loop(self):
+        if self.run_at_start:
+            # Spread out so restarted workers do not all run it at once
+            delay = random.uniform(0, JOB_STARTUP_JITTER)
+        else:
+            delay = self.interval
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Job %s failed", self.name)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_s": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_s": round(self.last_duration, 3),
+            "last_result": self.last_result,
+        }
+
+
+jobs = {
+    job.name: job
+    for job in [
+        PeriodicJob(
+            "reconcile_statistics",
+            STATS_RECONCILE_INTERVAL,
+            crud.reconcile_statistics,
+        ),
+        PeriodicJob(
+            "maintain_tracking_history",
+            TRACKING_MAINTENANCE_INTERVAL,
+            history_archive.maintain_tracking_history,
+            run_at_start=True,
+        ),
+    ]
+}
+
+
+async def start_jobs():
+    for job in jobs.values():
+        await job.start()
+
+
+async def stop_jobs():
+    for job in jobs.values():
+        await job.stop()
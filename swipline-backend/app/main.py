@@ -1,12 +1,51 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import parcels, payments, tracking, users
-from app.database import engine
-from app import models
-from datetime import datetime
+from fastapi.responses import PlainTextResponse
+from app.routers import admin, exports, parcels, payments, quotes, tracking, users
+from app.database import (
+    DB_POOL_WARMUP,
+    async_engine,
+    engine,
+    pool_status,
+    run_db,
+    session_scope,
+    warm_up_pool,
+)
+from app.jobs import jobs, start_jobs, stop_jobs
+from app.passwords import hasher
+from app.realtime import hub
+from app.stripe_client import stripe_client
+from app.webhooks import webhook_worker
+from app import crud, metrics, tracking_ids
+from app.admission import AdmissionMiddleware, admission
+from app.auth import require_admin
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+# The schema is managed by migrations (alembic upgrade head), not at import.
+# Startup does not wait on the database unless DB_POOL_WARMUP is set, but the
+# background tasks connect at once: the tracking hub's LISTEN connection and
+# the webhook worker's inbox polls keep two connections per idle worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await hub.start()
+    await webhook_worker.start()
+    await start_jobs()
+    if DB_POOL_WARMUP:
+        await warm_up_pool(DB_POOL_WARMUP)
+        # One round trip per process, otherwise made by the first new parcel
+        await run_in_threadpool(lambda: tracking_ids.generate.node)
+    try:
+        yield
+    finally:
+        await stop_jobs()
+        await webhook_worker.stop()
+        await hub.stop()
+        await stripe_client.close()
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Consignment Tracking API",
@@ -14,6 +53,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -24,12 +64,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Sheds before CORS and routing; inside metrics, so shed requests are counted
+app.add_middleware(AdmissionMiddleware)
+# Outermost, so its latency covers the other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Include routers
 app.include_router(parcels.router, prefix="/api/parcels", tags=["parcels"])
 app.include_router(payments.router, prefix="/api/payments", tags=["payments"])
 app.include_router(tracking.router, prefix="/api/track", tags=["tracking"])
 app.include_router(users.router, prefix="/api/auth", tags=["auth"])
+app.include_router(quotes.router, prefix="/api/quotes", tags=["quotes"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(exports.router, prefix="/api/exports", tags=["exports"])
 
 
 @app.get("/")
@@ -42,6 +89,71 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.pool
+    gauges = {}
+    for name, pool in pools.items():
+        for key, value in pool_status(pool).items():
+            gauges[f'db_pool_{key}{{pool="{name}"}}'] = value
+    stats = admission.stats()
+    gauges["admission_in_flight"] = stats["in_flight"]
+    for priority, count in stats["shed"].items():
+        gauges[f'admission_shed_total{{priority="{priority}"}}'] = count
+    for limiter, count in stats["rate_limited"].items():
+        gauges[f'admission_rate_limited_total{{limiter="{limiter}"}}'] = count
+    return PlainTextResponse(
+        metrics.render(gauges), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/health/pool")
+async def pool_diagnostics():
+    pools = {"sync": pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine.pool)
+    return {"timestamp": datetime.now().isoformat(), "pools": pools}
+
+
+@app.get("/health/passwords")
+async def password_hasher_diagnostics():
+    return {"timestamp": datetime.now().isoformat(), "hasher": hasher.stats()}
+
+
+@app.get("/health/webhooks")
+async def webhook_diagnostics():
+    async with session_scope() as db:
+        pending, oldest = await run_db(db, crud.webhook_backlog)
+    now = datetime.now(timezone.utc)
+    return {
+        "timestamp": now.isoformat(),
+        "pending": pending,
+        "oldest_pending_age_s": (
+            round((now - oldest).total_seconds(), 3) if oldest else 0
+        ),
+        "worker": webhook_worker.stats(),
+    }
+
+
+@app.get("/health/admission")
+async def admission_diagnostics():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "admission": admission.stats(),
+    }
+
+
+# Admin-only: the statistics reconciliation result carries revenue figures
+@app.get("/health/jobs", dependencies=[Depends(require_admin)])
+async def job_diagnostics():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "jobs": {name: job.stats() for name, job in jobs.items()},
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
 
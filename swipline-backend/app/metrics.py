@@ -0,0 +1,223 @@
+"""Per-route request and database metrics in Prometheus text format
+
+``MetricsMiddleware`` times every HTTP request and counts it by route
+template (``/api/track/{tracking_id}``, not the concrete path), method and
+status. SQLAlchemy cursor events on the engines (``instrument_engine``) add
+the number of statements and the time spent in the database to the
+request being served, found through a context variable that follows the
+request into the threadpool and into async sessions' greenlets.
+
+A request that issues more than DB_QUERY_BUDGET statements is counted in
+``http_request_query_budget_exceeded_total`` and logged: one statement per
+row of a result is the usual N+1 pattern. ``render`` produces the
+``/metrics`` page.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Statements per request above which it is flagged as a likely N+1
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "10"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class RequestStats:
+    """Database usage of the request being served"""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    """Request counters and histograms keyed by (method, route)"""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_time: Dict[Tuple[str, str], float] = {}
+        self.over_budget: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, method: str, route: str, status: int, elapsed: float, stats: RequestStats
+    ):
+        key = (method, route)
+        with self._lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+            self.latency[key].observe(elapsed)
+            self.queries[key].observe(stats.queries)
+            self.db_time[key] = self.db_time.get(key, 0.0) + stats.db_time
+            if stats.queries > DB_QUERY_BUDGET:
+                self.over_budget[key] = self.over_budget.get(key, 0) + 1
+        if stats.queries > DB_QUERY_BUDGET:
+            logger.warning(
+                "%s %s issued %d queries (budget %d), likely N+1",
+                method,
+                route,
+                stats.queries,
+                DB_QUERY_BUDGET,
+            )
+
+
+route_metrics = RouteMetrics()
+
+
+def _route_of(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding ``route_metrics``; other scopes pass through"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # For streamed responses this covers the whole transfer
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route_metrics.record(
+                scope["method"], _route_of(scope), status, elapsed, stats
+            )
+
+
+def instrument_engine(engine):
+    """Count statements and database time of a sync Engine per request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _histogram_lines(name: str, histograms: dict) -> list:
+    lines = [f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+            cumulative += count
+            labels = _labels(method=method, route=route, le=bound)
+            lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+        labels = _labels(method=method, route=route)
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def render(extra: Optional[Dict[str, float]] = None) -> str:
+    """All metrics in Prometheus text exposition format
+
+    ``extra`` maps more gauge names (with their labels) to values.
+    """
+    metrics = route_metrics
+    with metrics._lock:
+        lines = [
+            "# HELP http_requests_total Requests by route, method and status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(metrics.requests.items()):
+            labels = _labels(method=method, route=route, status=status)
+            lines.append(f"http_requests_total{{{labels}}} {count}")
+
+        lines.append("# HELP http_request_duration_seconds Request latency")
+        lines += _histogram_lines("http_request_duration_seconds", metrics.latency)
+        lines.append("# HELP http_request_db_queries Statements issued per request")
+        lines += _histogram_lines("http_request_db_queries", metrics.queries)
+
+        lines += [
+            "# HELP http_request_db_seconds_total Time spent in the database",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(metrics.db_time.items()):
+            labels = _labels(method=method, route=route)
+            lines.append(f"http_request_db_seconds_total{{{labels}}} {seconds}")
+
+        lines += [
+            "# HELP http_request_query_budget_exceeded_total Requests over "
+            "DB_QUERY_BUDGET statements (likely N+1)",
+            "# TYPE http_request_query_budget_exceeded_total counter",
+        ]
+        for (method, route), count in sorted(metrics.over_budget.items()):
+            labels = _labels(method=method, route=route)
+            lines.append(
+                f"http_request_query_budget_exceeded_total{{{labels}}} {count}"
+            )
+
+    for name, value in (extra or {}).items():
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -2,35 +2,73 @@ from sqlalchemy import (
     Column,
     String,
     Float,
+    Integer,
+    BigInteger,
     Boolean,
     DateTime,
     JSON,
     ForeignKey,
+    Index,
+    Numeric,
+    Uuid,
+    DDL,
+    Sequence,
+    event,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
-from app.database import Base
+from app.database import DB_COMPACT_TYPES, Base
+from app.search import email_expr, name_expr, phone_expr
+from app import tracking_ids
 import uuid
 
 
+# Column types for keys, money and JSON documents. Python values are the
+# same either way (str, float, dict/list).
+if DB_COMPACT_TYPES:
+    Id = Uuid(as_uuid=False)
+    Money = Numeric(12, 2, asdecimal=False)
+    Document = JSONB
+else:
+    Id = String
+    Money = Float
+    Document = JSON
+
+
 def generate_uuid():
     return str(uuid.uuid4())
 
 
+def is_valid_id(value: str) -> bool:
+    """Whether a client-supplied value can be a key of this schema"""
+    if not DB_COMPACT_TYPES:
+        return True
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
 def generate_tracking_id():
-    import random
-    import string
-    import datetime
+    return tracking_ids.generate()
 
-    prefix = "SWP"
-    random_part = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    date_part = datetime.datetime.now().strftime("%y%m%d")
-    return f"{prefix}{date_part}{random_part}"
+
+# Where each process starts looking for a free app.tracking_ids node
+tracking_id_nodes = Sequence(
+    "tracking_id_nodes",
+    start=0,
+    minvalue=0,
+    maxvalue=tracking_ids.MAX_NODE,
+    cycle=True,
+    metadata=Base.metadata,
+)
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(Id, primary_key=True, default=generate_uuid)
     email = Column(String, unique=True, nullable=False)
     full_name = Column(String, nullable=False)
     phone = Column(String)
@@ -43,7 +81,7 @@ class User(Base):
 class Parcel(Base):
     __tablename__ = "parcels"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(Id, primary_key=True, default=generate_uuid)
     tracking_id = Column(String, unique=True, default=generate_tracking_id)
 
     # Sender info
@@ -61,17 +99,17 @@ class Parcel(Base):
     # Package details
     weight = Column(Float, nullable=False)
     dimensions = Column(
-        JSON, nullable=False
+        Document, nullable=False
     )  # {length: 30, width: 20, height: 15, unit: "cm"}
 
     # Tracking
     status = Column(String, default="pending")
     current_location = Column(String, default="Warehouse - Origin")
-    coordinates = Column(JSON)  # {lat: 40.7128, lng: -74.0060}
+    coordinates = Column(Document)  # {lat: 40.7128, lng: -74.0060}
 
     # Financial
-    shipping_cost = Column(Float, default=0)
-    border_fee = Column(Float, default=0)
+    shipping_cost = Column(Money, default=0)
+    border_fee = Column(Money, default=0)
     border_fee_paid = Column(Boolean, default=False)
 
     # Dates
@@ -79,34 +117,158 @@ class Parcel(Base):
     actual_delivery = Column(DateTime(timezone=True))
 
     # Relations
-    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    user_id = Column(Id, ForeignKey("users.id"), nullable=True)
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Keyset pagination orders by (created_at, id) under each filter
+        Index("ix_parcels_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_parcels_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_parcels_created_at_id", "created_at", "id"),
+        # Search (app/search.py): exact and prefix lookups
+        Index(
+            "ix_parcels_tracking_id_pattern",
+            "tracking_id",
+            postgresql_ops={"tracking_id": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_parcels_sender_email_lower",
+            email_expr(sender_email).label("sender_email_lower"),
+            postgresql_ops={"sender_email_lower": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_parcels_recipient_email_lower",
+            email_expr(recipient_email).label("recipient_email_lower"),
+            postgresql_ops={"recipient_email_lower": "text_pattern_ops"},
+        ),
+        # Search: substring matches
+        *(
+            Index(
+                f"ix_parcels_{name}_trgm",
+                expr.label(name),
+                postgresql_using="gin",
+                postgresql_ops={name: "gin_trgm_ops"},
+            )
+            for name, expr in (
+                ("sender_email", email_expr(sender_email)),
+                ("recipient_email", email_expr(recipient_email)),
+                ("recipient_name", name_expr(recipient_name)),
+                ("sender_phone", phone_expr(sender_phone)),
+                ("recipient_phone", phone_expr(recipient_phone)),
+            )
+        ),
+    )
+
+
+# Trigram operator classes used by the parcel search indexes
+event.listen(
+    Parcel.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+)
+
 
 class TrackingHistory(Base):
+    """Range-partitioned by month on created_at; see app/history_archive.py"""
+
     __tablename__ = "tracking_history"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    parcel_id = Column(String, ForeignKey("parcels.id"), nullable=False)
+    id = Column(Id, primary_key=True, default=generate_uuid)
+    parcel_id = Column(Id, ForeignKey("parcels.id"), nullable=False)
     status = Column(String, nullable=False)
     location = Column(String, nullable=False)
-    coordinates = Column(JSON)
+    coordinates = Column(Document)
     description = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Part of the key because every unique index must cover the partition key
+    created_at = Column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_tracking_history_parcel_id_created_at", "parcel_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+# Monthly partitions are added by app.history_archive; until then rows land here
+event.listen(
+    TrackingHistory.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS tracking_history_default "
+        "PARTITION OF tracking_history DEFAULT"
+    ),
+)
+
+
+class TrackingHistoryArchive(Base):
+    """Rows of a tracking_history partition moved to a compressed file"""
+
+    __tablename__ = "tracking_history_archives"
+
+    path = Column(String, primary_key=True)
+    # A partition is archived again for parcels that were still moving
+    partition = Column(String, nullable=False, index=True)
+    range_start = Column(DateTime(timezone=True), nullable=False)
+    range_end = Column(DateTime(timezone=True), nullable=False)
+    rows = Column(BigInteger, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class Payment(Base):
     __tablename__ = "payments"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    parcel_id = Column(String, ForeignKey("parcels.id"), nullable=False)
+    id = Column(Id, primary_key=True, default=generate_uuid)
+    parcel_id = Column(Id, ForeignKey("parcels.id"), nullable=False)
     payment_id = Column(String, unique=True, nullable=False)  # Stripe ID
     type = Column(String, nullable=False)  # border_fee, shipping_fee
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
     status = Column(String, default="pending")
-    payment_details = Column(JSON)
+    payment_details = Column(Document)
     completed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_payments_parcel_id_created_at", "parcel_id", "created_at"),
+    )
+
+
+class WebhookEvent(Base):
+    """Inbox of verified Stripe events, drained by app/webhooks.py"""
+
+    __tablename__ = "webhook_events"
+
+    id = Column(String, primary_key=True)  # Stripe event ID
+    type = Column(String, nullable=False)
+    payload = Column(Document, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # processed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # The worker only ever scans pending events in due order
+        Index(
+            "ix_webhook_events_pending",
+            "next_attempt_at",
+            postgresql_where=status == "pending",
+        ),
+    )
+
+
+class StatCounter(Base):
+    """Running totals behind the admin statistics, split into shards
+
+    A counter's value is the sum of its rows. Writers add to one random
+    shard (0 and up) so concurrent transactions rarely wait on the same
+    row; reconciliation writes its corrections to shard -1.
+    """
+
+    __tablename__ = "stat_counters"
+
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
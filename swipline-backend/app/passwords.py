@@ -0,0 +1,128 @@
+"""Password hashing on a dedicated, bounded executor
+
+bcrypt is deliberately slow. Running it in Starlette's shared threadpool
+lets a burst of logins occupy every worker thread that sync routes and
+sessions also need, so it gets its own small pool instead. Calls beyond
+PASSWORD_HASH_MAX_PENDING (running plus queued) are rejected with
+``PasswordHasherBusy`` rather than queued without bound.
+
+Hashes whose cost differs from BCRYPT_ROUNDS are upgraded on the next
+successful login (see ``PasswordHasher.verify_and_update``). passlib is
+imported when the first password is hashed or checked.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8))
+)
+
+
+@lru_cache(maxsize=None)
+def password_context():
+    """The shared passlib CryptContext, built on first use"""
+    from passlib.context import CryptContext
+
+    # Pinning min and max to the configured cost makes passlib flag any hash
+    # made with other settings as needing an update
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already pending"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.wait_total = 0.0
+        self.run_total = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+
+    async def _submit(self, fn, *args):
+        # Only touched from the event loop, so no lock is needed here
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self._timed, submitted, fn, *args
+            )
+        finally:
+            self.pending -= 1
+
+    def _timed(self, submitted: float, fn, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.active += 1
+            self.wait_total += started - submitted
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_total += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(password_context().hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Check a password; also return a new hash if the stored one is outdated"""
+        valid, new_hash = await self._submit(
+            password_context().verify_and_update, password, hashed
+        )
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rounds": BCRYPT_ROUNDS,
+            "pending": self.pending,
+            "active": self.active,
+            "queued": max(self.pending - self.active, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "wait_avg_ms": round(
+                self.wait_total / self.completed * 1000 if self.completed else 0, 3
+            ),
+            "run_avg_ms": round(
+                self.run_total / self.completed * 1000 if self.completed else 0, 3
+            ),
+        }
+
+
+hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,180 @@
+"""Table-driven shipping rates
+
+Rate cards live in JSON (RATE_CARD_PATH, by default app/data/rate_cards.json)
+and are compiled into a read-only ``RateCard`` of NumPy arrays, so a batch
+of parcels is priced with a handful of vectorized operations:
+
+    chargeable = max(weight, length * width * height / volumetric_divisor)
+    shipping   = (band.base + band.per_kg * chargeable) * destination.multiplier
+    border_fee = destination.border_fee
+
+Weight bands are ordered by ``up_to_kg`` (null for the open-ended last
+band); dimensions are in cm, or inches converted to cm. Destinations not
+listed use ``default``. The file is re-read when its mtime changes; a card
+that fails to compile is logged and the previous one stays in use.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RATE_CARD_PATH = os.getenv(
+    "RATE_CARD_PATH", os.path.join(os.path.dirname(__file__), "data", "rate_cards.json")
+)
+RATE_CARD_CHECK_INTERVAL = float(os.getenv("RATE_CARD_CHECK_INTERVAL", "5"))
+
+CM_PER_UNIT = {"cm": 1.0, "in": 2.54}
+
+
+class Quotes(NamedTuple):
+    chargeable_weight: np.ndarray
+    shipping_cost: np.ndarray
+    border_fee: np.ndarray
+
+
+def _frozen(values) -> np.ndarray:
+    array = np.asarray(values, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+
+class RateCard(NamedTuple):
+    version: str
+    currency: str
+    volumetric_divisor: float
+    band_limits: np.ndarray  # upper bound per band, inf for the last
+    band_base: np.ndarray
+    band_per_kg: np.ndarray
+    destinations: Mapping[str, int]  # code -> row; the last row is the default
+    multipliers: np.ndarray
+    border_fees: np.ndarray
+
+    @classmethod
+    def compile(cls, data: dict) -> "RateCard":
+        """Validate a parsed rate card and build its lookup arrays"""
+        bands = data["weight_bands"]
+        if not bands:
+            raise ValueError("Rate card has no weight bands")
+        limits = [
+            np.inf if band.get("up_to_kg") is None else float(band["up_to_kg"])
+            for band in bands
+        ]
+        if limits != sorted(limits) or limits[-1] != np.inf:
+            raise ValueError("Weight bands must be ascending and end with an open band")
+
+        codes = sorted(data["destinations"])
+        rows = [data["destinations"][code] for code in codes] + [data["default"]]
+        divisor = float(data["volumetric_divisor"])
+        if divisor <= 0:
+            raise ValueError("volumetric_divisor must be positive")
+
+        return cls(
+            version=str(data["version"]),
+            currency=data.get("currency", "usd"),
+            volumetric_divisor=divisor,
+            band_limits=_frozen(limits),
+            band_base=_frozen([band["base"] for band in bands]),
+            band_per_kg=_frozen([band["per_kg"] for band in bands]),
+            destinations=MappingProxyType(
+                {code.upper(): row for row, code in enumerate(codes)}
+            ),
+            multipliers=_frozen([row["multiplier"] for row in rows]),
+            border_fees=_frozen([row["border_fee"] for row in rows]),
+        )
+
+    def destination_rows(self, countries) -> np.ndarray:
+        """Map country codes to rate rows, unknown codes to the default row"""
+        codes, inverse = np.unique(
+            np.asarray(countries, dtype=str), return_inverse=True
+        )
+        default = len(self.multipliers) - 1
+        rows = np.fromiter(
+            (self.destinations.get(code.upper(), default) for code in codes),
+            dtype=np.intp,
+            count=len(codes),
+        )
+        return rows[inverse.reshape(-1)]
+
+    def quote(self, weight, length, width, height, cm_per_unit, countries) -> Quotes:
+        """Price parcels given as equal-length arrays (weights in kg)"""
+        weight = np.asarray(weight, dtype=np.float64)
+        scale = np.asarray(cm_per_unit, dtype=np.float64)
+        volume = (
+            np.asarray(length, dtype=np.float64)
+            * np.asarray(width, dtype=np.float64)
+            * np.asarray(height, dtype=np.float64)
+            * scale**3
+        )
+        chargeable = np.maximum(weight, volume / self.volumetric_divisor)
+        band = np.searchsorted(self.band_limits, chargeable, side="left")
+        rows = self.destination_rows(countries)
+
+        shipping = (
+            self.band_base[band] + self.band_per_kg[band] * chargeable
+        ) * self.multipliers[rows]
+        return Quotes(
+            chargeable_weight=np.round(chargeable, 3),
+            shipping_cost=np.round(shipping, 2),
+            border_fee=self.border_fees[rows],
+        )
+
+    def quote_one(self, weight: float, dimensions: dict, country: str):
+        """Price a single parcel; returns (shipping_cost, border_fee)"""
+        quotes = self.quote(
+            [weight],
+            [dimensions["length"]],
+            [dimensions["width"]],
+            [dimensions["height"]],
+            [CM_PER_UNIT[dimensions.get("unit", "cm")]],
+            [country],
+        )
+        return float(quotes.shipping_cost[0]), float(quotes.border_fee[0])
+
+
+class RateCardStore:
+    """Holds the compiled card for a file and recompiles it when it changes"""
+
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self._card = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> RateCard:
+        if self._card is None or (
+            time.monotonic() - self._checked_at >= self.check_interval
+        ):
+            self._refresh()
+        return self._card
+
+    def _refresh(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if self._card is not None and mtime == self._mtime:
+                    return
+                with open(self.path) as f:
+                    card = RateCard.compile(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError):
+                if self._card is None:
+                    raise
+                logger.exception("Keeping rate card %s", self._card.version)
+                self._mtime = mtime  # Retry once the file changes again
+                return
+            # Readers keep whichever card they already hold; it is immutable
+            self._card = card
+            self._mtime = mtime
+
+
+rate_cards = RateCardStore(RATE_CARD_PATH, RATE_CARD_CHECK_INTERVAL)
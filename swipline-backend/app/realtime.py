@@ -0,0 +1,173 @@
+"""Fan-out of tracking updates to WebSocket subscribers
+
+Writers queue updates with ``crud.notify_tracking_updates`` inside their
+transaction, so Postgres delivers them on commit. Every worker LISTENs on
+the channel and hands each notification to its own subscribers. Each
+subscriber has a bounded send queue drained by its own task, so one slow
+socket never delays the others and is disconnected once its queue fills.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+
+from fastapi.websockets import WebSocket
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from starlette.websockets import WebSocketState
+
+from app import crud
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+LISTEN_RECONNECT_DELAY = float(os.getenv("TRACKING_LISTEN_RECONNECT_DELAY", "1"))
+
+# Close code for consumers that cannot keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Subscriber:
+    def __init__(self, tracking_id: str, websocket: WebSocket):
+        self.tracking_id = tracking_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.overflowed = False
+
+
+class TrackingHub:
+    """Per-worker registry of WebSocket subscribers keyed by tracking ID"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.delivered = 0
+        self.dropped = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    async def connect(self, tracking_id: str, websocket: WebSocket) -> Subscriber:
+        await websocket.accept()
+        subscriber = Subscriber(tracking_id, websocket)
+        self.subscribers.setdefault(tracking_id, set()).add(subscriber)
+        subscriber.task = asyncio.create_task(self._send_loop(subscriber))
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        self._unregister(subscriber)
+        if subscriber.task and not subscriber.task.done():
+            subscriber.task.cancel()
+
+    def _unregister(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.tracking_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.tracking_id]
+
+    def publish(self, tracking_id: str, message: str):
+        """Queue an encoded message for every local subscriber of a parcel"""
+        for subscriber in list(self.subscribers.get(tracking_id, ())):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it rather than buffer without bound
+                self.dropped += 1
+                subscriber.overflowed = True
+                self.disconnect(subscriber)
+
+    async def _send_loop(self, subscriber: Subscriber):
+        websocket = subscriber.websocket
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                await asyncio.wait_for(websocket.send_text(message), WS_SEND_TIMEOUT)
+                self.delivered += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Send failed or timed out; the socket is of no further use
+            subscriber.overflowed = True
+        finally:
+            self._unregister(subscriber)
+            if (
+                subscriber.overflowed
+                and websocket.application_state == WebSocketState.CONNECTED
+            ):
+                try:
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                except Exception:
+                    pass
+
+    def _dispatch(self, payload: str):
+        try:
+            tracking_id = json.loads(payload)["tracking_id"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed tracking notification")
+            return
+        # The write may have come from another worker; drop our cached copy
+        crud.invalidate_tracking(tracking_id)
+        self.publish(tracking_id, payload)
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        for subscribers in list(self.subscribers.values()):
+            for subscriber in list(subscribers):
+                self.disconnect(subscriber)
+
+    async def _listen(self):
+        """LISTEN on the tracking channel, reconnecting on failure"""
+        loop = asyncio.get_running_loop()
+        while True:
+            raw = None
+            try:
+                raw, connection = await loop.run_in_executor(None, self._open_listener)
+                lost = loop.create_future()
+
+                def on_readable():
+                    try:
+                        connection.poll()
+                    except Exception as e:
+                        if not lost.done():
+                            lost.set_exception(e)
+                        return
+                    while connection.notifies:
+                        self._dispatch(connection.notifies.pop(0).payload)
+
+                loop.add_reader(connection.fileno(), on_readable)
+                try:
+                    await lost
+                finally:
+                    loop.remove_reader(connection.fileno())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Tracking listener lost its connection")
+                await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+    def _open_listener(self):
+        # A dedicated connection kept outside the pool for the worker's lifetime
+        raw = engine.raw_connection()
+        connection = raw.driver_connection
+        raw.detach()
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{crud.TRACKING_CHANNEL}"')
+        return raw, connection
+
+
+hub = TrackingHub()
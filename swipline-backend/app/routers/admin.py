@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app import schemas, crud
+from app.auth import require_admin
+from app.database import get_session, run_db
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+IN_TRANSIT_STATUSES = (
+    schemas.ParcelStatus.COLLECTED,
+    schemas.ParcelStatus.IN_TRANSIT,
+    schemas.ParcelStatus.AT_BORDER,
+    schemas.ParcelStatus.BORDER_CLEARED,
+    schemas.ParcelStatus.OUT_FOR_DELIVERY,
+)
+
+
+@router.get("/statistics", response_model=schemas.StatisticsResponse)
+async def get_statistics(db: Session = Depends(get_session)):
+    """Parcel totals by status and revenue, from the maintained counters"""
+    counters = await run_db(db, crud.get_statistics)
+
+    by_status = {
+        status.value: counters.get(f"parcels.status.{status.value}", 0)
+        for status in schemas.ParcelStatus
+    }
+    # Counted in cents; converted last so the totals add up exactly
+    revenue = {
+        payment_type.value: counters.get(f"revenue_cents.{payment_type.value}", 0)
+        for payment_type in schemas.PaymentType
+    }
+    return {
+        "total_parcels": counters.get("parcels", 0),
+        "pending_parcels": by_status[schemas.ParcelStatus.PENDING.value],
+        "in_transit_parcels": sum(
+            by_status[status.value] for status in IN_TRANSIT_STATUSES
+        ),
+        "delivered_parcels": by_status[schemas.ParcelStatus.DELIVERED.value],
+        "total_revenue": sum(revenue.values()) / 100,
+        "border_fee_revenue": revenue[schemas.PaymentType.BORDER_FEE.value] / 100,
+        "shipping_revenue": revenue[schemas.PaymentType.SHIPPING_FEE.value] / 100,
+        "by_status": by_status,
+    }
@@ -0,0 +1,207 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from datetime import date, datetime
+from enum import Enum
+from sqlalchemy import JSON, DateTime
+from typing import Type
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+
+from app import schemas, crud
+from app.auth import require_admin
+from app.database import run_db, session_scope
+
+logger = logging.getLogger(__name__)
+
+# Exports carry customer contact details and payments: admins only
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# Rows per server-side cursor fetch; memory per export is bounded by this
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+# Every running export holds a pooled connection for its whole transfer
+MAX_CONCURRENT_EXPORTS = int(os.getenv("MAX_CONCURRENT_EXPORTS", "2"))
+EXPORT_GZIP_LEVEL = 6
+
+MEDIA_TYPES = {
+    schemas.ExportFormat.CSV: "text/csv",
+    schemas.ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+_active_exports = 0
+
+
+class _ExportSlot:
+    """One of the MAX_CONCURRENT_EXPORTS slots, released once"""
+
+    def __init__(self):
+        global _active_exports
+        _active_exports += 1
+        self._held = True
+
+    def release(self):
+        global _active_exports
+        if self._held:
+            self._held = False
+            _active_exports -= 1
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_encoder(statement):
+    """Encoder for CSV rows; only JSON and timestamp columns need converting"""
+    converters = []
+    for index, column in enumerate(statement.selected_columns):
+        if isinstance(column.type, JSON):
+            converters.append((index, json.dumps))
+        elif isinstance(column.type, DateTime):
+            converters.append((index, datetime.isoformat))
+
+    def encode(rows: list) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            values = list(row)
+            for index, convert in converters:
+                if values[index] is not None:
+                    values[index] = convert(values[index])
+            writer.writerow(values)
+        return buffer.getvalue().encode()
+
+    return encode
+
+
+def _ndjson_encoder(statement):
+    keys = [column.key for column in statement.selected_columns]
+
+    def encode(rows: list) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(keys, row)), default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+    return encode
+
+
+def _csv_header(statement) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(column.key for column in statement.selected_columns)
+    return buffer.getvalue().encode()
+
+
+ENCODERS = {
+    schemas.ExportFormat.CSV: _csv_encoder,
+    schemas.ExportFormat.NDJSON: _ndjson_encoder,
+}
+
+
+def _next_chunk(db, result, encode, compressor):
+    """Fetch, encode and compress the next batch; None when exhausted"""
+    rows = result.fetchmany(EXPORT_BATCH_ROWS)
+    if not rows:
+        return None
+    chunk = encode(rows)
+    return compressor.compress(chunk) if compressor else chunk
+
+
+async def _stream(
+    statement,
+    export_format: schemas.ExportFormat,
+    compress: bool,
+    slot: _ExportSlot,
+):
+    encode = ENCODERS[export_format](statement)
+    compressor = (
+        zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if compress
+        else None
+    )
+    try:
+        # Own session: it must outlive the endpoint, for the whole transfer
+        async with session_scope() as db:
+            if export_format == schemas.ExportFormat.CSV:
+                header = _csv_header(statement)
+                yield compressor.compress(header) if compressor else header
+            result = await run_db(db, crud.open_export, statement, EXPORT_BATCH_ROWS)
+            while True:
+                chunk = await run_db(db, _next_chunk, result, encode, compressor)
+                if chunk is None:
+                    break
+                if chunk:
+                    yield chunk
+        if compressor:
+            yield compressor.flush()
+    except Exception:
+        # Headers are gone; the client sees a truncated body
+        logger.exception("Export failed mid-stream")
+        raise
+    finally:
+        slot.release()
+
+
+def _export(
+    request: Request,
+    kind: str,
+    filters: schemas.ExportFilters,
+    statuses: Type[Enum],
+) -> StreamingResponse:
+    if filters.status and filters.status not in {status.value for status in statuses}:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    if _active_exports >= MAX_CONCURRENT_EXPORTS:
+        raise HTTPException(status_code=429, detail="Too many exports in progress")
+    # Taken before returning, so concurrent requests see it
+    slot = _ExportSlot()
+    try:
+        statement = crud.export_statement(
+            kind,
+            status=filters.status,
+            created_from=filters.created_from,
+            created_to=filters.created_to,
+            destination=filters.destination,
+        )
+        compress = "gzip" in request.headers.get("accept-encoding", "")
+        filename = f"{kind}-{datetime.now():%Y%m%d-%H%M%S}.{filters.format.value}"
+        headers = {
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Vary": "Accept-Encoding",
+        }
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(
+            _stream(statement, filters.format, compress, slot),
+            media_type=MEDIA_TYPES[filters.format],
+            headers=headers,
+            # Releases the slot if the body was never started (client gone)
+            background=BackgroundTask(slot.release),
+        )
+    except Exception:
+        slot.release()
+        raise
+
+
+@router.get("/parcels")
+async def export_parcels(request: Request, filters: schemas.ExportFilters = Depends()):
+    """Stream every matching parcel as CSV or NDJSON, oldest first"""
+    return _export(request, "parcels", filters, schemas.ParcelStatus)
+
+
+@router.get("/payments")
+async def export_payments(request: Request, filters: schemas.ExportFilters = Depends()):
+    """Stream every matching payment; destination filters on the parcel"""
+    return _export(request, "payments", filters, schemas.PaymentStatus)
+
+
+@router.get("/tracking-history")
+async def export_tracking_history(
+    request: Request, filters: schemas.ExportFilters = Depends()
+):
+    """Stream every matching tracking history entry still in the database"""
+    return _export(request, "tracking_history", filters, schemas.ParcelStatus)
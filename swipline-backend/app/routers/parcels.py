@@ -1,37 +1,440 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from tempfile import SpooledTemporaryFile
+from typing import Optional
+import asyncio
+import csv
+import json
+import logging
+import os
+
 from app import schemas, crud
-from app.database import get_db
+from app.auth import ADMIN_ROLE, get_current_user, require_admin
+from app.database import get_session, run_db, session_scope
+from app.serialization import ORJSONResponse, encode_parcel
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+MAX_BULK_LOCATION_UPDATES = int(os.getenv("MAX_BULK_LOCATION_UPDATES", "5000"))
+MAX_BULK_CREATE_ROWS = int(os.getenv("MAX_BULK_CREATE_ROWS", "100000"))
+BULK_CREATE_CHUNK_SIZE = int(os.getenv("BULK_CREATE_CHUNK_SIZE", "1000"))
+# Longest upload line (or CSV record) read before the upload is rejected
+MAX_UPLOAD_LINE_BYTES = int(os.getenv("MAX_UPLOAD_LINE_BYTES", str(64 * 1024)))
+# Results beyond this many bytes are spooled to a temporary file
+BULK_RESULT_SPOOL_SIZE = 1024 * 1024
+
+# CSV columns folded into CreateParcel.dimensions
+DIMENSION_COLUMNS = ("length", "width", "height", "unit")
+
+# Placeholder for NDJSON lines that are not valid JSON
+_MALFORMED = object()
+
+
+async def _split_lines(chunks, max_length: int):
+    """Yield the lines of a byte stream as they arrive, blank ones included
+
+    Raises ValueError once a line grows past ``max_length`` bytes, so a
+    line that never ends is not buffered whole.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > max_length:
+                raise ValueError(f"Line longer than {max_length} bytes")
+            yield line
+        if len(buffer) > max_length:
+            raise ValueError(f"Line longer than {max_length} bytes")
+    if buffer:
+        yield buffer
+
+
+async def _iter_lines(request: Request):
+    """Yield non-empty lines of the request body as they arrive"""
+    async for line in _split_lines(request.stream(), MAX_UPLOAD_LINE_BYTES):
+        if line.strip():
+            yield line
+
+
+async def _csv_records(lines, max_length: int):
+    """Yield parsed CSV records, joining lines split inside quoted fields
+
+    Blank lines between records are skipped; inside a quoted field they are
+    part of the value. Raises ValueError for a record longer than
+    ``max_length`` characters.
+    """
+    pending = None
+    async for line in lines:
+        text = line.decode("utf-8", errors="replace").rstrip("\r")
+        if pending is None:
+            if not text.strip():
+                continue
+            pending = text
+        else:
+            pending = f"{pending}\n{text}"
+        if len(pending) > max_length:
+            raise ValueError(f"Record longer than {max_length} characters")
+        if pending.count('"') % 2 == 0:
+            yield next(csv.reader([pending]))
+            pending = None
+    if pending is not None:
+        yield next(csv.reader([pending]))
+
+
+def _iter_csv_records(request: Request):
+    return _csv_records(
+        _split_lines(request.stream(), MAX_UPLOAD_LINE_BYTES), MAX_UPLOAD_LINE_BYTES
+    )
+
+
+def _csv_item(header: list, values: list):
+    """Turn a CSV record into CreateParcel input, or an error message"""
+    if len(values) != len(header):
+        return f"Expected {len(header)} columns, got {len(values)}"
+    item = {key: value for key, value in zip(header, values) if value != ""}
+    dimensions = {key: item.pop(key) for key in DIMENSION_COLUMNS if key in item}
+    if dimensions:
+        item["dimensions"] = dimensions
+    if "contents" in item:
+        try:
+            item["contents"] = json.loads(item["contents"])
+        except ValueError:
+            return "contents: Invalid JSON"
+    return item
+
+
+async def _iter_upload_items(request: Request, media_type: str):
+    """Yield (row number, item dict or error message) from a bulk upload
+
+    An overlong line ends the upload with an error for the row it started.
+    """
+    row = 0
+    try:
+        if media_type == CSV_MEDIA_TYPE:
+            header = None
+            async for values in _iter_csv_records(request):
+                if header is None:
+                    header = [name.strip().lstrip("\ufeff") for name in values]
+                    continue
+                row += 1
+                yield row, _csv_item(header, values)
+            return
+
+        async for line in _iter_lines(request):
+            row += 1
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield row, "Malformed JSON line"
+                continue
+            yield row, item if isinstance(item, dict) else "Expected a JSON object"
+    except ValueError as e:
+        yield row + 1, str(e)
+
 
 @router.post("/", response_model=schemas.ParcelResponse)
-def create_parcel(parcel: schemas.CreateParcel, db: Session = Depends(get_db)):
+async def create_parcel(
+    parcel: schemas.CreateParcel, db: Session = Depends(get_session)
+):
     """Create a new parcel"""
-    return crud.create_parcel(db=db, parcel=parcel)
+    try:
+        return await run_db(db, crud.create_parcel, parcel=parcel)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.post("/locations/bulk", response_model=schemas.BulkLocationResponse)
+async def bulk_update_locations(request: Request, db: Session = Depends(get_session)):
+    """Apply a batch of location updates (JSON array or NDJSON stream)"""
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"At most {MAX_BULK_LOCATION_UPDATES} updates per batch",
+    )
+
+    items = []
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        try:
+            async for line in _iter_lines(request):
+                if len(items) >= MAX_BULK_LOCATION_UPDATES:
+                    raise too_large
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(_MALFORMED)
+        except ValueError as e:
+            # Only an overlong line gets here
+            raise HTTPException(status_code=413, detail=str(e))
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        if len(items) > MAX_BULK_LOCATION_UPDATES:
+            raise too_large
+
+    # Validate every item up front so one bad scan does not reject the batch
+    results = []
+    updates = []
+    for index, item in enumerate(items):
+        if item is _MALFORMED:
+            results.append(
+                schemas.BulkLocationResult(
+                    index=index, result="invalid", detail="Malformed JSON line"
+                )
+            )
+            continue
+
+        tracking_id = item.get("tracking_id") if isinstance(item, dict) else None
+        try:
+            updates.append((index, schemas.BulkLocationUpdate.model_validate(item)))
+        except ValidationError as e:
+            results.append(
+                schemas.BulkLocationResult(
+                    index=index,
+                    tracking_id=tracking_id,
+                    result="invalid",
+                    detail=schemas.format_errors(e),
+                )
+            )
+
+    found = await run_db(
+        db, crud.bulk_update_parcel_locations, [update for _, update in updates]
+    )
+
+    for index, update in updates:
+        if update.tracking_id in found:
+            results.append(
+                schemas.BulkLocationResult(
+                    index=index, tracking_id=update.tracking_id, result="updated"
+                )
+            )
+        else:
+            results.append(
+                schemas.BulkLocationResult(
+                    index=index,
+                    tracking_id=update.tracking_id,
+                    result="not_found",
+                    detail="Parcel not found",
+                )
+            )
+
+    results.sort(key=lambda r: r.index)
+    updated = sum(1 for r in results if r.result == "updated")
+    return {
+        "received": len(items),
+        "updated": updated,
+        "failed": len(items) - updated,
+        "results": results,
+    }
+
+
+def _validate_parcels(items):
+    """Split (row, item) pairs into valid CreateParcels and row errors"""
+    parcels = []
+    errors = []
+    for row, item in items:
+        try:
+            parcels.append((row, schemas.CreateParcel.model_validate(item)))
+        except ValidationError as e:
+            errors.append((row, schemas.format_errors(e)))
+    return parcels, errors
+
+
+@router.post("/bulk")
+async def bulk_create_parcels(request: Request):
+    """Create parcels from a CSV or NDJSON upload
+
+    Rows are validated as they arrive and inserted in chunks. The response
+    is NDJSON: one line per row with its tracking ID or error (rows that
+    failed validation are reported before rows still waiting to be
+    inserted), then a summary line.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(CSV_MEDIA_TYPE):
+        media_type = CSV_MEDIA_TYPE
+    elif content_type.startswith(NDJSON_MEDIA_TYPE):
+        media_type = NDJSON_MEDIA_TYPE
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Upload {CSV_MEDIA_TYPE} or {NDJSON_MEDIA_TYPE}",
+        )
+
+    # Starlette cannot stream a response while the request body is still
+    # being read, so results are spooled and sent once the upload is done
+    results = SpooledTemporaryFile(max_size=BULK_RESULT_SPOOL_SIZE)
+    counts = {"received": 0, "created": 0, "failed": 0}
+
+    def write(line: dict):
+        results.write(json.dumps(line).encode() + b"\n")
+
+    def fail(row: int, error: str):
+        counts["failed"] += 1
+        write({"row": row, "error": error})
+
+    async def insert(parcels):
+        # A short-lived session per chunk; none is held while reading
+        try:
+            async with session_scope() as db:
+                created = await run_db(
+                    db, crud.create_parcels_bulk, [parcel for _, parcel in parcels]
+                )
+        except ValueError as e:
+            for row, _ in parcels:
+                fail(row, str(e))
+            return
+        except SQLAlchemyError:
+            logger.exception("Bulk parcel insert failed")
+            for row, _ in parcels:
+                fail(row, "Could not save parcel")
+            return
+        counts["created"] += len(created)
+        for (row, _), (parcel_id, tracking_id) in zip(parcels, created):
+            write({"row": row, "id": parcel_id, "tracking_id": tracking_id})
+
+    # Validation runs in the threadpool; each chunk's insert overlaps with
+    # reading and validating the next one (at most one insert in flight)
+    inserting = None
+
+    async def flush(items):
+        nonlocal inserting
+        parcels, errors = await run_in_threadpool(_validate_parcels, items)
+        for row, error in errors:
+            fail(row, error)
+        if inserting is not None:
+            await inserting
+        inserting = asyncio.ensure_future(insert(parcels)) if parcels else None
+
+    chunk = []
+    async for row, item in _iter_upload_items(request, media_type):
+        if row > MAX_BULK_CREATE_ROWS:
+            write({"row": row, "error": f"At most {MAX_BULK_CREATE_ROWS} rows"})
+            break
+        counts["received"] += 1
+        if isinstance(item, str):
+            fail(row, item)
+            continue
+        chunk.append((row, item))
+        if len(chunk) >= BULK_CREATE_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    await flush(chunk)
+    if inserting is not None:
+        await inserting
+
+    write({"summary": counts})
+    results.seek(0)
+    return StreamingResponse(
+        iter(lambda: results.read(64 * 1024), b""),
+        media_type=NDJSON_MEDIA_TYPE,
+        background=BackgroundTask(results.close),
+    )
+
+
+def _check_cursor(cursor: Optional[str]):
+    if cursor:
+        try:
+            crud.decode_parcel_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get(
+    "/search",
+    response_model=schemas.ParcelPage,
+    dependencies=[Depends(require_admin)],
+)
+async def search_parcels(
+    params: schemas.ParcelSearch = Depends(), db: Session = Depends(get_session)
+):
+    """Search parcels, newest first; pass next_cursor back to get the next page"""
+    _check_cursor(params.cursor)
+    parcels = await run_db(
+        db,
+        crud.search_parcels,
+        tracking_id=params.tracking_id,
+        status=params.status.value if params.status else None,
+        email=params.email,
+        name=params.name,
+        phone=params.phone,
+        skip=params.skip,
+        limit=params.limit,
+        cursor=params.cursor,
+    )
+    return {
+        "items": parcels,
+        "next_cursor": crud.next_parcel_cursor(parcels, params.limit),
+    }
+
+
+@router.get("/mine", response_model=schemas.ParcelPage)
+async def get_my_parcels(
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user: crud.AuthUser = Depends(get_current_user),
+    db: Session = Depends(get_session),
+):
+    """List the authenticated user's parcels, newest first"""
+    _check_cursor(cursor)
+    parcels = await run_db(
+        db, crud.get_user_parcels, user.id, limit=limit, cursor=cursor
+    )
+    return {"items": parcels, "next_cursor": crud.next_parcel_cursor(parcels, limit)}
+
+
+@router.get("/user/{user_id}", response_model=schemas.ParcelPage)
+async def get_user_parcels(
+    user_id: str,
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user: crud.AuthUser = Depends(get_current_user),
+    db: Session = Depends(get_session),
+):
+    """List a user's parcels, newest first; their own, unless an admin"""
+    if user.id != user_id and user.role != ADMIN_ROLE:
+        raise HTTPException(status_code=403, detail="Not allowed to list these parcels")
+    _check_cursor(cursor)
+    parcels = await run_db(
+        db, crud.get_user_parcels, user_id, limit=limit, cursor=cursor
+    )
+    return {"items": parcels, "next_cursor": crud.next_parcel_cursor(parcels, limit)}
 
 
 @router.get("/{tracking_id}", response_model=schemas.ParcelResponse)
-def get_parcel(tracking_id: str, db: Session = Depends(get_db)):
+async def get_parcel(tracking_id: str, db: Session = Depends(get_session)):
     """Get parcel by tracking ID"""
-    parcel = crud.get_parcel_by_tracking_id(db, tracking_id)
+    parcel = await run_db(db, crud.get_parcel_by_tracking_id, tracking_id)
     if not parcel:
         raise HTTPException(status_code=404, detail="Parcel not found")
-    return parcel
+    return ORJSONResponse(encode_parcel(parcel))
 
 
 @router.put("/{tracking_id}/location")
-def update_location(
+async def update_location(
     tracking_id: str,
     location_data: schemas.UpdateLocation,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ):
     """Update parcel location"""
-    return crud.update_parcel_location(db, tracking_id, location_data)
+    return await run_db(db, crud.update_parcel_location, tracking_id, location_data)
 
 
 @router.get("/{tracking_id}/tracking", response_model=schemas.TrackingResponse)
-def get_tracking_history(tracking_id: str, db: Session = Depends(get_db)):
+async def get_tracking_history(tracking_id: str, db: Session = Depends(get_session)):
     """Get full tracking history"""
-    return crud.get_tracking_history(db, tracking_id)
+    entry = await run_db(db, crud.get_tracking_entry, tracking_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Tracking ID not found")
+    return ORJSONResponse(entry.body)
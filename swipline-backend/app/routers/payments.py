@@ -1,27 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.orm import Session
-import stripe
+import json
 import os
-from datetime import datetime
 from typing import Optional
 
-from app import schemas, crud, models
-from app.database import get_db
+from app import schemas, crud
+from app.database import get_session, run_db, session_scope
+from app.stripe_client import StripeError, idempotency_key, stripe_client
+from app.webhooks import HANDLED_EVENTS, webhook_worker
 
 router = APIRouter()
 
-# Initialize Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "sk_test_...")
-
 
 @router.post("/border", response_model=schemas.PaymentResponse)
-def create_border_payment(
-    payment: schemas.CreatePayment, db: Session = Depends(get_db)
-):
+async def create_border_payment(payment: schemas.CreatePayment):
     """Create border payment intent"""
 
-    # Get parcel
-    parcel = crud.get_parcel_by_tracking_id(db, payment.tracking_id)
+    # Sessions are opened per step so none is held during the Stripe call
+    async with session_scope() as db:
+        parcel = await run_db(db, crud.get_parcel_by_tracking_id, payment.tracking_id)
     if not parcel:
         raise HTTPException(status_code=404, detail="Parcel not found")
 
@@ -32,9 +29,10 @@ def create_border_payment(
         raise HTTPException(status_code=400, detail="Parcel is not at border yet")
 
     # Create Stripe payment intent
+    amount = round(parcel.border_fee * 100)  # Convert to cents
     try:
-        payment_intent = stripe.PaymentIntent.create(
-            amount=int(parcel.border_fee * 100),  # Convert to cents
+        payment_intent = await stripe_client.create_payment_intent(
+            amount=amount,
             currency="usd",
             metadata={
                 "parcel_id": parcel.id,
@@ -42,46 +40,48 @@ def create_border_payment(
                 "type": "border_fee",
             },
             description=f"Border fee for {parcel.tracking_id}",
-            automatic_payment_methods={
-                "enabled": True,
-            },
+            idempotency_key=idempotency_key(parcel.id, "border_fee", amount),
         )
-
-        # Create payment record
-        db_payment = models.Payment(
-            parcel_id=parcel.id,
-            payment_id=payment_intent.id,
-            type="border_fee",
-            amount=parcel.border_fee,
-            status="pending",
-            payment_details={
-                "email": payment.email or parcel.sender_email,
-                "method": "card",
+    except StripeError as e:
+        if e.is_client_error:
+            raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=502, detail=str(e))
+
+    # Create payment record
+    async with session_scope() as db:
+        db_payment = await run_db(
+            db,
+            crud.record_payment_intent,
+            {
+                "parcel_id": parcel.id,
+                "payment_id": payment_intent["id"],
+                "type": "border_fee",
+                "amount": parcel.border_fee,
+                "status": "pending",
+                "payment_details": {
+                    "email": payment.email or parcel.sender_email,
+                    "method": "card",
+                },
             },
         )
 
-        db.add(db_payment)
-        db.commit()
-
-        return {
-            "client_secret": payment_intent.client_secret,
-            "payment_id": db_payment.id,
-            "amount": parcel.border_fee,
-            "currency": "usd",
-            "tracking_id": parcel.tracking_id,
-        }
-
-    except stripe.error.StripeError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "client_secret": payment_intent["client_secret"],
+        "payment_id": db_payment.id,
+        "amount": parcel.border_fee,
+        "currency": "usd",
+        "tracking_id": parcel.tracking_id,
+    }
 
 
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
     stripe_signature: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ):
     """Handle Stripe webhook events"""
+    import stripe  # Slow to import; only this route needs it
 
     payload = await request.body()
     webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_...")
@@ -95,82 +95,22 @@ async def stripe_webhook(
     except stripe.error.SignatureVerificationError as e:
         raise HTTPException(status_code=400, detail=f"Invalid signature: {str(e)}")
 
-    # Handle the event
-    if event.type == "payment_intent.succeeded":
-        payment_intent = event.data.object
-        await handle_payment_success(db, payment_intent)
-    elif event.type == "payment_intent.payment_failed":
-        payment_intent = event.data.object
-        await handle_payment_failure(db, payment_intent)
+    # Store it for the background worker and acknowledge at once;
+    # redeliveries of an event already in the inbox are no-ops
+    if event.type in HANDLED_EVENTS:
+        stored = await run_db(
+            db, crud.store_webhook_event, event.id, event.type, json.loads(payload)
+        )
+        if stored:
+            webhook_worker.wake()
 
     return {"status": "success"}
 
 
-async def handle_payment_success(db: Session, payment_intent):
-    """Handle successful payment"""
-    # Find payment in database
-    payment = (
-        db.query(models.Payment)
-        .filter(models.Payment.payment_id == payment_intent.id)
-        .first()
-    )
-
-    if payment:
-        # Update payment
-        payment.status = "completed"
-        payment.completed_at = datetime.now()
-
-        # Update payment details from Stripe
-        if payment_intent.charges and len(payment_intent.charges.data) > 0:
-            charge = payment_intent.charges.data[0]
-            if charge.payment_method_details.card:
-                payment.payment_details = {
-                    **payment.payment_details,
-                    "card_last4": charge.payment_method_details.card.last4,
-                    "card_brand": charge.payment_method_details.card.brand,
-                }
-
-        # Update parcel if it's a border fee
-        if payment.type == "border_fee":
-            parcel = (
-                db.query(models.Parcel)
-                .filter(models.Parcel.id == payment.parcel_id)
-                .first()
-            )
-
-            if parcel:
-                parcel.border_fee_paid = True
-                parcel.status = "border_cleared"
-
-                # Add tracking history
-                tracking = models.TrackingHistory(
-                    parcel_id=parcel.id,
-                    status="border_cleared",
-                    location=parcel.current_location,
-                    description="Border fee paid and cleared customs",
-                )
-                db.add(tracking)
-
-        db.commit()
-
-
-async def handle_payment_failure(db: Session, payment_intent):
-    """Handle failed payment"""
-    payment = (
-        db.query(models.Payment)
-        .filter(models.Payment.payment_id == payment_intent.id)
-        .first()
-    )
-
-    if payment:
-        payment.status = "failed"
-        db.commit()
-
-
 @router.get("/{payment_id}")
-def get_payment_status(payment_id: str, db: Session = Depends(get_db)):
+async def get_payment_status(payment_id: str, db: Session = Depends(get_session)):
     """Get payment status"""
-    payment = db.query(models.Payment).filter(models.Payment.id == payment_id).first()
+    payment = await run_db(db, crud.get_payment_by_id, payment_id)
 
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
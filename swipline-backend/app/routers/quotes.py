@@ -0,0 +1,138 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+import json
+import os
+
+import numpy as np
+
+from app import schemas
+from app.rates import CM_PER_UNIT, rate_cards
+
+router = APIRouter()
+
+MAX_QUOTE_BATCH = int(os.getenv("MAX_QUOTE_BATCH", "50000"))
+
+
+def _invalid(index: int, item) -> dict:
+    try:
+        schemas.QuoteRequest.model_validate(item)
+        detail = "Invalid parcel"
+    except ValidationError as e:
+        detail = schemas.format_errors(e)
+    return {"index": index, "detail": detail}
+
+
+def _price(items: list) -> dict:
+    """Quote every valid item in one vectorized pass"""
+    indexes, weights, lengths, widths, heights, scales, countries = (
+        [] for _ in range(7)
+    )
+    errors = []
+    for index, item in enumerate(items):
+        # Fast path: pull the fields out directly; pydantic only explains
+        # the items that fail
+        try:
+            dimensions = item["dimensions"]
+            row = (
+                float(item["weight"]),
+                float(dimensions["length"]),
+                float(dimensions["width"]),
+                float(dimensions["height"]),
+                CM_PER_UNIT[dimensions["unit"]],
+                item["destination_country"],
+            )
+            if not isinstance(row[5], str) or not 2 <= len(row[5]) <= 10:
+                raise ValueError()
+        except (KeyError, TypeError, ValueError):
+            errors.append(_invalid(index, item))
+            continue
+        indexes.append(index)
+        weights.append(row[0])
+        lengths.append(row[1])
+        widths.append(row[2])
+        heights.append(row[3])
+        scales.append(row[4])
+        countries.append(row[5])
+
+    card = rate_cards.get()
+    indexes = np.array(indexes, dtype=np.int64)
+    weights = np.array(weights)
+    lengths, widths, heights = np.array(lengths), np.array(widths), np.array(heights)
+
+    # Same bounds as CreateParcel; NaN fails every comparison and the upper
+    # bounds reject infinities
+    valid = (
+        (weights > 0.01)
+        & (weights <= schemas.MAX_WEIGHT_KG)
+        & (lengths > 0)
+        & (lengths <= schemas.MAX_DIMENSION)
+        & (widths > 0)
+        & (widths <= schemas.MAX_DIMENSION)
+        & (heights > 0)
+        & (heights <= schemas.MAX_DIMENSION)
+    )
+    for index in indexes[~valid].tolist():
+        errors.append(_invalid(index, items[index]))
+
+    quotes = []
+    if valid.any():
+        result = card.quote(
+            weights[valid],
+            lengths[valid],
+            widths[valid],
+            heights[valid],
+            np.array(scales)[valid],
+            np.array(countries, dtype=str)[valid],
+        )
+        totals = np.round(result.shipping_cost + result.border_fee, 2)
+        # A rate card can still overflow; report those rows, not a 500
+        priced = np.isfinite(totals) & np.isfinite(result.chargeable_weight)
+        for index in indexes[valid][~priced].tolist():
+            errors.append({"index": index, "detail": "Could not price parcel"})
+        quotes = [
+            {
+                "index": index,
+                "chargeable_weight": chargeable,
+                "shipping_cost": shipping,
+                "border_fee": border,
+                "total": total,
+            }
+            for index, chargeable, shipping, border, total in zip(
+                indexes[valid][priced].tolist(),
+                result.chargeable_weight[priced].tolist(),
+                result.shipping_cost[priced].tolist(),
+                result.border_fee[priced].tolist(),
+                totals[priced].tolist(),
+            )
+        ]
+
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "rate_card_version": card.version,
+        "currency": card.currency,
+        "received": len(items),
+        "quotes": quotes,
+        "errors": errors,
+    }
+
+
+@router.post("/batch", response_model=schemas.QuoteBatchResponse)
+async def quote_batch(request: Request):
+    """Quote shipping cost and border fee for a JSON array of parcels"""
+    body = await request.body()
+    try:
+        items = await run_in_threadpool(json.loads, body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array")
+    if len(items) > MAX_QUOTE_BATCH:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_QUOTE_BATCH} parcels per batch"
+        )
+
+    # CPU-bound; keep it off the event loop. The result is already in
+    # response shape, so skip re-validating tens of thousands of rows.
+    return JSONResponse(await run_in_threadpool(_price, items))
@@ -1,38 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from fastapi.websockets import WebSocket, WebSocketDisconnect
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import json
-import asyncio
 
 from app import schemas, crud
-from app.database import get_db
+from app.admission import limit_tracking
+from app.database import get_session, run_db
+from app.realtime import hub
+from app.serialization import ORJSONResponse
 
 router = APIRouter()
 
-# Store active WebSocket connections
-active_connections = {}
 
+def _has_conditions(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
 
-@router.get("/{tracking_id}", response_model=schemas.TrackingResponse)
-def track_parcel(tracking_id: str, db: Session = Depends(get_db)):
+
+def _is_not_modified(request: Request, validators: crud.TrackingValidators) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the parcel state"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as required for GET
+        etag = validators.etag.removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return validators.last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def _validator_headers(validators: crud.TrackingValidators) -> dict:
+    headers = {"ETag": validators.etag, "Cache-Control": "no-cache"}
+    if validators.last_modified:
+        headers["Last-Modified"] = format_datetime(
+            validators.last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def _not_modified(validators: crud.TrackingValidators) -> Response:
+    return Response(status_code=304, headers=_validator_headers(validators))
+
+
+@router.get(
+    "/{tracking_id}",
+    response_model=schemas.TrackingResponse,
+    dependencies=[Depends(limit_tracking)],
+)
+async def track_parcel(
+    tracking_id: str,
+    request: Request,
+    db: Session = Depends(get_session),
+):
     """Public tracking endpoint (no auth required)"""
-    tracking_data = crud.get_tracking_history(db, tracking_id)
+    # Pollers revalidate with a cheap indexed query, without loading history
+    if _has_conditions(request):
+        validators = await run_db(db, crud.get_tracking_validators, tracking_id)
+        if not validators:
+            raise HTTPException(status_code=404, detail="Tracking ID not found")
+        if _is_not_modified(request, validators):
+            return _not_modified(validators)
 
-    if not tracking_data:
+    entry = await run_db(db, crud.get_tracking_entry, tracking_id)
+
+    if not entry:
         raise HTTPException(status_code=404, detail="Tracking ID not found")
 
-    return tracking_data
+    return ORJSONResponse(entry.body, headers=_validator_headers(entry.validators))
 
 
 @router.websocket("/ws/{tracking_id}")
 async def websocket_tracking(websocket: WebSocket, tracking_id: str):
     """WebSocket for real-time tracking updates"""
-    await websocket.accept()
-
-    # Add connection to active connections
-    if tracking_id not in active_connections:
-        active_connections[tracking_id] = []
-    active_connections[tracking_id].append(websocket)
+    subscriber = await hub.connect(tracking_id, websocket)
 
     try:
         while True:
@@ -40,32 +91,42 @@ async def websocket_tracking(websocket: WebSocket, tracking_id: str):
             await websocket.receive_text()
 
     except WebSocketDisconnect:
-        # Remove connection when disconnected
-        if tracking_id in active_connections:
-            active_connections[tracking_id].remove(websocket)
-            if not active_connections[tracking_id]:
-                del active_connections[tracking_id]
+        pass
+    finally:
+        hub.disconnect(subscriber)
 
 
-async def broadcast_location_update(tracking_id: str, update_data: dict):
-    """Broadcast location update to all connected clients"""
-    if tracking_id in active_connections:
-        for connection in active_connections[tracking_id]:
-            try:
-                await connection.send_json(update_data)
-            except:
-                pass  # Connection might be closed
+def broadcast_location_update(tracking_id: str, update_data: dict):
+    """Send an update to this worker's subscribers of a parcel
 
+    Updates written through crud reach every worker via Postgres
+    notifications; this is only for messages that are not stored.
+    """
+    hub.publish(tracking_id, json.dumps(update_data, default=str))
 
-@router.post("/{tracking_id}/subscribe")
-def subscribe_to_updates(tracking_id: str, db: Session = Depends(get_db)):
+
+@router.post("/{tracking_id}/subscribe", dependencies=[Depends(limit_tracking)])
+async def subscribe_to_updates(
+    tracking_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_session),
+):
     """Subscribe to tracking updates (for polling)"""
-    # This is for HTTP polling fallback
-    parcel = crud.get_parcel_by_tracking_id(db, tracking_id)
+    # This is for HTTP polling fallback. Validators are read before the
+    # parcel so they can only ever be older than the body they label.
+    validators = await run_db(db, crud.get_tracking_validators, tracking_id)
+    if not validators:
+        raise HTTPException(status_code=404, detail="Parcel not found")
+    if _is_not_modified(request, validators):
+        return _not_modified(validators)
+
+    parcel = await run_db(db, crud.get_parcel_by_tracking_id, tracking_id)
 
     if not parcel:
         raise HTTPException(status_code=404, detail="Parcel not found")
 
+    response.headers.update(_validator_headers(validators))
     return {
         "tracking_id": tracking_id,
         "status": "subscribed",
@@ -1,47 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
-import jwt
-import os
 
-from app import schemas, crud, models
-from app.database import get_db
+from app import schemas, crud
+from app.auth import create_access_token, get_current_user
+from app.database import get_session, run_db
+from app.passwords import PasswordHasherBusy, hasher, password_context
 
 router = APIRouter()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# JWT settings
-SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
-
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+async def _hash_call(call, *args):
+    try:
+        return await call(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
 
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(get_session)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = (
-        db.query(models.User).filter(models.User.email == user.email).first()
-    )
+    existing_user = await run_db(db, crud.get_user_by_email, user.email)
 
     if existing_user:
         raise HTTPException(
@@ -49,25 +40,19 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
     # Create new user
-    db_user = models.User(
-        email=user.email,
-        full_name=user.full_name,
-        password=get_password_hash(user.password),
-        phone=user.phone,
+    hashed_password = await _hash_call(hasher.hash, user.password)
+    db_user = await run_db(
+        db, crud.create_user, user.model_copy(update={"password": hashed_password})
     )
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
     return db_user
 
 
 @router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: Session = Depends(get_session)):
     """Login user and return access token"""
     # Find user
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await run_db(db, crud.get_user_by_email, user.email)
 
     if not db_user:
         raise HTTPException(
@@ -75,11 +60,18 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
         )
 
     # Verify password
-    if not verify_password(user.password, db_user.password):
+    valid, new_hash = await _hash_call(
+        hasher.verify_and_update, user.password, db_user.password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
+    # Hashed with different settings than the current ones: upgrade it
+    if new_hash:
+        await run_db(db, crud.update_user_password, db_user.id, new_hash)
+
     # Create access token
     access_token = create_access_token(
         data={"sub": db_user.id, "email": db_user.email, "role": db_user.role}
@@ -98,23 +90,13 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user(
-    token: str = Depends(lambda: None),  # Simplified - in real app, use proper auth
-    db: Session = Depends(get_db),
-):
+async def get_me(user: crud.AuthUser = Depends(get_current_user)):
     """Get current user profile"""
-    # Simplified - you should implement proper JWT authentication
-    # This is just a placeholder
-
-    # For now, return a dummy response or implement proper auth
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Authentication not implemented yet",
-    )
+    return user
 
 
 @router.post("/forgot-password")
-def forgot_password(email: str, db: Session = Depends(get_db)):
+async def forgot_password(email: str, db: Session = Depends(get_session)):
     """Request password reset (simplified)"""
     # In production, send email with reset token
     return {
@@ -124,7 +106,9 @@ def forgot_password(email: str, db: Session = Depends(get_db)):
 
 
 @router.post("/reset-password")
-def reset_password(token: str, new_password: str, db: Session = Depends(get_db)):
+async def reset_password(
+    token: str, new_password: str, db: Session = Depends(get_session)
+):
     """Reset password with token"""
     # In production, verify token and update password
     return {"message": "Password reset successfully"}
@@ -1,9 +1,18 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, ValidationError, validator
+from typing import Optional, List, Dict, Any, Union
+from datetime import date, datetime
 from enum import Enum
 
 
+def format_errors(error: ValidationError) -> str:
+    """Flatten a ValidationError into one "loc: message; ..." string"""
+    messages = []
+    for err in error.errors():
+        loc = ".".join(str(part) for part in err["loc"])
+        messages.append(f"{loc}: {err['msg']}" if loc else err["msg"])
+    return "; ".join(messages)
+
+
 # Enums
 class ParcelStatus(str, Enum):
     PENDING = "pending"
@@ -42,10 +51,15 @@ class ContentItem(BaseModel):
     value: float = Field(ge=0)
 
 
+# Longest accepted side, in the parcel's unit; keeps priced volumes finite
+MAX_DIMENSION = 1000
+MAX_WEIGHT_KG = 100
+
+
 class Dimensions(BaseModel):
-    length: float = Field(gt=0)
-    width: float = Field(gt=0)
-    height: float = Field(gt=0)
+    length: float = Field(gt=0, le=MAX_DIMENSION, allow_inf_nan=False)
+    width: float = Field(gt=0, le=MAX_DIMENSION, allow_inf_nan=False)
+    height: float = Field(gt=0, le=MAX_DIMENSION, allow_inf_nan=False)
     unit: str = Field(pattern="^(cm|in)$")
 
 
@@ -62,7 +76,12 @@ class CreateParcel(BaseModel):
     recipient_address: str
     destination_country: str = Field(min_length=2, max_length=10)
 
-    weight: float = Field(gt=0.01, le=100, description="Weight in kilograms")
+    weight: float = Field(
+        gt=0.01,
+        le=MAX_WEIGHT_KG,
+        allow_inf_nan=False,
+        description="Weight in kilograms",
+    )
     dimensions: Dimensions
     contents: Optional[List[ContentItem]] = None
 
@@ -89,7 +108,7 @@ class ParcelResponse(BaseModel):
     destination_country: str
     weight: float
     dimensions: Dict[str, Any]
-    contents: Optional[List[Dict[str, Any]]]
+    contents: Optional[List[Dict[str, Any]]] = None
     status: str
     current_location: str
     coordinates: Optional[Dict[str, float]]
@@ -109,6 +128,57 @@ class UpdateLocation(BaseModel):
     coordinates: Optional[Coordinates] = None
 
 
+class BulkLocationUpdate(UpdateLocation):
+    tracking_id: str
+
+
+class BulkLocationResult(BaseModel):
+    index: int
+    tracking_id: Optional[str] = None
+    result: str  # updated, not_found, invalid
+    detail: Optional[str] = None
+
+
+class BulkLocationResponse(BaseModel):
+    received: int
+    updated: int
+    failed: int
+    results: List[BulkLocationResult]
+
+
+# Quote schemas
+class QuoteRequest(BaseModel):
+    weight: float = Field(
+        gt=0.01,
+        le=MAX_WEIGHT_KG,
+        allow_inf_nan=False,
+        description="Weight in kilograms",
+    )
+    dimensions: Dimensions
+    destination_country: str = Field(min_length=2, max_length=10)
+
+
+class Quote(BaseModel):
+    index: int
+    chargeable_weight: float
+    shipping_cost: float
+    border_fee: float
+    total: float
+
+
+class QuoteError(BaseModel):
+    index: int
+    detail: str
+
+
+class QuoteBatchResponse(BaseModel):
+    rate_card_version: str
+    currency: str
+    received: int
+    quotes: List[Quote]
+    errors: List[QuoteError]
+
+
 # Payment schemas
 class CreatePayment(BaseModel):
     tracking_id: str
@@ -169,7 +239,7 @@ class UserLogin(BaseModel):
 class UserResponse(UserBase):
     id: str
     role: str
-    is_verified: bool
+    is_verified: bool = False  # No verification flow yet
     created_at: datetime
 
     class Config:
@@ -189,11 +259,35 @@ class TokenData(BaseModel):
 
 # Admin schemas
 class ParcelSearch(BaseModel):
-    tracking_id: Optional[str] = None
+    tracking_id: Optional[str] = Field(default=None, max_length=64)
     status: Optional[ParcelStatus] = None
-    email: Optional[EmailStr] = None
+    # Full addresses match exactly, anything shorter as a substring
+    email: Optional[str] = Field(default=None, max_length=254)
+    name: Optional[str] = Field(default=None, max_length=200)
+    phone: Optional[str] = Field(default=None, max_length=32)
     skip: int = 0
-    limit: int = 100
+    limit: int = Field(default=100, ge=1, le=500)
+    cursor: Optional[str] = None
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class ExportFilters(BaseModel):
+    format: ExportFormat = ExportFormat.CSV
+    status: Optional[str] = Field(default=None, max_length=32)
+    # Half-open: created_from <= created_at < created_to; a date is midnight
+    # in the database time zone
+    created_from: Optional[Union[datetime, date]] = None
+    created_to: Optional[Union[datetime, date]] = None
+    destination: Optional[str] = Field(default=None, max_length=10)
+
+
+class ParcelPage(BaseModel):
+    items: List[ParcelResponse]
+    next_cursor: Optional[str] = None
 
 
 class StatisticsResponse(BaseModel):
@@ -204,3 +298,4 @@ class StatisticsResponse(BaseModel):
     total_revenue: float
     border_fee_revenue: float
     shipping_revenue: float
+    by_status: Dict[str, int] = {}
@@ -0,0 +1,113 @@
+"""Index-backed parcel search filters
+
+Each searchable field is matched through the same normalized expression
+its index is built on (see ``models.Parcel.__table_args__``), so Postgres
+can serve the filter from the index:
+
+- tracking IDs: exact match, or prefix match on text_pattern_ops
+- emails: exact or prefix match on lower(email), substring match on a
+  pg_trgm GIN index
+- recipient name (lower case, runs of whitespace collapsed to one space)
+  and phone numbers (digits only): trigram substring match
+
+Terms shorter than a trigram fall back to prefix matching, which trigram
+indexes can still serve.
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import func, or_
+
+TRACKING_ID_LENGTH = 17
+MIN_TRIGRAM_LENGTH = 3
+
+_LIKE_SPECIAL = re.compile(r"([\\%_])")
+_NON_DIGITS = re.compile(r"\D")
+# The same class in Python and in Postgres regexps (where \s depends on locale)
+WHITESPACE = r"[\t\n\v\f\r ]+"
+_WHITESPACE = re.compile(WHITESPACE)
+_FULL_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally"""
+    return _LIKE_SPECIAL.sub(r"\\\1", term)
+
+
+def normalize_email(value: str) -> str:
+    return value.strip().lower()
+
+
+def normalize_name(value: str) -> str:
+    return _WHITESPACE.sub(" ", value).strip(" ").lower()
+
+
+def normalize_phone(value: str) -> str:
+    return _NON_DIGITS.sub("", value)
+
+
+def email_expr(column):
+    return func.lower(column)
+
+
+def name_expr(column):
+    return func.regexp_replace(func.lower(column), WHITESPACE, " ", "g")
+
+
+def phone_expr(column):
+    return func.regexp_replace(column, "[^0-9]", "", "g")
+
+
+def _prefix(expr, term: str):
+    return expr.like(escape_like(term) + "%", escape="\\")
+
+
+def _contains(expr, term: str):
+    if len(term) < MIN_TRIGRAM_LENGTH:
+        return _prefix(expr, term)
+    return expr.like("%" + escape_like(term) + "%", escape="\\")
+
+
+def tracking_id_filter(column, term: str):
+    term = term.strip().upper()
+    if len(term) >= TRACKING_ID_LENGTH:
+        return column == term
+    return _prefix(column, term)
+
+
+def email_filter(columns, term: str):
+    term = normalize_email(term)
+    if _FULL_EMAIL.match(term):
+        # A full address: equality on the lower(email) B-tree
+        return or_(*(email_expr(column) == term for column in columns))
+    return or_(*(_contains(email_expr(column), term) for column in columns))
+
+
+def parcel_filters(
+    parcel,
+    tracking_id: Optional[str] = None,
+    email: Optional[str] = None,
+    name: Optional[str] = None,
+    phone: Optional[str] = None,
+) -> List:
+    """WHERE clauses for a parcel search; blank terms are ignored"""
+    filters = []
+    if tracking_id and tracking_id.strip():
+        filters.append(tracking_id_filter(parcel.tracking_id, tracking_id))
+    if email and email.strip():
+        filters.append(
+            email_filter([parcel.sender_email, parcel.recipient_email], email)
+        )
+    if name and normalize_name(name):
+        filters.append(
+            _contains(name_expr(parcel.recipient_name), normalize_name(name))
+        )
+    if phone and normalize_phone(phone):
+        term = normalize_phone(phone)
+        filters.append(
+            or_(
+                _contains(phone_expr(parcel.sender_phone), term),
+                _contains(phone_expr(parcel.recipient_phone), term),
+            )
+        )
+    return filters
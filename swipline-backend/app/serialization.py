@@ -0,0 +1,65 @@
+"""Fast JSON encoding for parcel and tracking reads
+
+A route that returns plain data has FastAPI validate it against the
+response_model, convert it with jsonable_encoder and encode it with
+json.dumps. For rows read from our own tables the validation is
+redundant: the columns already have the schema's types. Those routes
+build the dict themselves, encode it once with orjson and return it in an
+``ORJSONResponse``. Tracking responses are cached already encoded (see
+``crud.get_tracking_entry``).
+
+With RESPONSE_VALIDATION set, the bodies go through the schema's
+pre-built TypeAdapter instead. That is slower, but a row that no longer
+matches the schema then fails loudly, so turn it on in development and CI.
+"""
+import os
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app import schemas
+
+RESPONSE_VALIDATION = os.getenv("RESPONSE_VALIDATION", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Z for UTC datetimes, as pydantic writes them
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+parcel_adapter = TypeAdapter(schemas.ParcelResponse)
+tracking_adapter = TypeAdapter(schemas.TrackingResponse)
+
+PARCEL_FIELDS = tuple(schemas.ParcelResponse.model_fields)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; bytes are sent as they are"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def encode(adapter: TypeAdapter, data: Any) -> bytes:
+    """Encode trusted data; checked against the schema under RESPONSE_VALIDATION"""
+    if RESPONSE_VALIDATION:
+        return adapter.dump_json(adapter.validate_python(data))
+    return orjson.dumps(data, option=ORJSON_OPTIONS)
+
+
+def parcel_data(parcel) -> dict:
+    """The ParcelResponse fields of a Parcel row, without validation"""
+    return {name: getattr(parcel, name, None) for name in PARCEL_FIELDS}
+
+
+def encode_parcel(parcel) -> bytes:
+    return encode(parcel_adapter, parcel_data(parcel))
+
+
+def encode_tracking(data: dict) -> bytes:
+    return encode(tracking_adapter, data)
@@ -0,0 +1,130 @@
+"""Minimal async Stripe API client
+
+The official ``stripe`` library blocks on its HTTP calls, so payment
+intents are created through one shared ``httpx.AsyncClient`` per worker:
+keep-alive connections are reused across requests, every call has strict
+connect/read timeouts, and callers pass an idempotency key so a retried
+request never creates a second intent. STRIPE_API_BASE can point at
+``scripts/stripe_stub.py`` for local runs. httpx is imported with the
+first call, not at startup.
+"""
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "sk_test_...")
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "2"))
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_CONNECTIONS = int(os.getenv("STRIPE_MAX_CONNECTIONS", "20"))
+STRIPE_KEEPALIVE_CONNECTIONS = int(os.getenv("STRIPE_KEEPALIVE_CONNECTIONS", "10"))
+
+
+class StripeError(Exception):
+    """A Stripe call failed
+
+    ``status_code`` is Stripe's HTTP status, or None when no response
+    arrived (timeout or connection error).
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def is_client_error(self) -> bool:
+        return self.status_code is not None and 400 <= self.status_code < 500
+
+
+def _form(data: dict, prefix: str = "") -> dict:
+    """Flatten nested params into Stripe's bracketed form encoding"""
+    fields = {}
+    for key, value in data.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        if isinstance(value, dict):
+            fields.update(_form(value, name))
+        elif isinstance(value, bool):
+            fields[name] = "true" if value else "false"
+        elif value is not None:
+            fields[name] = str(value)
+    return fields
+
+
+def idempotency_key(parcel_id: str, payment_type: str, amount: int) -> str:
+    """Stable key for one payment of a parcel, so retries reuse its intent"""
+    return f"{payment_type}-{parcel_id}-{amount}"
+
+
+class StripeClient:
+    def __init__(self):
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=STRIPE_API_BASE,
+                auth=(STRIPE_SECRET_KEY, ""),
+                timeout=httpx.Timeout(STRIPE_TIMEOUT, connect=STRIPE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=STRIPE_MAX_CONNECTIONS,
+                    max_keepalive_connections=STRIPE_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, path: str, params: dict, idempotency_key: str) -> dict:
+        import httpx
+
+        try:
+            response = await self.client.post(
+                path,
+                data=_form(params),
+                headers={"Idempotency-Key": idempotency_key},
+            )
+        except httpx.TimeoutException:
+            raise StripeError("Payment provider timed out")
+        except httpx.HTTPError as e:
+            raise StripeError(f"Payment provider unreachable: {e}")
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.is_error:
+            message = body.get("error", {}).get("message") or response.reason_phrase
+            raise StripeError(message, response.status_code)
+        return body
+
+    async def create_payment_intent(
+        self,
+        amount: int,
+        currency: str,
+        metadata: dict,
+        description: str,
+        idempotency_key: str,
+    ) -> dict:
+        """Create a PaymentIntent; ``amount`` is in the smallest currency unit"""
+        return await self._post(
+            "/v1/payment_intents",
+            {
+                "amount": amount,
+                "currency": currency,
+                "metadata": metadata,
+                "description": description,
+                "automatic_payment_methods": {"enabled": True},
+            },
+            idempotency_key,
+        )
+
+
+stripe_client = StripeClient()
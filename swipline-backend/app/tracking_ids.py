@@ -0,0 +1,263 @@
+"""Time-ordered tracking IDs
+
+A tracking ID is ``SWP`` followed by 14 Crockford base32 characters (17 in
+all, like the original random IDs): 13 encode a 65-bit payload and the
+last is a Luhn mod 32 check character that catches any single mistyped
+character and most adjacent swaps.
+
+    payload = milliseconds since TRACKING_ID_EPOCH (41 bits, ~69 years)
+              | node (10 bits) | sequence within the millisecond (14 bits)
+
+Every process leases a node number once, so IDs are unique across workers
+without a round trip per ID. The lease is a session advisory lock on
+(TRACKING_ID_NODE_LOCK, node), held by a connection kept out of the pool
+for the life of the process: the ``tracking_id_nodes`` sequence only picks
+where the search for a free node starts, and a process fails to start
+generating rather than share a node when all 1024 are held. A background
+thread re-checks the lease every TRACKING_ID_NODE_CHECK_INTERVAL seconds
+and replaces it if its connection was lost. Until then another process may
+lease the same node, so parcel inserts draw fresh IDs when a tracking ID
+is already taken (app/crud.py). TRACKING_ID_NODE skips the lease, for
+deployments that assign nodes themselves. The alphabet is in ASCII order,
+so IDs sort by creation time and new rows land at the right edge of the
+unique index.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+PREFIX = "SWP"
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LENGTH = len(PREFIX) + 14
+
+TIMESTAMP_BITS = 41
+NODE_BITS = 10
+SEQUENCE_BITS = 14
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+TRACKING_ID_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# Session advisory locks on (TRACKING_ID_NODE_LOCK, node) lease node numbers
+TRACKING_ID_NODE_LOCK = 7_531_003
+TRACKING_ID_NODE_CHECK_INTERVAL = float(
+    os.getenv("TRACKING_ID_NODE_CHECK_INTERVAL", "30")
+)
+
+logger = logging.getLogger(__name__)
+
+_EPOCH_MS = int(TRACKING_ID_EPOCH.timestamp() * 1000)
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def _encode(payload: int) -> str:
+    chars = []
+    for _ in range(13):
+        chars.append(ALPHABET[payload & 31])
+        payload >>= 5
+    return "".join(reversed(chars))
+
+
+def check_char(body: str) -> str:
+    """Luhn mod 32 check character for a string of base32 characters"""
+    total = 0
+    factor = 2
+    for char in reversed(body):
+        addend = factor * _VALUES[char]
+        total += addend // 32 + addend % 32
+        factor = 3 - factor
+    return ALPHABET[-total % 32]
+
+
+def is_valid(tracking_id: str) -> bool:
+    """Whether a string is a well-formed tracking ID with a correct check"""
+    if len(tracking_id) != LENGTH or not tracking_id.startswith(PREFIX):
+        return False
+    body = tracking_id[len(PREFIX) : -1]
+    if any(char not in _VALUES for char in body):
+        return False
+    return check_char(body) == tracking_id[-1]
+
+
+def created_at(tracking_id: str) -> datetime:
+    """When an ID was generated (millisecond precision)"""
+    payload = 0
+    for char in tracking_id[len(PREFIX) : -1]:
+        payload = payload << 5 | _VALUES[char]
+    ms = payload >> (NODE_BITS + SEQUENCE_BITS)
+    return datetime.fromtimestamp((_EPOCH_MS + ms) / 1000, timezone.utc)
+
+
+def _configured_node() -> Optional[int]:
+    configured = os.getenv("TRACKING_ID_NODE")
+    if configured is None:
+        return None
+    node = int(configured)
+    if not 0 <= node <= MAX_NODE:
+        raise ValueError(f"TRACKING_ID_NODE must be between 0 and {MAX_NODE}")
+    return node
+
+
+class NodeLease:
+    """A node number held by an advisory lock on a dedicated connection"""
+
+    def __init__(self, node: int, connection):
+        self.node = node
+        self._connection = connection
+
+    @property
+    def backend_pid(self) -> int:
+        return self._connection.get_backend_pid()
+
+    def held(self) -> bool:
+        """Whether the connection, and so the lock, is still open"""
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+
+
+def lease_node() -> NodeLease:
+    """Lock the first free node, starting from the next sequence value"""
+    from app.database import engine
+
+    # Kept out of the pool: returning it would release the lock to whichever
+    # request checks the connection out next
+    raw = engine.raw_connection()
+    connection = raw.driver_connection
+    raw.detach()
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('tracking_id_nodes')")
+            start = cursor.fetchone()[0]
+            for offset in range(MAX_NODE + 1):
+                node = (start + offset) % (MAX_NODE + 1)
+                cursor.execute(
+                    "SELECT pg_try_advisory_lock(%s, %s)",
+                    (TRACKING_ID_NODE_LOCK, node),
+                )
+                if cursor.fetchone()[0]:
+                    return NodeLease(node, connection)
+    except BaseException:
+        connection.close()
+        raise
+    connection.close()
+    raise RuntimeError(f"All {MAX_NODE + 1} tracking ID nodes are leased")
+
+
+# Leases inherited across fork. A child must never close them: that would end
+# the parent's session and release the parent's node.
+_inherited_leases = []
+
+
+class TrackingIdGenerator:
+    """Thread-safe generator for one process"""
+
+    def __init__(self):
+        self._node: Optional[int] = None
+        self._lease: Optional[NodeLease] = None
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._node_lock = threading.Lock()
+
+    def _allocate(self):
+        configured = _configured_node()
+        if configured is not None:
+            self._node = configured
+            return
+        lease = lease_node()
+        self._lease = lease
+        self._node = lease.node
+        threading.Thread(
+            target=self._watch, args=(lease,), name="tracking-id-lease", daemon=True
+        ).start()
+
+    def _watch(self, lease: NodeLease):
+        """Check the lease in the background until it is replaced"""
+        while self._lease is lease:
+            time.sleep(TRACKING_ID_NODE_CHECK_INTERVAL)
+            try:
+                self.check_lease()
+            except Exception:
+                logger.exception("Could not replace the tracking ID node lease")
+
+    @property
+    def node(self) -> int:
+        if self._node is None:
+            with self._node_lock:
+                if self._node is None:
+                    self._allocate()
+        return self._node
+
+    def check_lease(self) -> int:
+        """Replace the lease if its connection was lost; returns the node"""
+        lease = self._lease
+        if lease is not None and not lease.held():
+            with self._node_lock:
+                if self._lease is lease:
+                    # Another process may lease this node from now on
+                    logger.warning("Lost the lease on tracking ID node %d", lease.node)
+                    lease.close()
+                    self._lease = None
+                    self._node = None
+        return self.node
+
+    def reset(self):
+        """Forget the node and sequence state (a forked child needs its own)"""
+        if self._lease is not None:
+            _inherited_leases.append(self._lease)
+        self._node = None
+        self._lease = None
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._node_lock = threading.Lock()
+
+    def _next(self, node: int) -> int:
+        now = int(time.time() * 1000) - _EPOCH_MS
+        if now > self._last_ms:
+            self._last_ms = now
+            self._sequence = 0
+        elif self._sequence < MAX_SEQUENCE:
+            # Same millisecond, or the clock stepped back: keep counting
+            # from the last timestamp so IDs stay unique and ordered
+            self._sequence += 1
+        else:
+            # Sequence exhausted; borrow the next millisecond
+            self._last_ms += 1
+            self._sequence = 0
+        return (
+            self._last_ms << (NODE_BITS + SEQUENCE_BITS)
+            | node << SEQUENCE_BITS
+            | self._sequence
+        )
+
+    def __call__(self) -> str:
+        node = self.node  # Allocate before taking the lock
+        with self._lock:
+            payload = self._next(node)
+        body = _encode(payload)
+        return f"{PREFIX}{body}{check_char(body)}"
+
+    def many(self, count: int) -> list:
+        """Generate ``count`` IDs under one lock acquisition"""
+        node = self.node  # Allocate before taking the lock
+        with self._lock:
+            payloads = [self._next(node) for _ in range(count)]
+        return [f"{PREFIX}{body}{check_char(body)}" for body in map(_encode, payloads)]
+
+
+generate = TrackingIdGenerator()
+os.register_at_fork(after_in_child=generate.reset)
@@ -0,0 +1,193 @@
+"""Background processing of the Stripe webhook inbox
+
+The webhook route only verifies and stores events (``webhook_events``,
+deduplicated on the event ID) so Stripe gets its 200 at once. Every worker
+process runs a ``WebhookWorker`` that claims due events in batches with
+``FOR UPDATE SKIP LOCKED``, applies them set-wise and records the outcome
+in the same transaction. Events whose payment is not recorded yet, or that
+fail, are retried with exponential backoff.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from app import crud
+from app.database import run_db, session_scope
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKER_ENABLED = os.getenv("WEBHOOK_WORKER_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_RETRY_BASE = float(os.getenv("WEBHOOK_RETRY_BASE", "2"))
+WEBHOOK_RETRY_MAX = float(os.getenv("WEBHOOK_RETRY_MAX", "600"))
+
+PAYMENT_SUCCEEDED = "payment_intent.succeeded"
+PAYMENT_FAILED = "payment_intent.payment_failed"
+HANDLED_EVENTS = {PAYMENT_SUCCEEDED, PAYMENT_FAILED}
+
+
+class BatchResult(NamedTuple):
+    claimed: int
+    processed: int
+    retried: int
+    max_lag: float  # seconds from receipt to processing
+
+
+def _card_details(payment_intent: dict) -> Optional[dict]:
+    charges = (payment_intent.get("charges") or {}).get("data") or []
+    if not charges:
+        return None
+    card = (charges[0].get("payment_method_details") or {}).get("card")
+    if not card:
+        return None
+    return {"card_last4": card.get("last4"), "card_brand": card.get("brand")}
+
+
+def apply_events(db, events):
+    """Apply a batch of inbox events without committing
+
+    Returns per-event outcomes (None or an error message) and the tracking
+    IDs of parcels that changed.
+    """
+    succeeded = {}
+    failed = []
+    intent_ids = {}
+    for event in events:
+        payment_intent = event.payload["data"]["object"]
+        intent_ids[event.id] = payment_intent["id"]
+        if event.type == PAYMENT_SUCCEEDED:
+            succeeded[payment_intent["id"]] = _card_details(payment_intent)
+        else:
+            failed.append(payment_intent["id"])
+
+    # Failures first: a later success for the same intent must win
+    found = crud.fail_payments(db, failed)
+    completed, cleared = crud.complete_payments(db, succeeded)
+    found |= completed
+
+    outcomes = {
+        event_id: None if intent_id in found else "Payment not found"
+        for event_id, intent_id in intent_ids.items()
+    }
+    return outcomes, cleared
+
+
+def drain_once(db, batch_size: int) -> BatchResult:
+    """Claim, apply and settle one batch of due events"""
+    events = crud.claim_webhook_events(db, batch_size)
+    if not events:
+        db.rollback()
+        return BatchResult(0, 0, 0, 0.0)
+
+    try:
+        with db.begin_nested():
+            outcomes, cleared = apply_events(db, events)
+    except Exception:
+        logger.exception("Webhook batch failed; applying events one by one")
+        outcomes, cleared = {}, []
+        for event in events:
+            try:
+                with db.begin_nested():
+                    outcome, changed = apply_events(db, [event])
+                outcomes.update(outcome)
+                cleared.extend(changed)
+            except Exception as e:
+                outcomes[event.id] = f"{type(e).__name__}: {e}"[:500]
+
+    now = datetime.now(timezone.utc)
+    max_lag = max((now - event.received_at).total_seconds() for event in events)
+    crud.finish_webhook_events(
+        db, outcomes, WEBHOOK_MAX_ATTEMPTS, WEBHOOK_RETRY_BASE, WEBHOOK_RETRY_MAX
+    )
+    crud.invalidate_tracking(*cleared)
+
+    retried = sum(1 for error in outcomes.values() if error)
+    return BatchResult(len(events), len(events) - retried, retried, max_lag)
+
+
+class WebhookWorker:
+    """Drains the inbox in the background of one worker process"""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.batches = 0
+        self.processed = 0
+        self.retried = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_batch_at: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        """Start draining now instead of at the next poll"""
+        self._wake.set()
+
+    async def start(self):
+        if self._task is None and WEBHOOK_WORKER_ENABLED:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                async with session_scope() as db:
+                    result = await run_db(db, drain_once, self.batch_size)
+                if result.claimed:
+                    self._record(result)
+                    if result.claimed == self.batch_size:
+                        continue  # More may be due; don't wait
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Webhook worker failed to drain the inbox")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), WEBHOOK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, result: BatchResult):
+        self.batches += 1
+        self.processed += result.processed
+        self.retried += result.retried
+        self.last_lag = result.max_lag
+        self.max_lag = max(self.max_lag, result.max_lag)
+        self.last_batch_at = datetime.now(timezone.utc)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "processed": self.processed,
+            "retried": self.retried,
+            "errors": self.errors,
+            "last_lag_s": round(self.last_lag, 3),
+            "max_lag_s": round(self.max_lag, 3),
+            "last_batch_at": (
+                self.last_batch_at.isoformat() if self.last_batch_at else None
+            ),
+        }
+
+
+webhook_worker = WebhookWorker(WEBHOOK_BATCH_SIZE)
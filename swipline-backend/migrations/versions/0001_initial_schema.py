@@ -0,0 +1,102 @@
+"""Initial schema
+
+Matches the tables previously created by ``Base.metadata.create_all``.
+Existing databases should be stamped at this revision
+(``alembic stamp 0001``) before upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("phone", sa.String()),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("role", sa.String()),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+
+    op.create_table(
+        "parcels",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("tracking_id", sa.String(), unique=True),
+        sa.Column("sender_name", sa.String(), nullable=False),
+        sa.Column("sender_email", sa.String(), nullable=False),
+        sa.Column("sender_phone", sa.String(), nullable=False),
+        sa.Column("recipient_name", sa.String(), nullable=False),
+        sa.Column("recipient_email", sa.String(), nullable=False),
+        sa.Column("recipient_phone", sa.String(), nullable=False),
+        sa.Column("recipient_address", sa.String(), nullable=False),
+        sa.Column("destination_country", sa.String(), nullable=False),
+        sa.Column("weight", sa.Float(), nullable=False),
+        sa.Column("dimensions", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String()),
+        sa.Column("current_location", sa.String()),
+        sa.Column("coordinates", sa.JSON()),
+        sa.Column("shipping_cost", sa.Float()),
+        sa.Column("border_fee", sa.Float()),
+        sa.Column("border_fee_paid", sa.Boolean()),
+        sa.Column("estimated_delivery", sa.DateTime(timezone=True)),
+        sa.Column("actual_delivery", sa.DateTime(timezone=True)),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id")),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+
+    op.create_table(
+        "tracking_history",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column(
+            "parcel_id", sa.String(), sa.ForeignKey("parcels.id"), nullable=False
+        ),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("location", sa.String(), nullable=False),
+        sa.Column("coordinates", sa.JSON()),
+        sa.Column("description", sa.String()),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+    )
+
+    op.create_table(
+        "payments",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column(
+            "parcel_id", sa.String(), sa.ForeignKey("parcels.id"), nullable=False
+        ),
+        sa.Column("payment_id", sa.String(), nullable=False, unique=True),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("status", sa.String()),
+        sa.Column("payment_details", sa.JSON()),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("payments")
+    op.drop_table("tracking_history")
+    op.drop_table("parcels")
+    op.drop_table("users")
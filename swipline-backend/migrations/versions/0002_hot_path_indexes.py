@@ -0,0 +1,59 @@
+"""Composite indexes for the hot query paths in crud.py
+
+Built with CREATE INDEX CONCURRENTLY so they can be applied to a live
+database without blocking writes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # get_tracking_history: WHERE parcel_id = ? ORDER BY created_at
+    (
+        "ix_tracking_history_parcel_id_created_at",
+        "tracking_history",
+        ["parcel_id", "created_at"],
+    ),
+    # get_user_parcels: WHERE user_id = ? ORDER BY created_at DESC
+    ("ix_parcels_user_id_created_at", "parcels", ["user_id", "created_at"]),
+    # search_parcels: WHERE status = ? ORDER BY created_at DESC
+    ("ix_parcels_status_created_at", "parcels", ["status", "created_at"]),
+    # get_parcel_payments: WHERE parcel_id = ? ORDER BY created_at DESC
+    (
+        "ix_payments_parcel_id_created_at",
+        "payments",
+        ["parcel_id", "created_at"],
+    ),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,62 @@
+"""Extend parcel list indexes with id for keyset pagination
+
+get_user_parcels and search_parcels page on (created_at, id). The new
+indexes are built before the ones they replace are dropped, both
+concurrently.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+NEW_INDEXES = [
+    ("ix_parcels_user_id_created_at_id", ["user_id", "created_at", "id"]),
+    ("ix_parcels_status_created_at_id", ["status", "created_at", "id"]),
+    ("ix_parcels_created_at_id", ["created_at", "id"]),
+]
+
+OLD_INDEXES = [
+    ("ix_parcels_user_id_created_at", ["user_id", "created_at"]),
+    ("ix_parcels_status_created_at", ["status", "created_at"]),
+]
+
+
+def _create(indexes):
+    for name, columns in indexes:
+        op.create_index(
+            name,
+            "parcels",
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def _drop(indexes):
+    for name, _ in indexes:
+        op.drop_index(
+            name,
+            table_name="parcels",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        _create(NEW_INDEXES)
+        _drop(OLD_INDEXES)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        _create(OLD_INDEXES)
+        _drop(NEW_INDEXES)
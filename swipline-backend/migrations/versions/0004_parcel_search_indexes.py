@@ -0,0 +1,61 @@
+"""Indexes behind parcel search (app/search.py)
+
+Expression indexes on the normalized forms the search filters compare
+against: lower(email) B-trees for exact and prefix lookups, pg_trgm GIN
+indexes for substring matches on emails, recipient name and digit-only
+phone numbers, and a text_pattern_ops index for tracking ID prefixes.
+All are built concurrently.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+PHONE_DIGITS = "regexp_replace({}, '[^0-9]', '', 'g')"
+
+INDEXES = [
+    ("ix_parcels_tracking_id_pattern", "btree", "tracking_id text_pattern_ops"),
+    ("ix_parcels_sender_email_lower", "btree", "lower(sender_email) text_pattern_ops"),
+    (
+        "ix_parcels_recipient_email_lower",
+        "btree",
+        "lower(recipient_email) text_pattern_ops",
+    ),
+    ("ix_parcels_sender_email_trgm", "gin", "lower(sender_email) gin_trgm_ops"),
+    ("ix_parcels_recipient_email_trgm", "gin", "lower(recipient_email) gin_trgm_ops"),
+    ("ix_parcels_recipient_name_trgm", "gin", "lower(recipient_name) gin_trgm_ops"),
+    (
+        "ix_parcels_sender_phone_trgm",
+        "gin",
+        PHONE_DIGITS.format("sender_phone") + " gin_trgm_ops",
+    ),
+    (
+        "ix_parcels_recipient_phone_trgm",
+        "gin",
+        PHONE_DIGITS.format("recipient_phone") + " gin_trgm_ops",
+    ),
+]
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for name, method, expression in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON parcels USING {method} ({expression})"
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
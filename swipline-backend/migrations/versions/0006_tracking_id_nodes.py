@@ -0,0 +1,31 @@
+"""Node numbers for time-ordered tracking IDs
+
+Each API process takes one value from this cycling sequence and embeds it
+in the tracking IDs it generates (see app/tracking_ids.py).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        sa.schema.CreateSequence(
+            sa.Sequence(
+                "tracking_id_nodes", start=0, minvalue=0, maxvalue=1023, cycle=True
+            )
+        )
+    )
+
+
+def downgrade():
+    op.execute(sa.schema.DropSequence(sa.Sequence("tracking_id_nodes")))
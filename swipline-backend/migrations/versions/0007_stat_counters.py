@@ -0,0 +1,42 @@
+"""Statistics counters
+
+Sharded running totals for the admin statistics endpoint, seeded here from
+the current parcels and completed payments.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stat_counters",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("shard", sa.Integer(), primary_key=True),
+        sa.Column("value", sa.BigInteger(), nullable=False),
+    )
+    op.execute(
+        """
+        INSERT INTO stat_counters (name, shard, value)
+        SELECT 'parcels', 0, count(*) FROM parcels
+        UNION ALL
+        SELECT 'parcels.status.' || status, 0, count(*)
+        FROM parcels WHERE status IS NOT NULL GROUP BY status
+        UNION ALL
+        SELECT 'revenue_cents.' || type, 0, sum(round(amount::numeric * 100))
+        FROM payments WHERE status = 'completed' GROUP BY type
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("stat_counters")
@@ -0,0 +1,117 @@
+"""Partition tracking_history by month
+
+Rebuilds tracking_history as a table range-partitioned on created_at, with
+one partition per month from the oldest row to three months ahead and a
+default partition, and adds the catalog of archived partitions (see
+app/history_archive.py). Rows are copied, so writes to tracking_history
+are blocked for the duration; column types are taken from the existing
+table, so this works before and after scripts/compact_schema.py.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _month(moment, months=0):
+    moment = moment.astimezone(timezone.utc)
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _add_keys(primary_key):
+    op.create_primary_key("tracking_history_pkey", "tracking_history", primary_key)
+    op.create_foreign_key(
+        "tracking_history_parcel_id_fkey",
+        "tracking_history",
+        "parcels",
+        ["parcel_id"],
+        ["id"],
+    )
+    op.create_index(
+        "ix_tracking_history_parcel_id_created_at",
+        "tracking_history",
+        ["parcel_id", "created_at"],
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.execute("LOCK TABLE tracking_history IN SHARE MODE")
+    op.execute(
+        "UPDATE tracking_history h SET created_at = p.created_at "
+        "FROM parcels p WHERE p.id = h.parcel_id AND h.created_at IS NULL"
+    )
+    oldest = bind.execute(
+        sa.text("SELECT min(created_at) FROM tracking_history")
+    ).scalar()
+    now = datetime.now(timezone.utc)
+
+    op.rename_table("tracking_history", "tracking_history_legacy")
+    op.execute(
+        "CREATE TABLE tracking_history "
+        "(LIKE tracking_history_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE tracking_history ALTER COLUMN created_at SET NOT NULL")
+    op.execute(
+        "CREATE TABLE tracking_history_default PARTITION OF tracking_history DEFAULT"
+    )
+    month = _month(min(oldest or now, now))
+    while month < _month(now, MONTHS_AHEAD + 1):
+        upper = _month(month, 1)
+        op.execute(
+            f"CREATE TABLE tracking_history_p{month:%Y_%m} "
+            f"PARTITION OF tracking_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("INSERT INTO tracking_history SELECT * FROM tracking_history_legacy")
+    op.drop_table("tracking_history_legacy")
+    _add_keys(["id", "created_at"])
+    op.execute("ANALYZE tracking_history")
+
+    op.create_table(
+        "tracking_history_archives",
+        sa.Column("partition", sa.String(), primary_key=True),
+        sa.Column("range_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("range_end", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("rows", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT count(*) FROM tracking_history_archives")).scalar():
+        raise RuntimeError(
+            "tracking_history has archived partitions; restore them before downgrading"
+        )
+    op.drop_table("tracking_history_archives")
+
+    op.rename_table("tracking_history", "tracking_history_partitioned")
+    op.execute(
+        "CREATE TABLE tracking_history "
+        "(LIKE tracking_history_partitioned INCLUDING DEFAULTS)"
+    )
+    op.execute(
+        "INSERT INTO tracking_history SELECT * FROM tracking_history_partitioned"
+    )
+    op.execute("DROP TABLE tracking_history_partitioned CASCADE")
+    op.execute("ALTER TABLE tracking_history ALTER COLUMN created_at DROP NOT NULL")
+    _add_keys(["id"])
@@ -0,0 +1,41 @@
+"""Index recipient names with whitespace collapsed
+
+The name search compares against lower(recipient_name) with runs of
+whitespace collapsed to one space (app/search.py name_expr), the same
+normalization as the search term. Rebuilds the trigram index on that
+expression: the new index is built concurrently under a temporary name,
+then swapped in.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_parcels_recipient_name_trgm"
+COLLAPSED = r"regexp_replace(lower(recipient_name), '[\t\n\v\f\r ]+', ' ', 'g')"
+
+
+def _rebuild(expression: str):
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX}_new")
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY {INDEX}_new "
+            f"ON parcels USING gin ({expression} gin_trgm_ops)"
+        )
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX}")
+        op.execute(f"ALTER INDEX {INDEX}_new RENAME TO {INDEX}")
+
+
+def upgrade():
+    _rebuild(COLLAPSED)
+
+
+def downgrade():
+    _rebuild("lower(recipient_name)")
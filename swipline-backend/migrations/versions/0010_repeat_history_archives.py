@@ -0,0 +1,31 @@
+"""Allow several archive files per tracking_history partition
+
+Rows of parcels still moving stay in their partition when it is archived
+and go to a further file once those parcels finish, so archive files are
+keyed by path rather than by partition.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+TABLE = "tracking_history_archives"
+
+
+def upgrade():
+    op.drop_constraint(f"{TABLE}_pkey", TABLE, type_="primary")
+    op.create_primary_key(f"{TABLE}_pkey", TABLE, ["path"])
+    op.create_index(f"ix_{TABLE}_partition", TABLE, ["partition"])
+
+
+def downgrade():
+    op.drop_index(f"ix_{TABLE}_partition", TABLE)
+    op.drop_constraint(f"{TABLE}_pkey", TABLE, type_="primary")
+    op.create_primary_key(f"{TABLE}_pkey", TABLE, ["partition"])
@@ -0,0 +1,112 @@
+"""Check that a flood of public tracking reads does not stall critical routes
+
+Against a running server, sends location updates as the suite's admin
+user (critical for scanner and admin tokens, see app/admission.py) at a
+steady pace, first alone and then while --flood clients hammer
+/api/track/{id} on random seeded parcels (see scripts.benchmark_suite
+seed). Reports the update latency of both phases and the status codes the
+flood got: 200s, 429s from the rate limits and 503s from load shedding.
+
+    DB_POOL_SIZE=2 DB_MAX_OVERFLOW=0 uvicorn app.main:app --port 8000 &
+    python -m scripts.benchmark_admission --flood 200
+
+All flood requests come from this host, so with default settings most are
+rate limited by IP; start the server with TRACK_RATE_PER_IP=0 and
+TRACK_RATE_PER_ID=0 to exercise shedding alone, and with the SHED_*
+settings at 0 as well to see the same flood without admission control.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from scripts.benchmark_suite import (
+    admin_headers,
+    percentile,
+    seeded_parcels,
+    tracking_id,
+)
+
+
+async def updates(client: httpx.AsyncClient, stop: asyncio.Event, args, rng):
+    latencies = []
+    statuses = {}
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.put(
+                f"/api/parcels/{tracking_id(rng, args.parcels)}/location",
+                json={"location": "Depot 1", "status": "in_transit"},
+                headers=args.headers,
+            )
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+        await asyncio.sleep(args.interval)
+    return latencies, statuses
+
+
+async def flood(client: httpx.AsyncClient, stop: asyncio.Event, args, rng, statuses):
+    while not stop.is_set():
+        try:
+            response = await client.get(f"/api/track/{tracking_id(rng, args.parcels)}")
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+async def phase(args, flooders: int):
+    stop = asyncio.Event()
+    flood_statuses = {}
+    limits = httpx.Limits(max_connections=flooders + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=60, limits=limits
+    ) as client:
+        updater = asyncio.create_task(
+            updates(client, stop, args, random.Random(args.seed))
+        )
+        workers = [
+            asyncio.create_task(
+                flood(client, stop, args, random.Random(args.seed + i), flood_statuses)
+            )
+            for i in range(flooders)
+        ]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        latencies, statuses = await updater
+        await asyncio.gather(*workers)
+    return latencies, statuses, flood_statuses
+
+
+def report(label: str, latencies, statuses, flood_statuses):
+    print(
+        f"{label:<14} updates p50 {statistics.median(latencies):8.2f} ms  "
+        f"p99 {percentile(latencies, 0.99):8.2f} ms  statuses {statuses}"
+    )
+    if flood_statuses:
+        print(f"{'':<14} flood statuses {flood_statuses}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--flood", type=int, default=200, help="flooding clients")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    args = parser.parse_args()
+    args.parcels = seeded_parcels()
+    args.headers = await admin_headers(args.url)
+
+    report("updates alone", *await phase(args, 0))
+    report(f"{args.flood} flooders", *await phase(args, args.flood))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""Measure how long a fresh worker takes to serve its first request
+
+Starts ``uvicorn app.main:app`` --runs times and reports the time from
+spawning the process to the first 200 from /health, plus the import time
+of app.main alone in a fresh interpreter. With DB_POOL_WARMUP unset the
+worker does not touch the database before that request, so this also
+works against an unreachable database.
+
+    python -m scripts.benchmark_cold_start --runs 10
+    DB_POOL_WARMUP=5 python -m scripts.benchmark_cold_start
+
+Pass --importtime to print the slowest modules of one import of app.main
+(python -X importtime, cumulative microseconds).
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                sys.exit(f"uvicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/health", timeout=1
+                ) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        sys.exit(f"not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_time() -> float:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time; start = time.perf_counter(); import app.main; "
+            "print(time.perf_counter() - start)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output)
+
+
+def slowest_imports(count: int):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative), name.rstrip(), int(own)))
+    for cumulative, name, own in sorted(rows, reverse=True)[:count]:
+        print(f"{cumulative / 1000:9.1f} ms  {own / 1000:7.1f} ms own  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    if args.importtime:
+        slowest_imports(25)
+        return
+
+    imports = [import_time() for _ in range(args.runs)]
+    ready = [time_to_ready(args.timeout) for _ in range(args.runs)]
+    print(f"DB_POOL_WARMUP={os.getenv('DB_POOL_WARMUP', '0')}, {args.runs} runs")
+    for label, samples in (("import app.main", imports), ("first 200", ready)):
+        print(
+            f"{label:<16} median {statistics.median(samples) * 1000:7.1f} ms  "
+            f"min {min(samples) * 1000:7.1f} ms  max {max(samples) * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Check that exports stream in constant memory
+
+Streams each export through the same generator the endpoints use, with
+growing row limits, and reports bytes sent, time and the peak Python
+heap (tracemalloc) of each run. The peak should not grow with the
+number of rows.
+
+    python -m scripts.benchmark_exports --limits 10000 100000 0
+
+A limit of 0 exports every row. Uses the database configured through the
+DB_* variables (and DB_ASYNC), and only reads from it.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app import crud, schemas
+from app.routers import exports
+
+
+async def run(kind: str, limit: int, export_format, compress: bool):
+    statement = crud.export_statement(kind)
+    if limit:
+        statement = statement.limit(limit)
+    sent = 0
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    async for chunk in exports._stream(statement, export_format, compress):
+        sent += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return sent, elapsed, peak
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limits", type=int, nargs="+", default=[10000, 100000, 0])
+    parser.add_argument(
+        "--kinds",
+        nargs="+",
+        default=list(crud.EXPORT_MODELS),
+        choices=list(crud.EXPORT_MODELS),
+    )
+    parser.add_argument(
+        "--format", default="csv", choices=[f.value for f in schemas.ExportFormat]
+    )
+    parser.add_argument("--no-gzip", action="store_true")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    export_format = schemas.ExportFormat(args.format)
+    for kind in args.kinds:
+        for limit in args.limits:
+            sent, elapsed, peak = await run(
+                kind, limit, export_format, not args.no_gzip
+            )
+            print(
+                f"{kind:<17} limit {limit or 'all':>7}  {sent / 1024 / 1024:7.1f} MiB "
+                f"in {elapsed:6.2f}s  peak heap {peak / 1024 / 1024:5.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
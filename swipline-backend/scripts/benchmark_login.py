@@ -0,0 +1,114 @@
+"""Measure login throughput and the latency it costs unrelated routes
+
+Against a running server, first samples --probe alone, then again while
+--concurrency clients log in back to back, and reports login throughput,
+rejected (503) logins and probe p50/p99 latency for both phases.
+
+    uvicorn app.main:app --port 8000 &
+    python -m scripts.benchmark_login --url http://localhost:8000
+
+The benchmark user is created directly in the database configured through
+the DB_* variables. The default probe reads a parcel seeded by
+scripts.seed_data.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app import models
+from app.database import SessionLocal
+from app.passwords import password_context
+
+EMAIL = "login-benchmark@example.com"
+PASSWORD = "login-benchmark"
+
+
+def ensure_user(email: str = EMAIL, role: str = "user"):
+    db = SessionLocal()
+    try:
+        if not db.query(models.User).filter(models.User.email == email).first():
+            db.add(
+                models.User(
+                    email=email,
+                    full_name="Login Benchmark",
+                    password=password_context().hash(PASSWORD),
+                    role=role,
+                )
+            )
+            db.commit()
+    finally:
+        db.close()
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def probe(client: httpx.AsyncClient, path: str, stop: asyncio.Event, interval):
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def login_loop(client: httpx.AsyncClient, stop: asyncio.Event, counts: dict):
+    while not stop.is_set():
+        response = await client.post(
+            "/api/auth/login", json={"email": EMAIL, "password": PASSWORD}
+        )
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+
+async def phase(args, logins: int):
+    stop = asyncio.Event()
+    counts = {}
+    limits = httpx.Limits(max_connections=logins + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=60, limits=limits
+    ) as client:
+        prober = asyncio.create_task(probe(client, args.probe, stop, args.interval))
+        workers = [
+            asyncio.create_task(login_loop(client, stop, counts)) for _ in range(logins)
+        ]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        latencies = await prober
+        await asyncio.gather(*workers)
+    return latencies, counts
+
+
+def report(label: str, latencies, counts, duration: float):
+    ok = counts.get(200, 0)
+    print(
+        f"{label:<16} probe p50 {statistics.median(latencies):8.2f} ms  "
+        f"p99 {percentile(latencies, 0.99):8.2f} ms  "
+        f"logins {ok / duration:7.1f}/s  rejected {counts.get(503, 0)}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--probe", default="/api/parcels/SEED0000000042")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    ensure_user()
+
+    latencies, counts = await phase(args, 0)
+    report("idle", latencies, counts, args.duration)
+    latencies, counts = await phase(args, args.concurrency)
+    report(f"{args.concurrency} logins", latencies, counts, args.duration)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Compare parcel search latency against the old leading-wildcard ILIKE filters
+
+Seeds the database configured through the DB_* variables (see
+seed_data) up to --parcels parcels, then times each search both
+through crud.search_parcels and through the ILIKE '%term%' filters it
+replaced, reporting median and p95 latency in milliseconds.
+
+    python -m scripts.benchmark_search --parcels 3000000
+
+Run `alembic upgrade head` first so the search indexes exist.
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import or_
+
+from app import crud, models
+from app.database import SessionLocal
+from scripts.seed_data import seed
+
+SEARCHES = {
+    "tracking_id prefix": {"tracking_id": "SEED00001234"},
+    "tracking_id exact": {"tracking_id": "SEED0000123456"},
+    "email exact": {"email": "recipient123456@example.com"},
+    "email substring": {"email": "sender12345"},
+    "recipient name": {"name": "recipient 123456"},
+    "phone": {"phone": "0123456"},
+}
+
+
+def legacy_search(db, tracking_id=None, email=None, name=None, phone=None):
+    """The unindexable filters search_parcels used before"""
+    query = db.query(models.Parcel)
+    if tracking_id:
+        query = query.filter(models.Parcel.tracking_id.ilike(f"%{tracking_id}%"))
+    if email:
+        query = query.filter(
+            or_(
+                models.Parcel.sender_email.ilike(f"%{email}%"),
+                models.Parcel.recipient_email.ilike(f"%{email}%"),
+            )
+        )
+    if name:
+        query = query.filter(models.Parcel.recipient_name.ilike(f"%{name}%"))
+    if phone:
+        query = query.filter(
+            or_(
+                models.Parcel.sender_phone.ilike(f"%{phone}%"),
+                models.Parcel.recipient_phone.ilike(f"%{phone}%"),
+            )
+        )
+    return (
+        query.order_by(models.Parcel.created_at.desc(), models.Parcel.id.desc())
+        .limit(100)
+        .all()
+    )
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            rows = fn(db)
+            timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return len(rows), statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parcels", type=int, default=3000000)
+    parser.add_argument("--depth", type=int, default=0, help="history rows per parcel")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.parcels, args.depth)
+
+    print(f"{'search':<20} {'rows':>5} {'indexed p50/p95':>18} {'ILIKE p50/p95':>20}")
+    for name, params in SEARCHES.items():
+        rows, p50, p95 = timed(
+            lambda db: crud.search_parcels(db, **params), args.repeat
+        )
+        _, old_p50, old_p95 = timed(lambda db: legacy_search(db, **params), args.repeat)
+        print(
+            f"{name:<20} {rows:>5} {p50:>8.2f} / {p95:>7.2f} "
+            f"{old_p50:>9.2f} / {old_p95:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
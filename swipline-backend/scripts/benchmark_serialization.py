@@ -0,0 +1,155 @@
+"""Compare the per-response cost of FastAPI's encoding with app.serialization
+
+For a parcel and for tracking responses with growing histories, times
+what FastAPI does with a route's return value (validate against the
+response_model, jsonable_encoder, json.dumps) against the fast path
+(build the dict, orjson), and against a cache hit of the tracking cache,
+which sends bytes encoded earlier. Also checks that both bodies decode to
+the same JSON.
+
+    python -m scripts.benchmark_serialization --histories 10 100 500
+
+Needs no database: the rows are built in memory.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app import serialization
+from app.main import app
+
+NOW = datetime(2026, 10, 17, 9, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def make_parcel():
+    return SimpleNamespace(
+        id=str(uuid.uuid4()),
+        tracking_id="SWP1234567890",
+        sender_name="Ada Sender",
+        sender_email="ada@example.com",
+        sender_phone="+44 20 7946 0000",
+        recipient_name="Bob Recipient",
+        recipient_email="bob@example.com",
+        recipient_phone="+1 212 555 0100",
+        recipient_address="1 Main Street, Springfield",
+        destination_country="US",
+        weight=2.5,
+        dimensions={"length": 30, "width": 20, "height": 15, "unit": "cm"},
+        status="in_transit",
+        current_location="Hub 4",
+        coordinates={"lat": 51.5072, "lng": -0.1276},
+        shipping_cost=42.5,
+        border_fee=12.0,
+        border_fee_paid=True,
+        estimated_delivery=NOW + timedelta(days=3),
+        actual_delivery=None,
+        created_at=NOW,
+        updated_at=NOW,
+    )
+
+
+def make_tracking(history: int) -> dict:
+    return {
+        "tracking_id": "SWP1234567890",
+        "status": "in_transit",
+        "current_location": "Hub 4",
+        "coordinates": {"lat": 51.5072, "lng": -0.1276},
+        "border_fee": 12.0,
+        "border_fee_paid": True,
+        "estimated_delivery": NOW + timedelta(days=3),
+        "history": [
+            {
+                "id": str(uuid.uuid4()),
+                "status": "in_transit",
+                "location": f"Hub {i}",
+                "description": f"Arrived at hub {i}",
+                "coordinates": {"lat": 51.0 + i / 1000, "lng": -0.1},
+                "created_at": NOW + timedelta(minutes=i),
+            }
+            for i in range(history)
+        ],
+    }
+
+
+def response_field(path: str):
+    for route in app.routes:
+        if getattr(route, "path", None) == path:
+            return route.response_field
+    raise LookupError(path)
+
+
+async def fastapi_body(field, content) -> bytes:
+    return JSONResponse(
+        await serialize_response(field=field, response_content=content)
+    ).body
+
+
+def per_call(fn, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+async def per_call_async(make, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await make()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--histories", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    parcel_field = response_field("/api/parcels/{tracking_id}")
+    tracking_field = response_field("/api/track/{tracking_id}")
+
+    cases = [("parcel", make_parcel(), parcel_field, serialization.encode_parcel)]
+    for history in args.histories:
+        cases.append(
+            (
+                f"tracking, {history} rows",
+                make_tracking(history),
+                tracking_field,
+                serialization.encode_tracking,
+            )
+        )
+
+    print(
+        f"{'response':<22}{'fastapi':>12}{'fast path':>12}{'cached':>12}{'speedup':>9}"
+    )
+    for label, content, field, encode in cases:
+        old = await fastapi_body(field, content)
+        new = serialization.ORJSONResponse(encode(content)).body
+        if json.loads(old) != json.loads(new):
+            raise SystemExit(f"{label}: bodies differ\n{old[:300]}\n{new[:300]}")
+
+        old_cost = await per_call_async(
+            lambda: fastapi_body(field, content), args.seconds
+        )
+        new_cost = per_call(
+            lambda: serialization.ORJSONResponse(encode(content)), args.seconds
+        )
+        cached_cost = per_call(lambda: serialization.ORJSONResponse(new), args.seconds)
+        print(
+            f"{label:<22}{old_cost * 1e6:>10.1f}us{new_cost * 1e6:>10.1f}us"
+            f"{cached_cost * 1e6:>10.1f}us{old_cost / new_cost:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
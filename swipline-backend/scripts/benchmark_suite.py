@@ -0,0 +1,441 @@
+"""Load scenarios against a running server, with machine-readable results
+
+Seeds the database configured through the DB_* variables with the
+synthetic dataset of scripts.seed_data (--parcels parcels, each
+with --depth tracking history rows, plus users and payments), then drives
+a running server with closed-loop clients and records, per scenario, the
+throughput, the status codes and p50/p95/p99 latency:
+
+    track          GET /api/track/{id} on random seeded parcels
+    parcel         GET /api/parcels/{id} on random seeded parcels
+    create         POST /api/parcels/
+    locations      POST /api/parcels/locations/bulk, --burst updates each
+    search         GET /api/parcels/search by name, email, phone or prefix,
+                   as an admin user the suite creates
+    login          POST /api/auth/login
+    websocket      --subscribers sockets on a few parcels; latency is from
+                   sending a location update to each subscriber receiving it
+
+    python -m scripts.benchmark_suite seed --parcels 2000000 --depth 8
+    uvicorn app.main:app --port 8000 --workers 4 &
+    python -m scripts.benchmark_suite run --output before.json
+    python -m scripts.benchmark_suite run --output after.json
+    python -m scripts.benchmark_suite compare before.json after.json
+
+Results are JSON: the run's settings, git commit and dataset size, then
+one object per scenario. Writing scenarios (create, locations, websocket)
+change seeded parcels, so point it at a disposable database. The client
+is a single process; on small machines give the server most of the CPUs
+and check the client is not the bottleneck (raise --concurrency until
+throughput stops growing).
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import websockets
+from sqlalchemy import text
+
+from app.database import engine
+from scripts import benchmark_login, seed_data
+
+SCENARIOS = ["track", "parcel", "create", "locations", "search", "login", "websocket"]
+ADMIN_EMAIL = "suite-admin@example.com"
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seeded_parcels() -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT count(*) FROM parcels WHERE tracking_id LIKE 'SEED%'")
+        ).scalar()
+
+
+def dataset() -> dict:
+    """Approximate row counts of the main tables"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT relname, reltuples::bigint FROM pg_class "
+                "WHERE relname IN ('users', 'parcels', 'payments') "
+                "OR relname LIKE 'tracking_history_%' AND relkind = 'r'"
+            )
+        ).all()
+    counts = {"tracking_history": 0}
+    for name, count in rows:
+        if name.startswith("tracking_history_"):
+            counts["tracking_history"] += max(count, 0)
+        else:
+            counts[name] = max(count, 0)
+    counts["seeded_parcels"] = seeded_parcels()
+    return counts
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def tracking_id(rng: random.Random, parcels: int) -> str:
+    return f"SEED{rng.randint(1, parcels):010d}"
+
+
+def new_parcel(rng: random.Random) -> dict:
+    n = rng.randrange(10**7)
+    return {
+        "sender_name": f"Bench Sender {n}",
+        "sender_email": f"bench-sender{n}@example.com",
+        "sender_phone": f"+1 555 {n:07d}",
+        "recipient_name": f"Bench Recipient {n}",
+        "recipient_email": f"bench-recipient{n}@example.com",
+        "recipient_phone": f"+44 20 {n:07d}",
+        "recipient_address": f"{n} Benchmark Road",
+        "destination_country": rng.choice(["US", "UK", "CA", "AU", "EU"]),
+        "weight": round(rng.uniform(0.1, 30), 2),
+        "dimensions": {"length": 30, "width": 20, "height": 15, "unit": "cm"},
+    }
+
+
+def location_burst(rng: random.Random, parcels: int, size: int) -> list:
+    return [
+        {
+            "tracking_id": tracking_id(rng, parcels),
+            "location": f"Depot {rng.randrange(500)}",
+            "status": "in_transit",
+            "description": "Benchmark scan",
+        }
+        for _ in range(size)
+    ]
+
+
+def search_params(rng: random.Random, parcels: int) -> dict:
+    g = rng.randint(1, parcels)
+    kind = rng.choice(["name", "email", "phone", "tracking_id"])
+    if kind == "name":
+        return {"name": f"Recipient {g}", "limit": 20}
+    if kind == "email":
+        return {"email": f"sender{g}@example.com", "limit": 20}
+    if kind == "phone":
+        return {"phone": f"{g:07d}", "limit": 20}
+    return {"tracking_id": f"SEED{g:010d}"[:-2], "limit": 20}
+
+
+def request_for(scenario: str, rng: random.Random, args):
+    """(method, path, httpx keyword arguments) of one request"""
+    if scenario == "track":
+        return "GET", f"/api/track/{tracking_id(rng, args.parcels)}", {}
+    if scenario == "parcel":
+        return "GET", f"/api/parcels/{tracking_id(rng, args.parcels)}", {}
+    if scenario == "create":
+        return "POST", "/api/parcels/", {"json": new_parcel(rng)}
+    if scenario == "locations":
+        burst = location_burst(rng, args.parcels, args.burst)
+        return "POST", "/api/parcels/locations/bulk", {"json": burst}
+    if scenario == "search":
+        return (
+            "GET",
+            "/api/parcels/search",
+            {
+                "params": search_params(rng, args.parcels),
+                "headers": args.admin_headers,
+            },
+        )
+    if scenario == "login":
+        credentials = {
+            "email": benchmark_login.EMAIL,
+            "password": benchmark_login.PASSWORD,
+        }
+        return "POST", "/api/auth/login", {"json": credentials}
+    raise ValueError(scenario)
+
+
+def summarize(scenario: str, latencies, statuses: dict, elapsed: float, **extra):
+    ok = sum(count for status, count in statuses.items() if str(status)[0] in "23")
+    result = {
+        "scenario": scenario,
+        "requests": sum(statuses.values()),
+        "ok": ok,
+        "statuses": dict(
+            sorted((str(status), count) for status, count in statuses.items())
+        ),
+        "duration_s": round(elapsed, 3),
+        "throughput_per_s": round(ok / elapsed, 2) if elapsed else 0,
+        **extra,
+    }
+    if latencies:
+        result["latency_ms"] = {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        }
+    return result
+
+
+async def closed_loop(scenario: str, args) -> dict:
+    """--concurrency clients send requests back to back for --duration"""
+    latencies = []
+    statuses = {}
+    recording = False
+
+    async def client_loop(client: httpx.AsyncClient, rng: random.Random, deadline):
+        while time.perf_counter() < deadline:
+            method, path, options = request_for(scenario, rng, args)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **options)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latency = (time.perf_counter() - start) * 1000
+            if recording:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        rngs = [random.Random(args.seed + i) for i in range(args.concurrency)]
+        if args.warmup:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(client_loop(client, rng, deadline) for rng in rngs))
+        recording = True
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(client_loop(client, rng, deadline) for rng in rngs))
+        elapsed = time.perf_counter() - start
+
+    extra = {"concurrency": args.concurrency}
+    if scenario == "locations":
+        extra["burst"] = args.burst
+        extra["updates_per_s"] = round(
+            statuses.get(200, 0) * args.burst / elapsed if elapsed else 0, 2
+        )
+    return summarize(scenario, latencies, statuses, elapsed, **extra)
+
+
+async def websocket_fanout(args) -> dict:
+    """Updates a few parcels and times delivery to every subscriber"""
+    rng = random.Random(args.seed)
+    parcels = [
+        f"SEED{g:010d}"
+        for g in rng.sample(
+            range(1, args.parcels + 1), min(args.ws_parcels, args.parcels)
+        )
+    ]
+    topics = [parcels[i % len(parcels)] for i in range(args.subscribers)]
+    ws_url = args.url.replace("http", "ws", 1)
+    sent = {}
+    latencies = []
+    statuses = {}
+    expected = 0
+
+    async def subscriber(socket):
+        async for message in socket:
+            received = time.perf_counter()
+            try:
+                description = json.loads(message).get("description")
+            except (ValueError, AttributeError):
+                continue
+            if description in sent:
+                latencies.append((received - sent[description]) * 1000)
+
+    sockets = [await websockets.connect(f"{ws_url}/api/track/ws/{t}") for t in topics]
+    readers = [asyncio.create_task(subscriber(socket)) for socket in sockets]
+    # Give every worker's hub time to register its subscribers
+    await asyncio.sleep(1)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        n = 0
+        while time.perf_counter() - start < args.duration:
+            for parcel in parcels:
+                n += 1
+                description = f"Benchmark fan-out {n}"
+                sent[description] = time.perf_counter()
+                response = await client.put(
+                    f"/api/parcels/{parcel}/location",
+                    json={
+                        "location": f"Depot {n % 500}",
+                        "status": "in_transit",
+                        "description": description,
+                    },
+                )
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+                if response.status_code == 200:
+                    expected += topics.count(parcel)
+            await asyncio.sleep(args.ws_interval)
+    await asyncio.sleep(1)  # Let the last messages arrive
+    elapsed = time.perf_counter() - start
+    for socket in sockets:
+        await socket.close()
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    result = summarize(
+        "websocket",
+        latencies,
+        statuses,
+        elapsed,
+        subscribers=args.subscribers,
+        parcels=len(parcels),
+        delivered=len(latencies),
+        expected_deliveries=expected,
+    )
+    result["deliveries_per_s"] = round(len(latencies) / elapsed, 2)
+    return result
+
+
+async def admin_headers(url: str) -> dict:
+    """Log in as the suite's admin user, creating it if needed"""
+    benchmark_login.ensure_user(ADMIN_EMAIL, role="admin")
+    async with httpx.AsyncClient(base_url=url) as client:
+        response = await client.post(
+            "/api/auth/login",
+            json={"email": ADMIN_EMAIL, "password": benchmark_login.PASSWORD},
+        )
+        response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run(args):
+    args.parcels = args.parcels or seeded_parcels()
+    if not args.parcels:
+        sys.exit("No seeded parcels; run the seed command first")
+    if "login" in args.scenarios:
+        benchmark_login.ensure_user()
+    if "search" in args.scenarios:
+        args.admin_headers = await admin_headers(args.url)
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "url": args.url,
+        "python": platform.python_version(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+        },
+        "dataset": dataset(),
+        "scenarios": {},
+    }
+    for scenario in args.scenarios:
+        if scenario == "websocket":
+            result = await websocket_fanout(args)
+        else:
+            result = await closed_loop(scenario, args)
+        report["scenarios"][scenario] = result
+        print_result(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+def print_result(result: dict):
+    latency = result.get("latency_ms", {})
+    errors = result["requests"] - result["ok"]
+    print(
+        f"{result['scenario']:<10} {result['throughput_per_s']:9.1f}/s  "
+        f"p50 {latency.get('p50', 0):8.2f}  p95 {latency.get('p95', 0):8.2f}  "
+        f"p99 {latency.get('p99', 0):8.2f} ms  errors {errors}"
+    )
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['git_commit']} -> {after['git_commit']}")
+
+    def change(old, new):
+        return f"{(new - old) / old * 100:+7.1f}%" if old else "      -"
+
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if not old:
+            continue
+        line = (
+            f"{name:<10} throughput {old['throughput_per_s']:9.1f} -> "
+            f"{new['throughput_per_s']:9.1f}/s "
+            f"{change(old['throughput_per_s'], new['throughput_per_s'])}"
+        )
+        for key in ("p50", "p99"):
+            a = old.get("latency_ms", {}).get(key, 0)
+            b = new.get("latency_ms", {}).get(key, 0)
+            line += f"  {key} {a:7.2f} -> {b:7.2f} ms {change(a, b)}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed = commands.add_parser("seed", help="seed the synthetic dataset")
+    seed.add_argument("--parcels", type=int, default=1_000_000)
+    seed.add_argument("--depth", type=int, default=8, help="history rows per parcel")
+
+    load = commands.add_parser("run", help="run scenarios against --url")
+    load.add_argument("--url", default="http://localhost:8000")
+    load.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--duration", type=float, default=20)
+    load.add_argument("--warmup", type=float, default=3)
+    load.add_argument("--timeout", type=float, default=30)
+    load.add_argument("--seed", type=int, default=1, help="random seed")
+    load.add_argument(
+        "--parcels",
+        type=int,
+        default=0,
+        help="seeded parcels to draw from (default: all)",
+    )
+    load.add_argument("--burst", type=int, default=100, help="updates per bulk call")
+    load.add_argument("--subscribers", type=int, default=200)
+    load.add_argument("--ws-parcels", type=int, default=10)
+    load.add_argument("--ws-interval", type=float, default=0.05)
+    load.add_argument("--output", help="write the results as JSON")
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("before")
+    diff.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed_data.seed(args.parcels, args.depth)
+        benchmark_login.ensure_user()
+        print(json.dumps(dataset()))
+    elif args.command == "run":
+        asyncio.run(run(args))
+    else:
+        compare(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare the time-ordered tracking ID generator with the old random scheme
+
+Reports generation throughput for both, then inserts --rows IDs of each
+kind into scratch tables with a unique index (as parcels.tracking_id has)
+and reports insert time and the resulting index size: random IDs split
+pages all over the index and leave them half full, ordered IDs append to
+its right edge.
+
+    python -m scripts.benchmark_tracking_ids --rows 500000
+
+Uses the database configured through the DB_* variables; the scratch
+tables are temporary.
+"""
+import argparse
+import datetime
+import random
+import string
+import time
+
+from sqlalchemy import text
+
+from app import tracking_ids
+from app.database import engine
+
+
+def legacy_tracking_id():
+    """The previous generator: date prefix plus 8 random characters"""
+    random_part = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    date_part = datetime.datetime.now().strftime("%y%m%d")
+    return f"SWP{date_part}{random_part}"
+
+
+def throughput(label: str, generate, count: int):
+    start = time.perf_counter()
+    ids = generate(count)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22} {count / elapsed:>12,.0f} ids/s  "
+        f"{elapsed / count * 1e6:6.2f} us/id  unique={len(set(ids)) == count}"
+    )
+    return ids
+
+
+def insert_locality(connection, label: str, ids: list, batch_size: int):
+    table = f"tracking_id_bench_{label}"
+    connection.execute(
+        text(f"CREATE TEMP TABLE {table} (tracking_id varchar UNIQUE NOT NULL)")
+    )
+    start = time.perf_counter()
+    for offset in range(0, len(ids), batch_size):
+        connection.execute(
+            text(f"INSERT INTO {table} SELECT unnest(CAST(:ids AS text[]))"),
+            {"ids": ids[offset : offset + batch_size]},
+        )
+    elapsed = time.perf_counter() - start
+    index_bytes = connection.execute(
+        text(f"SELECT pg_relation_size('{table}_tracking_id_key')")
+    ).scalar()
+    print(
+        f"{label:<22} {len(ids) / elapsed:>12,.0f} rows/s  "
+        f"index {index_bytes / 1024 / 1024:7.1f} MiB  "
+        f"({index_bytes / len(ids):.1f} B/row)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Generation")
+    legacy = throughput(
+        "random (old)",
+        lambda count: [legacy_tracking_id() for _ in range(count)],
+        args.rows,
+    )
+    throughput(
+        "ordered, one at a time",
+        lambda count: [tracking_ids.generate() for _ in range(count)],
+        args.rows,
+    )
+    ordered = throughput("ordered, batched", tracking_ids.generate.many, args.rows)
+
+    print(f"\nInserts in batches of {args.batch_size}")
+    with engine.connect() as connection:
+        insert_locality(connection, "random", legacy, args.batch_size)
+        insert_locality(connection, "ordered", ordered, args.batch_size)
+        connection.rollback()
+
+
+if __name__ == "__main__":
+    main()
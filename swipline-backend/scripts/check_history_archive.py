@@ -0,0 +1,183 @@
+"""Archive an old tracking_history partition and check nothing is lost
+
+Seeds --parcels parcels with --depth history rows each in a month two
+years back (every fourth one still in transit, the rest delivered),
+creates that month's partition, runs the maintenance job and then checks
+that get_tracking_entry returns every row of every parcel in order, and
+that the rows of parcels still in transit stayed in the database. Then
+delivers those parcels, runs the job again and checks that their rows went
+to a second file and the emptied partition was dropped. Prints the
+partition and archive sizes and the latency of archived lookups.
+
+    TRACKING_ARCHIVE_DIR=/tmp/archive python -m scripts.check_history_archive
+
+Point it at a disposable local Postgres: seeded rows are committed (and
+replaced on the next run).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app import crud, history_archive
+from app.database import SessionLocal, engine
+
+# Leftovers of a previous run
+CLEANUP_SQL = [
+    """
+    DELETE FROM tracking_history WHERE parcel_id IN
+        (SELECT id FROM parcels WHERE tracking_id LIKE 'ARCH%')
+    """,
+    "DELETE FROM parcels WHERE tracking_id LIKE 'ARCH%'",
+    "DELETE FROM tracking_history_archives WHERE partition = :name",
+]
+
+DELIVER_SQL = (
+    "UPDATE parcels SET status = 'delivered' "
+    "WHERE tracking_id LIKE 'ARCH%' AND status = 'in_transit'"
+)
+
+SEED_SQL = [
+    """
+    INSERT INTO parcels (
+        id, tracking_id, sender_name, sender_email, sender_phone,
+        recipient_name, recipient_email, recipient_phone, recipient_address,
+        destination_country, weight, dimensions, status, current_location,
+        shipping_cost, border_fee, border_fee_paid, created_at
+    )
+    SELECT md5('archive-parcel-' || g)::uuid, 'ARCH' || lpad(g::text, 10, '0'),
+           'Sender ' || g, 'sender' || g || '@example.com', '555-0000',
+           'Recipient ' || g, 'recipient' || g || '@example.com', '555-0001',
+           g || ' Archive Road', 'UK', 2,
+           '{"length": 30, "width": 20, "height": 15, "unit": "cm"}',
+           CASE WHEN g % 4 = 0 THEN 'in_transit' ELSE 'delivered' END,
+           'Warehouse - Origin', 12, 20, true,
+           CAST(:month AS timestamptz) + (g || ' seconds')::interval
+    FROM generate_series(1, :parcels) AS g
+    """,
+    """
+    INSERT INTO tracking_history (id, parcel_id, status, location, description, created_at)
+    SELECT md5('archive-history-' || g || '-' || d)::uuid,
+           md5('archive-parcel-' || g)::uuid, 'in_transit', 'Hub ' || d,
+           'Archived step ' || d,
+           CAST(:month AS timestamptz) + (g || ' seconds')::interval
+               + (d || ' hours')::interval
+    FROM generate_series(1, :parcels) AS g, generate_series(1, :depth) AS d
+    """,
+]
+
+
+def relation_size(name: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            text(
+                "SELECT coalesce(sum(pg_total_relation_size(relid)), 0) "
+                "FROM pg_partition_tree(CAST(:name AS regclass))"
+            ),
+            {"name": name},
+        ).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parcels", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=5, help="history rows per parcel")
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    month = history_archive.month_start(datetime.now(timezone.utc), -24)
+    name = history_archive.partition_name(month)
+    with engine.begin() as conn:
+        for sql in CLEANUP_SQL:
+            conn.execute(text(sql), {"name": name})
+        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        params = {"month": month, "parcels": args.parcels, "depth": args.depth}
+        for sql in SEED_SQL:
+            conn.execute(text(sql), params)
+
+    db = SessionLocal()
+    try:
+        history_archive.create_partition(db, month)
+        db.commit()
+        partition_bytes = relation_size(name)
+
+        start = time.perf_counter()
+        result = history_archive.maintain_tracking_history(db)
+        elapsed = time.perf_counter() - start
+        print(f"maintenance: {result} in {elapsed:.2f}s")
+        path = os.path.join(history_archive.TRACKING_ARCHIVE_DIR, f"{name}.jsonl.gz")
+        archive_bytes = os.path.getsize(path)
+        print(
+            f"{name}: {partition_bytes / 1024 / 1024:.1f} MiB in Postgres, "
+            f"{archive_bytes / 1024 / 1024:.1f} MiB archived"
+        )
+
+        failures = 0
+        latencies = []
+        for g in range(1, args.parcels + 1):
+            crud.tracking_cache.clear()
+            start = time.perf_counter()
+            entry = crud.get_tracking_entry(db, f"ARCH{g:010d}")
+            latencies.append(time.perf_counter() - start)
+            steps = [h["description"] for h in entry.data["history"]]
+            expected = [f"Archived step {d}" for d in range(1, args.depth + 1)]
+            if steps != expected:
+                failures += 1
+                print(f"ARCH{g:010d}: expected {expected}, got {steps}")
+            if g >= args.samples and not failures:
+                break
+        db.rollback()
+
+        in_database = db.execute(
+            text(
+                "SELECT count(*) FROM tracking_history h "
+                "JOIN parcels p ON p.id = h.parcel_id "
+                "WHERE p.tracking_id LIKE 'ARCH%' AND p.status = 'in_transit'"
+            )
+        ).scalar()
+    finally:
+        db.close()
+
+    expected_in_database = args.parcels // 4 * args.depth
+    if in_database != expected_in_database:
+        failures += 1
+        print(
+            f"in-transit rows in database: {in_database}, expected {expected_in_database}"
+        )
+
+    with engine.begin() as conn:
+        conn.execute(text(DELIVER_SQL))
+    db = SessionLocal()
+    try:
+        result = history_archive.maintain_tracking_history(db)
+        print(f"maintenance after delivery: {result}")
+        if db.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+            failures += 1
+            print(f"{name} still exists after its last rows were archived")
+        for g in range(4, args.parcels + 1, 4)[: args.samples]:
+            crud.tracking_cache.clear()
+            entry = crud.get_tracking_entry(db, f"ARCH{g:010d}")
+            if len(entry.data["history"]) != args.depth:
+                failures += 1
+                print(f"ARCH{g:010d}: {len(entry.data['history'])} rows after delivery")
+        db.rollback()
+    finally:
+        db.close()
+
+    latencies.sort()
+    print(
+        f"get_tracking_entry over {len(latencies)} parcels: "
+        f"median {statistics.median(latencies) * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+    )
+    if failures:
+        sys.exit(f"{failures} failures")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
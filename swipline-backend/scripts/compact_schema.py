@@ -0,0 +1,528 @@
+"""Convert keys, money and JSON columns to native types without downtime
+
+Moves the database to the column types the app uses with
+DB_COMPACT_TYPES=true: uuid keys instead of 36-character strings,
+numeric(12,2) amounts instead of floats and jsonb documents instead of
+json. Each column gets a shadow column kept in sync by a trigger, is
+backfilled in small batches and indexed concurrently; the swap itself
+only renames and drops under a short lock.
+
+    python -m scripts.compact_schema measure --output before.json
+    python -m scripts.compact_schema prepare     # shadow columns + triggers
+    python -m scripts.compact_schema backfill    # batched, resumable
+    python -m scripts.compact_schema index       # indexes, NOT NULL, FKs
+    python -m scripts.compact_schema swap        # then deploy DB_COMPACT_TYPES=true
+    python -m scripts.compact_schema measure --compare before.json
+
+Every step can be re-run. Keys that are not UUIDs stop ``prepare`` unless
+--remap-legacy-ids is given, which maps them to md5(key)::uuid (the same
+for primary and foreign keys). Dropped columns still occupy the old rows
+until they are rewritten; run pg_repack (or VACUUM FULL in a maintenance
+window) afterwards to reclaim that space in the tables themselves. Run
+it before migration 0008, which partitions tracking_history.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from sqlalchemy import exc, text
+
+from app.database import engine
+
+UUID_PATTERN = "^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+SHADOW = "__new"
+
+# Target type and conversion of each kind of column
+KINDS = {
+    "uuid": ("uuid", "{col}::uuid"),
+    "money": ("numeric(12,2)", "round({col}::numeric, 2)"),
+    "jsonb": ("jsonb", "{col}::jsonb"),
+}
+REMAPPED_UUID = (
+    "CASE WHEN {col} ~* '" + UUID_PATTERN + "' THEN {col}::uuid "
+    "ELSE md5({col})::uuid END"
+)
+
+# Parents before children, so swaps and FK checks happen in a fixed order
+CONVERSIONS = {
+    "users": {"id": "uuid"},
+    "parcels": {
+        "id": "uuid",
+        "user_id": "uuid",
+        "dimensions": "jsonb",
+        "coordinates": "jsonb",
+        "shipping_cost": "money",
+        "border_fee": "money",
+    },
+    "tracking_history": {"id": "uuid", "parcel_id": "uuid", "coordinates": "jsonb"},
+    "payments": {
+        "id": "uuid",
+        "parcel_id": "uuid",
+        "amount": "money",
+        "payment_details": "jsonb",
+    },
+    "webhook_events": {"payload": "jsonb"},
+}
+
+LOCK_TIMEOUT = "2s"
+LOCK_RETRIES = 30
+
+
+def _autocommit():
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _scalar(conn, sql: str, **params):
+    return conn.execute(text(sql), params).scalar()
+
+
+def _column_types(conn, table: str) -> dict:
+    rows = conn.execute(
+        text(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = :table"
+        ),
+        {"table": table},
+    )
+    return dict(rows.all())
+
+
+def _not_null_columns(conn, table: str) -> set:
+    rows = conn.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = :table "
+            "AND is_nullable = 'NO'"
+        ),
+        {"table": table},
+    )
+    return set(rows.scalars())
+
+
+def _is_converted(conn, table: str) -> bool:
+    columns = _column_types(conn, table)
+    return all(
+        columns.get(column, "").startswith(KINDS[kind][0].split("(")[0])
+        for column, kind in CONVERSIONS[table].items()
+    ) and not any(name.endswith(SHADOW) for name in columns)
+
+
+def _indexes(conn, table: str) -> list:
+    """(name, unique, primary, columns) of plain indexes on converted columns"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT i.relname, x.indisunique, x.indisprimary,
+                   array_agg(a.attname ORDER BY k.ord)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord) ON true
+            JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+            WHERE x.indrelid = CAST(:table AS regclass)
+              AND x.indexprs IS NULL AND x.indpred IS NULL
+            GROUP BY i.relname, x.indisunique, x.indisprimary
+            """
+        ),
+        {"table": table},
+    ).all()
+    converted = set(CONVERSIONS[table])
+    return [
+        (name, unique, primary, columns)
+        for name, unique, primary, columns in rows
+        if not name.endswith(SHADOW) and converted & set(columns)
+    ]
+
+
+def _foreign_keys(conn) -> list:
+    """(name, table, column, parent table, parent column) between converted keys"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.conname, c.conrelid::regclass::text, a.attname,
+                   c.confrelid::regclass::text, af.attname
+            FROM pg_constraint c
+            JOIN pg_attribute a
+              ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+            JOIN pg_attribute af
+              ON af.attrelid = c.confrelid AND af.attnum = c.confkey[1]
+            WHERE c.contype = 'f' AND cardinality(c.conkey) = 1
+              AND c.connamespace = 'public'::regnamespace
+            """
+        )
+    ).all()
+    return [
+        row
+        for row in rows
+        if not row[0].endswith(SHADOW)
+        and row[2] in CONVERSIONS.get(row[1], {})
+        and row[4] in CONVERSIONS.get(row[3], {})
+    ]
+
+
+def _with_lock_retries(statements: list):
+    """Run statements in one transaction that gives up quickly on locks"""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                for statement in statements:
+                    conn.execute(text(statement))
+            return
+        except exc.OperationalError as e:
+            if getattr(e.orig, "pgcode", None) != "55P03":
+                raise
+            print(f"  lock not available, retrying ({attempt + 1}/{LOCK_RETRIES})")
+            time.sleep(1)
+    raise SystemExit("Gave up waiting for locks")
+
+
+def _conversion(column: str, kind: str, remap: bool, source: str = "") -> str:
+    template = REMAPPED_UUID if kind == "uuid" and remap else KINDS[kind][1]
+    return template.replace("{col}", source + column)
+
+
+def prepare(args):
+    with engine.connect() as conn:
+        for table, columns in CONVERSIONS.items():
+            if _is_converted(conn, table):
+                print(f"{table}: already converted")
+                continue
+            # Indexes cannot be built concurrently on a partitioned table
+            if (
+                _scalar(
+                    conn,
+                    f"SELECT relkind FROM pg_class WHERE oid = '{table}'::regclass",
+                )
+                == "p"
+            ):
+                raise SystemExit(
+                    f"{table} is partitioned; convert it before running "
+                    "migration 0008 (alembic upgrade 0007 first)"
+                )
+            for column, kind in columns.items():
+                if kind != "uuid":
+                    continue
+                legacy = _scalar(
+                    conn,
+                    f"SELECT count(*) FROM {table} WHERE {column} !~* :pattern",
+                    pattern=UUID_PATTERN,
+                )
+                conn.rollback()
+                if legacy and not args.remap_legacy_ids:
+                    raise SystemExit(
+                        f"{table}.{column} has {legacy} non-UUID keys; "
+                        "rerun with --remap-legacy-ids to map them to md5(key)"
+                    )
+
+            function = f"compact_{table}"
+            assignments = "".join(
+                f"NEW.{column}{SHADOW} := "
+                f"{_conversion(column, kind, args.remap_legacy_ids, 'NEW.')}; "
+                for column, kind in columns.items()
+            )
+            _with_lock_retries(
+                [
+                    f"ALTER TABLE {table} "
+                    + ", ".join(
+                        f"ADD COLUMN IF NOT EXISTS {column}{SHADOW} {KINDS[kind][0]}"
+                        for column, kind in columns.items()
+                    ),
+                    f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger "
+                    f"LANGUAGE plpgsql AS $$ BEGIN {assignments}RETURN NEW; END $$",
+                    f"DROP TRIGGER IF EXISTS {function} ON {table}",
+                    f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE OF "
+                    f"{', '.join(columns)} ON {table} "
+                    f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+                ],
+            )
+            print(f"{table}: shadow columns and trigger in place")
+
+
+def backfill(args):
+    with _autocommit() as conn:
+        for table, columns in CONVERSIONS.items():
+            if _is_converted(conn, table):
+                print(f"{table}: already converted")
+                continue
+            # Touching a source column fires the sync trigger, so the
+            # conversion (and any remapping chosen in prepare) lives there
+            touch = next(iter(columns))
+            statement = text(
+                f"""
+                WITH batch AS (
+                    SELECT id FROM {table} WHERE id > :last ORDER BY id LIMIT :size
+                )
+                UPDATE {table} SET {touch} = {table}.{touch}
+                FROM batch WHERE {table}.id = batch.id
+                RETURNING {table}.id
+                """
+            )
+            last = ""
+            rows = 0
+            start = time.perf_counter()
+            while True:
+                ids = conn.execute(
+                    statement, {"last": last, "size": args.batch_size}
+                ).scalars()
+                ids = list(ids)
+                if not ids:
+                    break
+                last = max(ids)
+                rows += len(ids)
+                if args.pause:
+                    time.sleep(args.pause)
+            print(
+                f"{table}: backfilled {rows} rows in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+
+
+def index(args):
+    with _autocommit() as conn:
+        for table, columns in CONVERSIONS.items():
+            if _is_converted(conn, table):
+                print(f"{table}: already converted")
+                continue
+            missing = _scalar(
+                conn,
+                f"SELECT count(*) FROM {table} WHERE "
+                + " OR ".join(
+                    f"({column} IS NOT NULL AND {column}{SHADOW} IS NULL)"
+                    for column in columns
+                ),
+            )
+            if missing:
+                raise SystemExit(f"{table}: {missing} rows not backfilled yet")
+
+            for name, unique, _, index_columns in _indexes(conn, table):
+                shadow = name + SHADOW
+                valid = _scalar(
+                    conn,
+                    "SELECT indisvalid FROM pg_index "
+                    "WHERE indexrelid = to_regclass(:name)",
+                    name=shadow,
+                )
+                if valid is False:
+                    # Left behind by an interrupted concurrent build
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY {shadow}"))
+                if valid is not True:
+                    targets = ", ".join(
+                        column + SHADOW if column in columns else column
+                        for column in index_columns
+                    )
+                    start = time.perf_counter()
+                    conn.execute(
+                        text(
+                            f"CREATE {'UNIQUE ' if unique else ''}INDEX "
+                            f"CONCURRENTLY {shadow} ON {table} ({targets})"
+                        )
+                    )
+                    print(
+                        f"{table}: built {shadow} in "
+                        f"{time.perf_counter() - start:.1f}s"
+                    )
+
+            # A validated CHECK lets SET NOT NULL skip its scan during the swap
+            not_null = _not_null_columns(conn, table) & set(columns)
+            for column in sorted(not_null):
+                check = f"{table}_{column}{SHADOW}_not_null"
+                if not _scalar(
+                    conn, "SELECT 1 FROM pg_constraint WHERE conname = :c", c=check
+                ):
+                    _with_lock_retries(
+                        [
+                            f"ALTER TABLE {table} ADD CONSTRAINT {check} "
+                            f"CHECK ({column}{SHADOW} IS NOT NULL) NOT VALID"
+                        ],
+                    )
+                conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}"))
+
+        for name, table, column, parent, parent_column in _foreign_keys(conn):
+            shadow = name + SHADOW
+            if not _scalar(
+                conn, "SELECT 1 FROM pg_constraint WHERE conname = :c", c=shadow
+            ):
+                _with_lock_retries(
+                    [
+                        f"ALTER TABLE {table} ADD CONSTRAINT {shadow} FOREIGN KEY "
+                        f"({column}{SHADOW}) REFERENCES {parent} "
+                        f"({parent_column}{SHADOW}) NOT VALID"
+                    ],
+                )
+            conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {shadow}"))
+            print(f"{table}: validated {shadow}")
+
+
+def swap(args):
+    with engine.connect() as conn:
+        pending = [t for t in CONVERSIONS if not _is_converted(conn, t)]
+        if not pending:
+            print("Nothing to swap")
+            return
+        foreign_keys = _foreign_keys(conn)
+        indexes = {table: _indexes(conn, table) for table in pending}
+        not_null = {
+            table: _not_null_columns(conn, table) & set(CONVERSIONS[table])
+            for table in pending
+        }
+        conn.rollback()
+
+        statements = [f"LOCK TABLE {', '.join(pending)} IN ACCESS EXCLUSIVE MODE"]
+        for table in pending:
+            statements.append(f"DROP TRIGGER IF EXISTS compact_{table} ON {table}")
+            statements.append(f"DROP FUNCTION IF EXISTS compact_{table}()")
+        for name, table, *_ in foreign_keys:
+            statements.append(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+        for table in pending:
+            for name, _, primary, _ in indexes[table]:
+                statements.append(
+                    f"ALTER TABLE {table} DROP CONSTRAINT {name}"
+                    if primary
+                    else f"DROP INDEX {name}"
+                )
+            for column in CONVERSIONS[table]:
+                statements += [
+                    f"ALTER TABLE {table} DROP COLUMN {column}",
+                    f"ALTER TABLE {table} RENAME COLUMN {column}{SHADOW} TO {column}",
+                ]
+            for column in sorted(not_null[table]):
+                statements += [
+                    f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL",
+                    f"ALTER TABLE {table} DROP CONSTRAINT "
+                    f"{table}_{column}{SHADOW}_not_null",
+                ]
+            for name, _, primary, _ in indexes[table]:
+                statements.append(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+                    f"PRIMARY KEY USING INDEX {name}{SHADOW}"
+                    if primary
+                    else f"ALTER INDEX {name}{SHADOW} RENAME TO {name}"
+                )
+        for name, table, *_ in foreign_keys:
+            statements.append(
+                f"ALTER TABLE {table} RENAME CONSTRAINT {name}{SHADOW} TO {name}"
+            )
+
+        start = time.perf_counter()
+        _with_lock_retries(statements)
+        print(
+            f"Swapped {', '.join(pending)} in {time.perf_counter() - start:.2f}s; "
+            "deploy with DB_COMPACT_TYPES=true"
+        )
+
+    with _autocommit() as conn:
+        conn.execute(text(f"ANALYZE {', '.join(pending)}"))
+
+
+LOOKUPS = {
+    "parcel by id": "SELECT * FROM parcels WHERE id = :parcel_id",
+    "history by parcel": (
+        "SELECT * FROM tracking_history WHERE parcel_id = :parcel_id "
+        "ORDER BY created_at"
+    ),
+    "user parcels page": (
+        "SELECT * FROM parcels WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 20"
+    ),
+    "user payments join": (
+        "SELECT p.tracking_id, pay.amount FROM parcels p "
+        "JOIN payments pay ON pay.parcel_id = p.id WHERE p.user_id = :user_id"
+    ),
+}
+
+
+def measure(args):
+    result = {"tables": {}, "lookups_ms": {}}
+    with engine.connect() as conn:
+        for table in CONVERSIONS:
+            result["tables"][table] = {
+                "table_bytes": _scalar(conn, f"SELECT pg_table_size('{table}')"),
+                "index_bytes": _scalar(conn, f"SELECT pg_indexes_size('{table}')"),
+            }
+
+        samples = conn.execute(
+            text(
+                "SELECT id::text, user_id::text FROM parcels TABLESAMPLE SYSTEM (1) "
+                "WHERE user_id IS NOT NULL LIMIT :n"
+            ),
+            {"n": args.samples},
+        ).all()
+        for name, sql in LOOKUPS.items():
+            statement = text(sql)
+            timings = []
+            for parcel_id, user_id in samples:
+                start = time.perf_counter()
+                conn.execute(
+                    statement, {"parcel_id": parcel_id, "user_id": user_id}
+                ).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            result["lookups_ms"][name] = {
+                "p50": round(statistics.median(timings), 3),
+                "p95": round(timings[int(len(timings) * 0.95)], 3),
+            }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            _print_comparison(json.load(f), result)
+    elif not args.output:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+def _print_comparison(before: dict, after: dict):
+    mib = 1024 * 1024
+    print(f"{'':<18}{'table MiB':>22}{'indexes MiB':>22}")
+    for table, sizes in after["tables"].items():
+        old = before["tables"][table]
+        print(
+            f"{table:<18}"
+            f"{old['table_bytes'] / mib:>10.1f} -> {sizes['table_bytes'] / mib:<8.1f}"
+            f"{old['index_bytes'] / mib:>10.1f} -> {sizes['index_bytes'] / mib:<8.1f}"
+        )
+    print(f"\n{'':<22}{'p50 ms':>20}{'p95 ms':>20}")
+    for name, timing in after["lookups_ms"].items():
+        old = before["lookups_ms"][name]
+        print(
+            f"{name:<22}"
+            f"{old['p50']:>9.3f} -> {timing['p50']:<7.3f}"
+            f"{old['p95']:>9.3f} -> {timing['p95']:<7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    steps = parser.add_subparsers(dest="step", required=True)
+
+    step = steps.add_parser("prepare", help="add shadow columns and sync triggers")
+    step.add_argument("--remap-legacy-ids", action="store_true")
+    step.set_defaults(run=prepare)
+
+    step = steps.add_parser("backfill", help="fill shadow columns in batches")
+    step.add_argument("--batch-size", type=int, default=5000)
+    step.add_argument("--pause", type=float, default=0, help="seconds between batches")
+    step.set_defaults(run=backfill)
+
+    step = steps.add_parser("index", help="build indexes and constraints online")
+    step.set_defaults(run=index)
+
+    step = steps.add_parser("swap", help="switch to the shadow columns")
+    step.set_defaults(run=swap)
+
+    step = steps.add_parser("measure", help="table/index sizes and lookup latency")
+    step.add_argument("--samples", type=int, default=300)
+    step.add_argument("--output", help="write the measurements to a JSON file")
+    step.add_argument("--compare", help="print a comparison with an earlier run")
+    step.set_defaults(run=measure)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Seed a database with a synthetic parcel dataset
+
+Inserts users, parcels (SEED0000000001...), tracking history and payments
+into the database configured through the DB_* variables, only when it
+holds fewer than --parcels seeded parcels, then ANALYZEs it. The query
+plan tests (tests/test_query_plans.py) and the benchmarks share it.
+
+    python -m scripts.seed_data --parcels 50000
+
+Point it at a disposable local Postgres: seeded rows are committed.
+"""
+import argparse
+import hashlib
+import uuid
+
+from sqlalchemy import text
+
+from app.database import engine
+
+STATUSES = [
+    "pending",
+    "collected",
+    "in_transit",
+    "at_border",
+    "border_cleared",
+    "out_for_delivery",
+    "delivered",
+    "cancelled",
+]
+
+# Keys are md5(name)::uuid, valid in both the String and the uuid schema
+# (and what scripts/compact_schema.py --remap-legacy-ids maps old names to)
+SEED_SQL = [
+    """
+    INSERT INTO users (id, email, full_name, password, role, created_at)
+    SELECT md5('seed-user-' || g)::uuid, 'seed' || g || '@example.com',
+           'Seed User ' || g, 'x', 'user', now() - (g || ' minutes')::interval
+    FROM generate_series(1, :users) AS g
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO parcels (
+        id, tracking_id, sender_name, sender_email, sender_phone,
+        recipient_name, recipient_email, recipient_phone, recipient_address,
+        destination_country, weight, dimensions, status, current_location,
+        shipping_cost, border_fee, border_fee_paid, user_id, created_at
+    )
+    SELECT md5('seed-parcel-' || g)::uuid, 'SEED' || lpad(g::text, 10, '0'),
+           'Sender ' || g, 'sender' || g || '@example.com',
+           '+1 (555) ' || lpad(g::text, 7, '0'),
+           'Recipient ' || g, 'recipient' || g || '@example.com',
+           '555-' || lpad((g::bigint * 7919 % 10000000)::text, 7, '0'),
+           g || ' Main Street', (ARRAY['US', 'UK', 'CA', 'AU', 'EU'])[1 + g % 5],
+           1 + g % 20, '{"length": 30, "width": 20, "height": 15, "unit": "cm"}',
+           (:statuses)[1 + g % 8], 'Warehouse - Origin', 12, 20, false,
+           md5('seed-user-' || (1 + g % :users))::uuid,
+           now() - (g || ' seconds')::interval
+    FROM generate_series(1, :parcels) AS g
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO tracking_history (id, parcel_id, status, location, description, created_at)
+    SELECT md5('seed-history-' || g || '-' || s)::uuid,
+           md5('seed-parcel-' || g)::uuid,
+           (:statuses)[1 + s % 8], 'Depot ' || s, 'Seeded scan',
+           now() - (g || ' seconds')::interval + (s || ' minutes')::interval
+    FROM generate_series(1, :parcels) AS g, generate_series(1, :depth) AS s
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO payments (id, parcel_id, payment_id, type, amount, status, created_at)
+    SELECT md5('seed-payment-' || g)::uuid, md5('seed-parcel-' || g)::uuid,
+           'pi_seed_' || g,
+           'border_fee', 20, 'completed', now() - (g || ' seconds')::interval
+    FROM generate_series(1, :parcels, 2) AS g
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+
+def seed_id(name: str) -> str:
+    """Key of a seeded row, e.g. seed_id("seed-user-7")"""
+    return str(uuid.UUID(hashlib.md5(name.encode()).hexdigest()))
+
+
+def seed(parcels: int, depth: int):
+    with engine.begin() as conn:
+        existing = conn.execute(
+            text("SELECT count(*) FROM parcels WHERE tracking_id LIKE 'SEED%'")
+        ).scalar()
+        if existing >= parcels:
+            return
+        params = {
+            "parcels": parcels,
+            "users": max(parcels // 50, 1),
+            "depth": depth,
+            "statuses": STATUSES,
+        }
+        for sql in SEED_SQL:
+            conn.execute(text(sql), params)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parcels", type=int, default=50000)
+    parser.add_argument("--depth", type=int, default=5, help="history rows per parcel")
+    args = parser.parse_args()
+    seed(args.parcels, args.depth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Local stand-in for the Stripe PaymentIntents API
+
+Implements just what the backend calls: creating and fetching payment
+intents, with Idempotency-Key replay (a reused key with different
+parameters is rejected like Stripe does), configurable latency and error
+injection. With --webhook-url it also delivers a signed
+payment_intent.succeeded event for every new intent.
+
+    python -m scripts.stripe_stub --port 12111 --latency 80 \\
+        --webhook-url http://localhost:8000/api/payments/webhook
+    STRIPE_API_BASE=http://localhost:12111 uvicorn app.main:app
+
+Use the same STRIPE_WEBHOOK_SECRET for the stub and the backend.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Stripe stub")
+settings = argparse.Namespace(
+    latency=0.0, jitter=0.0, error_rate=0.0, webhook_url=None, webhook_secret=""
+)
+intents = {}
+idempotent = {}
+stats = {"created": 0, "replayed": 0, "errors": 0, "webhooks": 0}
+
+
+def _error(status: int, kind: str, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"type": kind, "message": message}}, status)
+
+
+def _unflatten(fields: list) -> dict:
+    """Turn bracketed form fields (metadata[parcel_id]=...) back into dicts"""
+    params = {}
+    for name, value in fields:
+        keys = name.replace("]", "").split("[")
+        target = params
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return params
+
+
+def _signature(payload: str) -> str:
+    timestamp = int(time.time())
+    digest = hmac.new(
+        settings.webhook_secret.encode(),
+        f"{timestamp}.{payload}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+async def _deliver_succeeded(intent: dict):
+    succeeded = {
+        **intent,
+        "status": "succeeded",
+        "charges": {
+            "object": "list",
+            "data": [
+                {
+                    "id": "ch_" + secrets.token_hex(12),
+                    "object": "charge",
+                    "payment_method_details": {
+                        "card": {"brand": "visa", "last4": "4242"}
+                    },
+                }
+            ],
+        },
+    }
+    payload = json.dumps(
+        {
+            "id": "evt_" + secrets.token_hex(12),
+            "object": "event",
+            "type": "payment_intent.succeeded",
+            "created": int(time.time()),
+            "data": {"object": succeeded},
+        }
+    )
+    async with httpx.AsyncClient(timeout=10) as client:
+        try:
+            await client.post(
+                settings.webhook_url,
+                content=payload,
+                headers={
+                    "Content-Type": "application/json",
+                    "Stripe-Signature": _signature(payload),
+                },
+            )
+            stats["webhooks"] += 1
+        except httpx.HTTPError:
+            pass
+
+
+async def _latency():
+    delay = settings.latency + random.uniform(0, settings.jitter)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+
+
+@app.post("/v1/payment_intents")
+async def create_payment_intent(request: Request):
+    await _latency()
+    if not request.headers.get("authorization"):
+        return _error(401, "invalid_request_error", "No API key provided")
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        return _error(500, "api_error", "Injected failure")
+
+    fields = sorted(parse_qsl((await request.body()).decode()))
+    key = request.headers.get("idempotency-key")
+    if key in idempotent:
+        previous_fields, intent_id = idempotent[key]
+        if previous_fields != fields:
+            return _error(
+                400,
+                "idempotency_error",
+                "Keys for idempotent requests can only be used with the same "
+                "parameters they were first used with.",
+            )
+        stats["replayed"] += 1
+        return intents[intent_id]
+
+    params = _unflatten(fields)
+    intent_id = "pi_" + secrets.token_hex(12)
+    intent = {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(params.get("amount", 0)),
+        "currency": params.get("currency", "usd"),
+        "description": params.get("description"),
+        "metadata": params.get("metadata", {}),
+        "status": "requires_payment_method",
+        "client_secret": f"{intent_id}_secret_{secrets.token_hex(12)}",
+        "created": int(time.time()),
+    }
+    intents[intent_id] = intent
+    if key:
+        idempotent[key] = (fields, intent_id)
+    stats["created"] += 1
+
+    if settings.webhook_url:
+        asyncio.create_task(_deliver_succeeded(intent))
+    return intent
+
+
+@app.get("/v1/payment_intents/{intent_id}")
+async def get_payment_intent(intent_id: str):
+    await _latency()
+    if intent_id not in intents:
+        return _error(
+            404, "invalid_request_error", f"No such payment_intent: {intent_id}"
+        )
+    return intents[intent_id]
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0, help="ms per request")
+    parser.add_argument("--jitter", type=float, default=0, help="extra random ms")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--webhook-url")
+    parser.add_argument(
+        "--webhook-secret", default=os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_...")
+    )
+    vars(settings).update(vars(parser.parse_args()))
+    uvicorn.run(app, host=settings.host, port=settings.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
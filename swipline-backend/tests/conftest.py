@@ -0,0 +1,56 @@
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+# app.database builds its URL at import time; unit tests never connect, so
+# only the port needs a parseable value when no database is configured
+os.environ.setdefault("DB_PORT", "5432")
+
+
+def _cached_user(role: str):
+    from app import crud
+
+    user = crud.AuthUser(
+        str(uuid.uuid4()),
+        f"{role}@example.com",
+        f"Test {role}",
+        role,
+        datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    )
+    crud.user_cache.set(user.id, user)
+    return user
+
+
+@pytest.fixture
+def user():
+    """A user in the auth cache, so authenticating it needs no database"""
+    from app import crud
+
+    user = _cached_user("user")
+    yield user
+    crud.user_cache.invalidate(user.id)
+
+
+@pytest.fixture
+def admin():
+    from app import auth, crud
+
+    admin = _cached_user(auth.ADMIN_ROLE)
+    yield admin
+    crud.user_cache.invalidate(admin.id)
+
+
+@pytest.fixture
+def bearer():
+    """Authorization headers for a user"""
+    from app import auth
+
+    def headers(user) -> dict:
+        token = auth.create_access_token({"sub": user.id})
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
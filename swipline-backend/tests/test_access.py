@@ -0,0 +1,37 @@
+"""Who may call the routes that expose customer data
+
+Only the access checks are exercised: each request is refused before it
+reaches the database.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture
+def client():
+    # Not entered as a context manager, so no startup tasks run
+    return TestClient(app)
+
+
+ADMIN_ONLY = [
+    "/api/parcels/search?name=smith",
+    "/api/admin/statistics",
+    "/health/jobs",
+    "/api/exports/parcels",
+    "/api/exports/payments",
+    "/api/exports/tracking-history",
+]
+
+
+@pytest.mark.parametrize("path", ADMIN_ONLY)
+def test_admin_only_routes(client, user, bearer, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=bearer(user)).status_code == 403
+
+
+def test_user_parcels_only_for_their_owner(client, user, admin, bearer):
+    path = f"/api/parcels/user/{admin.id}"
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=bearer(user)).status_code == 403
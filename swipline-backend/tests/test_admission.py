@@ -0,0 +1,90 @@
+import pytest
+
+from app import admission, auth, crud
+from app.admission import CRITICAL, NORMAL, PUBLIC, RateLimiter, priority_of
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_allows_burst_then_limits(clock):
+    limiter = RateLimiter(rate=2, burst=3, max_keys=10)
+    assert [limiter.acquire("a") for _ in range(3)] == [None, None, None]
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    assert limiter.limited == 1
+    # Other keys have their own bucket
+    assert limiter.acquire("b") is None
+
+
+def test_refills_at_rate(clock):
+    limiter = RateLimiter(rate=2, burst=3, max_keys=10)
+    for _ in range(3):
+        limiter.acquire("a")
+    clock[0] += 0.5
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") is not None
+    clock[0] += 60
+    assert [limiter.acquire("a") for _ in range(4)][:3] == [None, None, None]
+
+
+def test_zero_rate_disables(clock):
+    limiter = RateLimiter(rate=0, burst=0, max_keys=10)
+    assert all(limiter.acquire("a") is None for _ in range(100))
+
+
+def test_drops_least_recently_used_buckets(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("c")
+    assert len(limiter) == 2
+    # "a" was dropped, so it starts over with a full bucket
+    assert limiter.acquire("a") is None
+
+
+@pytest.mark.parametrize(
+    "method, path, priority",
+    [
+        ("POST", "/api/payments/webhook", CRITICAL),
+        ("PUT", "/api/parcels/SWL1/location", NORMAL),
+        ("POST", "/api/parcels/locations/bulk", NORMAL),
+        ("GET", "/health", CRITICAL),
+        ("GET", "/api/track/SWL1", PUBLIC),
+        ("GET", "/api/parcels/SWL1/location", NORMAL),
+        ("GET", "/api/parcels/search", NORMAL),
+    ],
+)
+def test_priority_of(method, path, priority):
+    assert priority_of(method, path) == priority
+
+
+@pytest.mark.parametrize(
+    "method, path",
+    [("PUT", "/api/parcels/SWL1/location"), ("POST", "/api/parcels/locations/bulk")],
+)
+def test_location_updates_are_critical_for_scanners_and_admins(
+    method, path, user, admin, bearer
+):
+    scanner = crud.AuthUser("scanner-1", "scanner@example.com", "Scan", "scanner", None)
+    crud.user_cache.set(scanner.id, scanner)
+    try:
+        for caller in (admin, scanner):
+            authorization = bearer(caller)["Authorization"]
+            assert priority_of(method, path, authorization) == CRITICAL
+        assert priority_of(method, path, bearer(user)["Authorization"]) == NORMAL
+        assert priority_of(method, path, "Bearer not-a-token") == NORMAL
+        assert priority_of(method, path, "Basic c2NhbjpuZXI=") == NORMAL
+        assert priority_of(method, path) == NORMAL
+    finally:
+        crud.user_cache.invalidate(scanner.id)
+
+
+def test_role_claim_is_used_when_the_user_is_not_cached():
+    token = auth.create_access_token({"sub": "uncached", "role": "scanner"})
+    assert priority_of("POST", "/api/parcels/locations/bulk", f"Bearer {token}") == (
+        CRITICAL
+    )
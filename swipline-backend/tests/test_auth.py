@@ -0,0 +1,114 @@
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth, crud
+from app.database import get_session
+from app.main import app as main_app
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/me")
+    async def me(user: crud.AuthUser = Depends(auth.get_current_user)):
+        return {"id": user.id}
+
+    @app.get("/admin")
+    async def admin(user: crud.AuthUser = Depends(auth.require_admin)):
+        return {"id": user.id}
+
+    return TestClient(app)
+
+
+def test_decode_round_trip():
+    claims = auth.decode_token(auth.create_access_token({"sub": "42"}))
+    assert claims["sub"] == "42"
+    assert claims["exp"] > time.time()
+
+
+def test_decode_rejects_bad_tokens():
+    import jwt
+
+    assert auth.decode_token("not a token") is None
+    assert auth.decode_token(jwt.encode({"sub": "1"}, auth.SECRET_KEY)) is None
+    expired = jwt.encode({"sub": "1", "exp": time.time() - 1}, auth.SECRET_KEY)
+    assert auth.decode_token(expired) is None
+    forged = jwt.encode({"sub": "1", "exp": time.time() + 60}, "another-key")
+    assert auth.decode_token(forged) is None
+
+
+def test_current_user(client, user, bearer):
+    assert client.get("/me").status_code == 401
+    assert client.get("/me", headers={"Authorization": "Bearer x"}).status_code == 401
+    response = client.get("/me", headers=bearer(user))
+    assert response.status_code == 200
+    assert response.json() == {"id": user.id}
+
+
+def test_require_admin(client, user, admin, bearer):
+    assert client.get("/admin").status_code == 401
+    assert client.get("/admin", headers=bearer(user)).status_code == 403
+    assert client.get("/admin", headers=bearer(admin)).status_code == 200
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """The real app, with no database behind its sessions"""
+
+    async def no_session():
+        yield None
+
+    @asynccontextmanager
+    async def no_session_scope():
+        yield None
+
+    monkeypatch.setattr(auth, "session_scope", no_session_scope)
+    main_app.dependency_overrides[get_session] = no_session
+    # Not entered as a context manager, so no startup tasks run
+    yield TestClient(main_app)
+    main_app.dependency_overrides.clear()
+
+
+def test_me_serializes_the_cached_user(api, user, bearer):
+    response = api.get("/api/auth/me", headers=bearer(user))
+    assert response.status_code == 200
+    assert response.json() == {
+        "email": user.email,
+        "full_name": user.full_name,
+        "id": user.id,
+        "role": user.role,
+        "is_verified": False,
+        "created_at": "2025-01-02T03:04:05Z",
+    }
+
+
+def test_me_loads_an_uncached_user_once(api, user, bearer, monkeypatch):
+    loaded = []
+
+    def get_auth_user(db, user_id):
+        loaded.append(user_id)
+        return user
+
+    monkeypatch.setattr(crud, "get_auth_user", get_auth_user)
+    crud.user_cache.invalidate(user.id)
+    headers = bearer(user)
+    assert api.get("/api/auth/me", headers=headers).json()["id"] == user.id
+    # The fake does not fill the cache; the real one does
+    crud.user_cache.set(user.id, user)
+    assert api.get("/api/auth/me", headers=headers).json()["id"] == user.id
+    assert loaded == [user.id]
+
+
+def test_me_rejects_missing_and_deleted_users(api, bearer, monkeypatch):
+    monkeypatch.setattr(crud, "get_auth_user", lambda db, user_id: None)
+    gone = crud.AuthUser(str(uuid.uuid4()), "gone@example.com", "Gone", "user", None)
+    assert api.get("/api/auth/me").status_code == 401
+    response = api.get("/api/auth/me", headers=bearer(gone))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User no longer exists"
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.routers.parcels import _csv_records, _split_lines
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _collect(generator) -> list:
+    async def collect():
+        return [item async for item in generator]
+
+    return asyncio.run(collect())
+
+
+def _split(*chunks, max_length=100):
+    return _collect(_split_lines(_chunks(*chunks), max_length))
+
+
+def _records(text: str, max_length=100):
+    lines = _split_lines(_chunks(text.encode()), 10_000)
+    return _collect(_csv_records(lines, max_length))
+
+
+def test_lines_across_chunks():
+    assert _split(b"ab", b"c\nde", b"f\n\ng") == [b"abc", b"def", b"", b"g"]
+    assert _split(b"a\n") == [b"a"]
+    assert _split() == []
+
+
+def test_unterminated_line_is_rejected_before_it_is_buffered_whole():
+    chunks = [b"x" * 60, b"x" * 60, b"never read"]
+    generator = _split_lines(_chunks(*chunks), 100)
+
+    async def first():
+        return await generator.__anext__()
+
+    with pytest.raises(ValueError, match="longer than 100 bytes"):
+        asyncio.run(first())
+
+
+def test_long_complete_line_is_rejected():
+    with pytest.raises(ValueError):
+        _split(b"ok\n" + b"x" * 101 + b"\nok\n")
+    assert _split(b"x" * 100 + b"\n") == [b"x" * 100]
+
+
+def test_blank_lines_between_records_are_skipped():
+    assert _records("a,b\r\n\r\n  \n1,2\n\n") == [["a", "b"], ["1", "2"]]
+
+
+def test_blank_lines_inside_quoted_fields_are_kept():
+    text = 'name,note\n"Bob","first\n\nthird"\n"Ann",x\n'
+    assert _records(text) == [
+        ["name", "note"],
+        ["Bob", "first\n\nthird"],
+        ["Ann", "x"],
+    ]
+
+
+def test_crlf_inside_quoted_fields():
+    assert _records('"a\r\n\r\nb",c\r\n') == [["a\n\nb", "c"]]
+
+
+def test_unbalanced_quote_is_bounded():
+    with pytest.raises(ValueError, match="Record longer than 100"):
+        _records('"never closed\n' + "line\n" * 50)
@@ -0,0 +1,91 @@
+from app import cache
+from app.cache import LRUCache
+
+
+def test_get_returns_default_on_miss():
+    c = LRUCache(maxsize=2)
+    assert c.get("a") is None
+    assert c.get("a", 1) == 1
+    assert c.misses == 2
+
+
+def test_evicts_least_recently_used():
+    c = LRUCache(maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("a") == 1
+    assert c.get("b") is None
+    assert c.get("c") == 3
+    assert len(c) == 2
+
+
+def test_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = LRUCache(maxsize=2, ttl=10)
+    c.set("a", 1)
+    now[0] += 9
+    assert c.get("a") == 1
+    now[0] += 2
+    assert c.get("a") is None
+    assert len(c) == 0
+
+
+def test_set_with_stale_generation_is_dropped():
+    c = LRUCache(maxsize=2)
+    generation = c.generation
+    c.invalidate("a")
+    c.set("a", 1, generation=generation)
+    assert c.get("a") is None
+    c.set("a", 2, generation=c.generation)
+    assert c.get("a") == 2
+
+
+def test_invalidating_one_key_keeps_fills_of_others():
+    c = LRUCache(maxsize=4)
+    generation = c.generation
+    c.invalidate("a")
+    c.set("b", 2, generation=generation)
+    assert c.get("b") == 2
+    c.set("a", 1, generation=generation)
+    assert c.get("a") is None
+
+
+def test_forgotten_invalidations_drop_older_fills():
+    c = LRUCache(maxsize=2)
+    generation = c.generation
+    c.invalidate("a")
+    c.invalidate("b", "c")  # "a" is forgotten
+    c.set("a", 1, generation=generation)
+    assert c.get("a") is None
+    c.set("d", 4, generation=generation)
+    assert c.get("d") is None
+    c.set("d", 4, generation=c.generation)
+    assert c.get("d") == 4
+
+
+def test_clear_drops_fills_in_flight():
+    c = LRUCache(maxsize=2)
+    generation = c.generation
+    c.clear()
+    c.set("a", 1, generation=generation)
+    assert c.get("a") is None
+
+
+def test_invalidate_and_clear():
+    c = LRUCache(maxsize=4)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.invalidate("a")
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    c.clear()
+    assert len(c) == 0
+
+
+def test_zero_size_caches_nothing():
+    c = LRUCache(maxsize=0)
+    c.set("a", 1)
+    assert c.get("a") is None
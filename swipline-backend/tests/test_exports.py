@@ -0,0 +1,64 @@
+"""The concurrent export cap, without a database
+
+Responses are built but their bodies are never streamed.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import crud, schemas
+from app.routers import exports
+
+
+@pytest.fixture(autouse=True)
+def no_exports(monkeypatch):
+    monkeypatch.setattr(exports, "_active_exports", 0)
+    monkeypatch.setattr(exports, "MAX_CONCURRENT_EXPORTS", 2)
+
+
+def _export():
+    request = Request({"type": "http", "headers": []})
+    return exports._export(
+        request, "parcels", schemas.ExportFilters(), schemas.ParcelStatus
+    )
+
+
+def test_slots_are_taken_before_the_body_starts():
+    _export()
+    _export()
+    with pytest.raises(HTTPException) as refused:
+        _export()
+    assert refused.value.status_code == 429
+
+
+def test_unstarted_response_releases_its_slot():
+    response = _export()
+    assert exports._active_exports == 1
+    asyncio.run(response.background())
+    assert exports._active_exports == 0
+    asyncio.run(response.background())
+    assert exports._active_exports == 0
+
+
+def test_failed_response_releases_its_slot(monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("bad statement")
+
+    monkeypatch.setattr(crud, "export_statement", broken)
+    with pytest.raises(ValueError):
+        _export()
+    assert exports._active_exports == 0
+
+
+def test_unknown_status_takes_no_slot():
+    request = Request({"type": "http", "headers": []})
+    with pytest.raises(HTTPException):
+        exports._export(
+            request,
+            "parcels",
+            schemas.ExportFilters(status="lost"),
+            schemas.ParcelStatus,
+        )
+    assert exports._active_exports == 0
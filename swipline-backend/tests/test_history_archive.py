@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app import history_archive
+from app.history_archive import (
+    ARCHIVE_BLOCK_ROWS,
+    month_start,
+    read_archived_rows,
+    write_archive,
+)
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def _rows(parcels, depth):
+    """Rows ordered by parcel, as archive_partition selects them"""
+    for p in range(parcels):
+        for d in range(depth):
+            yield {
+                "id": f"history-{p}-{d}",
+                "parcel_id": f"parcel-{p:05d}",
+                "status": "in_transit",
+                "location": f"Hub {d}",
+                "description": None,
+                "coordinates": {"lat": 1.5, "lng": -2.25},
+                "created_at": (START + timedelta(hours=p + d)).isoformat(),
+            }
+
+
+def test_round_trip_across_blocks(tmp_path):
+    path = str(tmp_path / "tracking_history_p2025_03.jsonl.gz")
+    assert write_archive(path, _rows(400, 3)) == 1200
+
+    with open(path.replace(".jsonl.gz", ".idx.json")) as f:
+        index = json.load(f)
+    assert index["rows"] == 1200
+    assert len(index["blocks"]) > 1
+
+    for p in (0, 170, 171, 399):
+        rows = read_archived_rows(path, f"parcel-{p:05d}")
+        assert [row["id"] for row in rows] == [f"history-{p}-{d}" for d in range(3)]
+        assert rows[0]["created_at"] == START + timedelta(hours=p)
+        assert rows[0]["coordinates"] == {"lat": 1.5, "lng": -2.25}
+
+
+def test_parcel_rows_stay_in_one_block(tmp_path):
+    path = str(tmp_path / "a.jsonl.gz")
+    write_archive(path, _rows(3, ARCHIVE_BLOCK_ROWS))
+    with open(path.replace(".jsonl.gz", ".idx.json")) as f:
+        blocks = json.load(f)["blocks"]
+    assert [block[:2] for block in blocks] == [
+        [f"parcel-{p:05d}", f"parcel-{p:05d}"] for p in range(3)
+    ]
+
+
+def test_missing_parcel_reads_nothing(tmp_path):
+    path = str(tmp_path / "a.jsonl.gz")
+    write_archive(path, _rows(10, 2))
+    assert read_archived_rows(path, "parcel-00003x") == []
+    assert read_archived_rows(path, "parcel-99999") == []
+    assert read_archived_rows(path, "") == []
+
+
+def test_empty_archive(tmp_path):
+    path = str(tmp_path / "a.jsonl.gz")
+    assert write_archive(path, []) == 0
+    assert read_archived_rows(path, "parcel-00000") == []
+
+
+def test_leaves_no_temporary_files(tmp_path):
+    write_archive(str(tmp_path / "a.jsonl.gz"), _rows(2, 2))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.idx.json", "a.jsonl.gz"]
+
+
+def test_month_start():
+    moment = datetime(2025, 12, 31, 23, 30, tzinfo=timezone.utc)
+    assert month_start(moment) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    assert month_start(moment, 1) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert month_start(moment, -12) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert history_archive.partition_name(moment) == "tracking_history_p2025_12"
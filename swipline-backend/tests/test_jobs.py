@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from app import jobs
+from app.jobs import PeriodicJob
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_ENABLED", True)
+    monkeypatch.setattr(jobs, "JOB_STARTUP_JITTER", 0)
+
+
+def _runs_after(job, seconds):
+    async def scenario():
+        calls = []
+
+        async def run():
+            calls.append(1)
+
+        job.run = run
+        await job.start()
+        await asyncio.sleep(seconds)
+        await job.stop()
+        return len(calls)
+
+    return asyncio.run(scenario())
+
+
+def test_run_at_start_does_not_wait_an_interval(enabled):
+    job = PeriodicJob("daily", 86400, lambda db: None, run_at_start=True)
+    assert _runs_after(job, 0.05) == 1
+
+
+def test_waits_an_interval_by_default(enabled):
+    job = PeriodicJob("daily", 86400, lambda db: None)
+    assert _runs_after(job, 0.05) == 0
+
+
+def test_maintenance_runs_at_start():
+    assert jobs.jobs["maintain_tracking_history"].run_at_start
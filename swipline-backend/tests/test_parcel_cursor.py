@@ -0,0 +1,50 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app import crud
+
+
+def _parcel(created_at=None):
+    return SimpleNamespace(
+        created_at=created_at or datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc),
+        id=str(uuid.uuid4()),
+    )
+
+
+def test_round_trip():
+    parcel = _parcel()
+    cursor = crud.encode_parcel_cursor(parcel)
+    assert "=" not in cursor
+    assert crud.decode_parcel_cursor(cursor) == (parcel.created_at, parcel.id)
+
+
+def test_round_trip_keeps_microseconds():
+    parcel = _parcel(datetime(2026, 1, 2, 3, 4, 5, 678901))
+    created_at, _ = crud.decode_parcel_cursor(crud.encode_parcel_cursor(parcel))
+    assert created_at == parcel.created_at
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not base64!",
+        "e30",  # {}
+        "WzFd",  # [1]
+        "WyJub3QgYSBkYXRlIiwgIngiXQ",  # ["not a date", "x"]
+    ],
+)
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_parcel_cursor(cursor)
+
+
+def test_next_cursor_only_for_full_pages():
+    parcels = [_parcel(), _parcel()]
+    assert crud.next_parcel_cursor(parcels, limit=3) is None
+    assert crud.next_parcel_cursor(parcels, limit=2) == crud.encode_parcel_cursor(
+        parcels[-1]
+    )
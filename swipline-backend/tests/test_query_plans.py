@@ -0,0 +1,141 @@
+"""Every hot crud query is served without a sequential scan
+
+Seeds the database configured through the DB_* variables (see
+scripts/seed_data.py), runs the crud read paths and EXPLAINs every
+statement they issue. Skipped when no database is configured; point it at
+a disposable local Postgres, since seeded rows are committed.
+QUERY_PLAN_PARCELS sets the dataset size.
+"""
+import json
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, models
+from app.database import SessionLocal, engine
+from scripts.seed_data import seed, seed_id
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("DB_HOST"), reason="no database configured (DB_HOST)"
+)
+
+QUERY_PLAN_PARCELS = int(os.getenv("QUERY_PLAN_PARCELS", "50000"))
+QUERY_PLAN_DEPTH = 5
+
+
+def _deep_cursor(db, **filters):
+    """Cursor pointing deep into the seeded parcels"""
+    parcel = (
+        db.query(models.Parcel)
+        .filter_by(**filters)
+        .order_by(models.Parcel.created_at.desc(), models.Parcel.id.desc())
+        .offset(20)
+        .first()
+    )
+    return crud.encode_parcel_cursor(parcel)
+
+
+USER = seed_id("seed-user-7")
+
+CASES = {
+    "get_parcel_by_tracking_id": lambda db: crud.get_parcel_by_tracking_id(
+        db, "SEED0000000042"
+    ),
+    "get_tracking_history": lambda db: crud.get_tracking_history(db, "SEED0000000042"),
+    "get_user_parcels": lambda db: crud.get_user_parcels(db, USER),
+    "search_parcels(status)": lambda db: crud.search_parcels(db, status="in_transit"),
+    "get_user_parcels(cursor)": lambda db: crud.get_user_parcels(
+        db, USER, limit=10, cursor=_deep_cursor(db, user_id=USER)
+    ),
+    "search_parcels(cursor)": lambda db: crud.search_parcels(
+        db, limit=10, cursor=_deep_cursor(db)
+    ),
+    "search_parcels(tracking_id prefix)": lambda db: crud.search_parcels(
+        db, tracking_id="seed000001"
+    ),
+    "search_parcels(email exact)": lambda db: crud.search_parcels(
+        db, email="Recipient42@example.com"
+    ),
+    "search_parcels(email substring)": lambda db: crud.search_parcels(
+        db, email="ender4242"
+    ),
+    "search_parcels(name)": lambda db: crud.search_parcels(db, name="recipient 4242"),
+    "search_parcels(phone)": lambda db: crud.search_parcels(db, phone="004242"),
+    "get_parcel_payments": lambda db: crud.get_parcel_payments(
+        db, seed_id("seed-parcel-43")
+    ),
+}
+
+# Served by the pg_trgm indexes of migration 0004
+TRIGRAM_CASES = {
+    "search_parcels(email substring)",
+    "search_parcels(name)",
+    "search_parcels(phone)",
+}
+
+
+@pytest.fixture(scope="module")
+def raw_cursor():
+    seed(QUERY_PLAN_PARCELS, QUERY_PLAN_DEPTH)
+    raw = engine.raw_connection()
+    try:
+        yield raw.cursor()
+        raw.rollback()
+    finally:
+        raw.close()
+
+
+def capture_statements(case):
+    """Run a crud call and return the statements it sent to the database"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append((statement, parameters))
+
+    crud.tracking_cache.clear()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = SessionLocal()
+    try:
+        case(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def seq_scans(plan: dict):
+    """Yield the relation names of every Seq Scan node in a plan tree"""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def is_empty(cursor, relation: str) -> bool:
+    cursor.execute("SELECT pg_relation_size(%s) = 0", (relation,))
+    return cursor.fetchone()[0]
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_no_seq_scan(raw_cursor, name):
+    if name in TRIGRAM_CASES:
+        raw_cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if raw_cursor.fetchone() is None:
+            pytest.skip("pg_trgm is not installed")
+    statements = capture_statements(CASES[name])
+    assert statements
+    for statement, parameters in statements:
+        raw_cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = raw_cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        # Empty partitions (months ahead) are always scanned sequentially
+        scans = [
+            relation
+            for relation in seq_scans(plan[0]["Plan"])
+            if not is_empty(raw_cursor, relation)
+        ]
+        assert (
+            not scans
+        ), f"Seq Scan on {', '.join(scans)}: {' '.join(statement.split())}"
@@ -0,0 +1,70 @@
+import pytest
+from pydantic import ValidationError
+
+from app import crud, rates, schemas
+from app.routers.quotes import _price
+
+DIMENSIONS = {"length": 30, "width": 20, "height": 10, "unit": "cm"}
+
+
+def item(weight=2, **dimensions):
+    return {
+        "weight": weight,
+        "dimensions": {**DIMENSIONS, **dimensions},
+        "destination_country": "US",
+    }
+
+
+def test_batch_reports_out_of_range_rows_as_errors():
+    result = _price(
+        [
+            item(),
+            item(length=1e200),
+            item(width=float("inf")),
+            item(height=float("nan")),
+            item(weight=float("inf")),
+            item(length=schemas.MAX_DIMENSION),
+        ]
+    )
+    assert [quote["index"] for quote in result["quotes"]] == [0, 5]
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3, 4]
+
+
+def overflowing_card():
+    return rates.RateCard.compile(
+        {
+            "version": "overflow",
+            "volumetric_divisor": 1e-300,
+            "weight_bands": [{"up_to_kg": None, "base": 0, "per_kg": 1e300}],
+            "destinations": {},
+            "default": {"multiplier": 1, "border_fee": 0},
+        }
+    )
+
+
+def test_batch_reports_unpriceable_rows_as_errors(monkeypatch):
+    monkeypatch.setattr(rates.rate_cards, "get", overflowing_card)
+    result = _price([item()])
+    assert result["quotes"] == []
+    assert result["errors"] == [{"index": 0, "detail": "Could not price parcel"}]
+
+
+@pytest.mark.parametrize(
+    "dimensions",
+    [{"length": 1e200}, {"width": float("inf")}, {"height": float("nan")}],
+)
+def test_create_parcel_rejects_unbounded_dimensions(dimensions):
+    with pytest.raises(ValidationError):
+        schemas.Dimensions(**{**DIMENSIONS, **dimensions})
+
+
+def test_unpriceable_parcel_raises_before_any_row_is_built(monkeypatch):
+    monkeypatch.setattr(rates.rate_cards, "get", overflowing_card)
+    monkeypatch.setattr(crud, "rate_cards", rates.rate_cards)
+    parcel = schemas.CreateParcel.model_construct(
+        weight=2,
+        dimensions=schemas.Dimensions(**DIMENSIONS),
+        destination_country="US",
+    )
+    with pytest.raises(ValueError):
+        crud._new_parcel_rows([parcel])
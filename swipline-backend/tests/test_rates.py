@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.rates import RateCard
+
+CARD = {
+    "version": "test",
+    "volumetric_divisor": 5000,
+    "weight_bands": [
+        {"up_to_kg": 5, "base": 10, "per_kg": 2},
+        {"up_to_kg": None, "base": 20, "per_kg": 1},
+    ],
+    "destinations": {"US": {"multiplier": 1.5, "border_fee": 25}},
+    "default": {"multiplier": 1.0, "border_fee": 20},
+}
+
+
+def test_compile_builds_lookup_arrays():
+    card = RateCard.compile(CARD)
+    assert card.currency == "usd"
+    assert list(card.band_limits) == [5, np.inf]
+    assert dict(card.destinations) == {"US": 0}
+    assert list(card.multipliers) == [1.5, 1.0]
+    with pytest.raises(ValueError):
+        card.band_base[0] = 0  # Compiled cards are read-only
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"weight_bands": []},
+        {"weight_bands": [{"up_to_kg": 5, "base": 10, "per_kg": 2}]},
+        {
+            "weight_bands": [
+                {"up_to_kg": 10, "base": 10, "per_kg": 2},
+                {"up_to_kg": 5, "base": 10, "per_kg": 2},
+                {"up_to_kg": None, "base": 10, "per_kg": 2},
+            ]
+        },
+        {"volumetric_divisor": 0},
+    ],
+)
+def test_compile_rejects_invalid_cards(change):
+    with pytest.raises(ValueError):
+        RateCard.compile({**CARD, **change})
+
+
+def test_quote_uses_band_destination_and_volumetric_weight():
+    card = RateCard.compile(CARD)
+    quotes = card.quote(
+        weight=[2, 2, 8],
+        length=[10, 100, 10],
+        width=[10, 50, 10],
+        height=[10, 10, 10],
+        cm_per_unit=[1, 1, 1],
+        countries=["us", "FR", "US"],
+    )
+    # 100 x 50 x 10 cm is 10 kg volumetric, in the open band
+    assert list(quotes.chargeable_weight) == [2, 10, 8]
+    assert list(quotes.shipping_cost) == [21, 30, 42]
+    assert list(quotes.border_fee) == [25, 20, 25]
+
+
+def test_quote_one_converts_inches():
+    card = RateCard.compile(CARD)
+    shipping, border_fee = card.quote_one(
+        1, {"length": 10, "width": 10, "height": 10, "unit": "in"}, "CA"
+    )
+    # 1000 in3 = 16387 cm3, 3.277 kg volumetric
+    assert shipping == round(10 + 2 * 16387.064 / 5000, 2)
+    assert border_fee == 20
@@ -0,0 +1,85 @@
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.search import (
+    WHITESPACE,
+    escape_like,
+    normalize_name,
+    normalize_phone,
+    parcel_filters,
+)
+
+
+def compiled(clause):
+    """SQL text and bound values of a filter"""
+    result = clause.compile(dialect=postgresql.dialect())
+    return str(result), sorted(set(map(str, result.params.values())))
+
+
+def test_escape_like():
+    assert escape_like(r"50%_off\now") == r"50\%\_off\\now"
+
+
+def test_normalizers():
+    assert normalize_name("  Bob \t Smith ") == "bob smith"
+    assert normalize_name("Bob\u00a0Smith") == "bob\u00a0smith"
+    assert normalize_phone("+1 (555) 010-2030") == "15550102030"
+
+
+def test_blank_terms_are_ignored():
+    assert parcel_filters(models.Parcel, tracking_id=" ", email="", phone="-") == []
+
+
+def test_full_tracking_id_is_exact_match():
+    (clause,) = parcel_filters(models.Parcel, tracking_id=" swl20261017abcdef ")
+    text, params = compiled(clause)
+    assert text == "parcels.tracking_id = %(tracking_id_1)s"
+    assert params == ["SWL20261017ABCDEF"]
+
+
+def test_partial_tracking_id_is_prefix_match():
+    (clause,) = parcel_filters(models.Parcel, tracking_id="swl2026")
+    text, params = compiled(clause)
+    assert text.startswith("parcels.tracking_id LIKE")
+    assert params == ["SWL2026%"]
+
+
+def test_full_email_is_equality_on_lower():
+    (clause,) = parcel_filters(models.Parcel, email=" Bob@Example.com ")
+    text, params = compiled(clause)
+    assert text == (
+        "lower(parcels.sender_email) = %(lower_1)s "
+        "OR lower(parcels.recipient_email) = %(lower_2)s"
+    )
+    assert params == ["bob@example.com"]
+
+
+def test_partial_email_is_substring_match():
+    (clause,) = parcel_filters(models.Parcel, email="example")
+    text, params = compiled(clause)
+    assert "lower(parcels.sender_email) LIKE" in text
+    assert params == ["%example%"]
+
+
+def test_short_terms_fall_back_to_prefix():
+    (clause,) = parcel_filters(models.Parcel, email="bo")
+    assert compiled(clause)[1] == ["bo%"]
+
+
+def test_phone_matches_digits_only():
+    (clause,) = parcel_filters(models.Parcel, phone="(555) 01")
+    text, params = compiled(clause)
+    assert text.count("regexp_replace(parcels.") == 2
+    assert "%55501%" in params
+
+
+def test_like_wildcards_in_terms_are_literal():
+    (clause,) = parcel_filters(models.Parcel, name="100%")
+    assert "%100\\%%" in compiled(clause)[1]
+
+
+def test_name_is_compared_on_the_same_normalization():
+    (clause,) = parcel_filters(models.Parcel, name="Bob   Smith")
+    text, params = compiled(clause)
+    assert text.startswith("regexp_replace(lower(parcels.recipient_name),")
+    assert sorted(params) == sorted([WHITESPACE, " ", "g", "%bob smith%"])
@@ -0,0 +1,226 @@
+import os
+import time
+
+import pytest
+
+from app import crud, models, schemas, tracking_ids
+from app.tracking_ids import (
+    ALPHABET,
+    LENGTH,
+    MAX_NODE,
+    MAX_SEQUENCE,
+    PREFIX,
+    TRACKING_ID_NODE_LOCK,
+    TrackingIdGenerator,
+    check_char,
+    is_valid,
+)
+
+needs_db = pytest.mark.skipif(
+    not os.getenv("DB_HOST"), reason="no database configured (DB_HOST)"
+)
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setenv("TRACKING_ID_NODE", "5")
+    return TrackingIdGenerator()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(tracking_ids.time, "time", lambda: now[0])
+    return now
+
+
+def _replace(value, index, char):
+    return value[:index] + char + value[index + 1 :]
+
+
+def test_check_char_catches_single_substitutions():
+    body = "0123456789ABC"
+    check = check_char(body)
+    for index in range(len(body)):
+        for char in ALPHABET:
+            if char != body[index]:
+                assert check_char(_replace(body, index, char)) != check
+
+
+def test_check_char_catches_most_adjacent_swaps():
+    body = "1D6ZKW0NQ3H8X"
+    check = check_char(body)
+    caught = sum(
+        check_char(body[:i] + body[i + 1] + body[i] + body[i + 2 :]) != check
+        for i in range(len(body) - 1)
+        if body[i] != body[i + 1]
+    )
+    assert caught == len(body) - 1
+
+
+def test_generated_ids_are_valid(generator):
+    tracking_id = generator()
+    assert len(tracking_id) == LENGTH
+    assert tracking_id.startswith(PREFIX)
+    assert is_valid(tracking_id)
+
+
+def test_is_valid_rejects_malformed(generator):
+    tracking_id = generator()
+    wrong_check = ALPHABET[(ALPHABET.index(tracking_id[-1]) + 1) % 32]
+    assert not is_valid("ABC" + tracking_id[3:])
+    assert not is_valid(tracking_id[:-1])
+    assert not is_valid(tracking_id + "0")
+    assert not is_valid(_replace(tracking_id, 5, "U"))  # Not in the alphabet
+    assert not is_valid(tracking_id.lower())
+    assert not is_valid(tracking_id[:-1] + wrong_check)
+    assert not is_valid(_replace(tracking_id, 8, "Z" if tracking_id[8] != "Z" else "Y"))
+
+
+def test_ids_are_unique_and_ordered(generator, clock):
+    ids = []
+    for _ in range(20):
+        ids += generator.many(1000)
+        clock[0] += 0.0005
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_sequence_exhaustion_borrows_next_millisecond(generator, clock):
+    ids = generator.many(MAX_SEQUENCE + 10)
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert tracking_ids.created_at(ids[-1]) > tracking_ids.created_at(ids[0])
+
+
+def test_clock_step_back_keeps_ids_unique(generator, clock):
+    before = generator.many(100)
+    clock[0] -= 5
+    after = generator.many(100)
+    assert len(set(before + after)) == 200
+    assert before + after == sorted(before + after)
+
+
+def test_nodes_keep_ids_apart(monkeypatch, clock):
+    monkeypatch.setenv("TRACKING_ID_NODE", "1")
+    first = TrackingIdGenerator().many(100)
+    monkeypatch.setenv("TRACKING_ID_NODE", "2")
+    second = TrackingIdGenerator().many(100)
+    assert not set(first) & set(second)
+
+
+def test_configured_node_is_bounded(monkeypatch):
+    monkeypatch.setenv("TRACKING_ID_NODE", str(MAX_NODE + 1))
+    with pytest.raises(ValueError):
+        TrackingIdGenerator().node
+
+
+@needs_db
+def test_leases_are_exclusive():
+    leases = [tracking_ids.lease_node() for _ in range(3)]
+    try:
+        assert len({lease.node for lease in leases}) == 3
+        assert all(lease.held() for lease in leases)
+    finally:
+        for lease in leases:
+            lease.close()
+
+
+@needs_db
+def test_fails_when_every_node_is_leased():
+    from app.database import engine
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql(
+            "SELECT pg_advisory_lock(%s, node) FROM generate_series(0, %s) node",
+            (TRACKING_ID_NODE_LOCK, MAX_NODE),
+        )
+        try:
+            with pytest.raises(RuntimeError):
+                tracking_ids.lease_node()
+        finally:
+            connection.exec_driver_sql("SELECT pg_advisory_unlock_all()")
+
+
+def _parcel():
+    return schemas.CreateParcel(
+        sender_name="Retry Sender",
+        sender_email="sender@example.com",
+        sender_phone="5550000000",
+        recipient_name="Retry Recipient",
+        recipient_email="recipient@example.com",
+        recipient_phone="5550000001",
+        recipient_address="1 Retry Road",
+        destination_country="UK",
+        weight=2,
+        dimensions={"length": 30, "width": 20, "height": 15, "unit": "cm"},
+    )
+
+
+@needs_db
+def test_parcel_inserts_redraw_taken_tracking_ids(monkeypatch, generator):
+    from app.database import SessionLocal
+
+    monkeypatch.setattr(tracking_ids, "generate", generator)
+    db = SessionLocal()
+    created = []
+    try:
+        taken = crud.create_parcel(db, _parcel())
+        created.append(taken.id)
+        draws = []
+        many = generator.many
+
+        def colliding(count):
+            ids = many(count)
+            draws.append(count)
+            return [taken.tracking_id] + ids[1:] if len(draws) == 1 else ids
+
+        monkeypatch.setattr(generator, "many", colliding)
+        rows = crud.create_parcels_bulk(db, [_parcel(), _parcel()])
+        created += [parcel_id for parcel_id, _ in rows]
+        assert draws == [2, 1]
+        assert taken.tracking_id not in {tracking_id for _, tracking_id in rows}
+
+        draws.clear()
+        parcel = crud.create_parcel(db, _parcel())
+        created.append(parcel.id)
+        assert draws == [1, 1]
+        assert parcel.tracking_id != taken.tracking_id
+        assert is_valid(parcel.tracking_id)
+    finally:
+        db.rollback()
+        db.query(models.TrackingHistory).filter(
+            models.TrackingHistory.parcel_id.in_(created)
+        ).delete()
+        db.query(models.Parcel).filter(models.Parcel.id.in_(created)).delete()
+        db.commit()
+        db.close()
+
+
+@needs_db
+def test_lost_lease_is_replaced(monkeypatch):
+    from app.database import engine
+
+    monkeypatch.delenv("TRACKING_ID_NODE", raising=False)
+    monkeypatch.setattr(tracking_ids, "TRACKING_ID_NODE_CHECK_INTERVAL", 0.01)
+    generator = TrackingIdGenerator()
+    generator.node
+    lost = generator._lease
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql(
+                "SELECT pg_terminate_backend(%s)", (lost.backend_pid,)
+            )
+        # Replaced by the background check, without a call to node
+        for _ in range(500):
+            if generator._lease is not lost and generator._lease is not None:
+                break
+            time.sleep(0.01)
+        assert generator._lease is not lost
+        assert generator._lease.held()
+        assert generator.check_lease() == generator._lease.node
+    finally:
+        replacement = generator._lease
+        generator._lease = None  # Stops the background check
+        if replacement is not None:
+            replacement.close()